@@ -0,0 +1,9 @@
+"""
+Flipzy - Headless review API
+Serves get-due, rating, add/import, search and stats over HTTP (see src/api.py)
+"""
+from src.api import main
+
+
+if __name__ == "__main__":
+    main()
@@ -2,46 +2,58 @@
 Flipzy - Spaced Repetition App
 A Streamlit app to help learn English vocabulary and phrases
 """
+import sys
+
 import streamlit as st
-from src.config import configure_page, initialize_session_state
-from src.sidebar import render_sidebar
-from src.spaced_repetition import SpacedRepetition
-from src.pages import (
-    show_home,
-    show_add_vocabulary,
-    show_review,
-    show_statistics,
-    show_manage_cards
-)
+from src.config import configure_page, get_scheduler, initialize_session_state
+from src.sidebar import render_debug_panel, render_sidebar
+from src.tracing import enable, finish_trace, span, start_trace
+from src.pages import load_page
 
 
 def main():
     """Main application entry point"""
+    tracing = st.session_state.trace_enabled
+    if tracing:
+        enable()
+        start_trace()
+
     st.title("📚 Flipzy")
     st.markdown("---")
     
     storage = st.session_state.storage
-    sr = SpacedRepetition()
-    cards = storage.load_cards()
-    stats = sr.get_stats(cards)
+    sr = get_scheduler()
+    stats = storage.get_stats()
     
     # Render sidebar and get selected page
-    page = render_sidebar(storage, stats)
+    with span("render_sidebar"):
+        page = render_sidebar(storage, stats)
     
-    # Route to appropriate page
-    if page == "🏠 Home":
-        show_home(storage, stats)
-    elif page == "➕ Add Vocabulary":
-        show_add_vocabulary(storage)
-    elif page == "📖 Review":
-        show_review(storage, sr)
-    elif page == "📊 Statistics":
-        show_statistics(storage, sr)
-    elif page == "📝 Manage Cards":
-        show_manage_cards(storage)
+    # Route to appropriate page, importing only its module
+    with span(f"page: {page}"):
+        show_page = load_page(page)
+        if page == "🏠 Home":
+            show_page(storage, stats)
+        elif page in ("📖 Review", "📊 Statistics"):
+            show_page(storage, sr)
+        else:
+            show_page(storage)
+
+    if page != "📖 Review":
+        # Store ratings buffered during the review session
+        storage.flush()
+
+    if tracing:
+        st.session_state.span_stats.record(finish_trace())
+    render_debug_panel()
 
 
 if __name__ == "__main__":
-    configure_page()
-    initialize_session_state()
-    main()
+    if "--profile-startup" in sys.argv:
+        # python app.py --profile-startup [--budget-ms N]: cold start report, not the app
+        from src.benchmarks.startup import main as profile_startup
+        profile_startup([arg for arg in sys.argv[1:] if arg != "--profile-startup"])
+    else:
+        configure_page()
+        initialize_session_state()
+        main()
@@ -10,6 +10,7 @@ from subprocess import run
 # Setup paths
 SCRIPT_DIR = Path(__file__).parent
 SRC_DIR = SCRIPT_DIR / "src"
+TESTS_DIR = SCRIPT_DIR / "tests"
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
@@ -52,7 +53,7 @@ def main():
     parser.add_argument("--check", action="store_true", help="Check formatting without making changes")
     args = parser.parse_args()
 
-    directories = [SRC_DIR]
+    directories = [SRC_DIR, TESTS_DIR]
     success = all(format_directory(d, args.check) for d in directories)
     
     if success:
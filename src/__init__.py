@@ -1,9 +1,47 @@
 """
 Flipzy - Source Packages
+
+Names of the submodules are looked up lazily: `from src import Storage` imports
+only the modules it needs, and importing one submodule (as app.py does) does
+not import the others.
 """
 
-from .config import *  # noqa: F403
-from .pages import *  # noqa: F403
-from .sidebar import *  # noqa: F403
-from .spaced_repetition import *  # noqa: F403
-from .storage import *  # noqa: F403
+from importlib import import_module
+
+# Searched in this order for a name
+_MODULES = (
+    "api",
+    "backups",
+    "benchmarks",
+    "binary_storage",
+    "bulk",
+    "codec",
+    "columnar",
+    "config",
+    "decks",
+    "exporter",
+    "forecast",
+    "importer",
+    "indexes",
+    "pages",
+    "review_log",
+    "review_session",
+    "schedule_file",
+    "search",
+    "sidebar",
+    "spaced_repetition",
+    "sqlite_storage",
+    "storage",
+    "tracing",
+)
+
+
+def __getattr__(name: str):
+    if name in _MODULES:
+        return import_module(f".{name}", __name__)
+    if not name.startswith("__"):
+        for module in _MODULES:
+            value = getattr(import_module(f".{module}", __name__), name, None)
+            if value is not None:
+                return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
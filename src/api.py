@@ -0,0 +1,403 @@
+"""
+Headless HTTP review API over Storage and SpacedRepetition
+
+A small asyncio HTTP/1.1 server with JSON bodies, for clients that cannot use
+the Streamlit UI. Reads run in worker threads against the cached deck. Every
+write goes through a single writer task: requests queue their writes, and the
+writer takes everything queued at once and applies it as one batch (one flush
+for all ratings, one storage write for all new cards), so concurrent clients
+share the cost of a durable write.
+
+Endpoints:
+    GET  /due?category=&limit=      due cards, most overdue first
+    GET  /cards/<id>                one card
+    GET  /search?q=&category=&limit=
+    GET  /stats                     learning stats and category counts
+    POST /reviews                   {"id": ..., "quality": 0-5}
+    POST /reviews/batch             {"reviews": [{"id": ..., "quality": ...}, ...]}
+                                    (a rating that fails or names an unknown card
+                                    is null in "cards" and listed in "errors";
+                                    the others are kept)
+    POST /cards                     {"front", "back", "category", "example"}
+    POST /import?format=&category=  CSV/TSV/JSONL/Anki text as the request body
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+from pydantic import ValidationError
+
+from .importer import FORMATS, import_cards
+from .spaced_repetition import Card, SpacedRepetition
+from .storage import ConflictError, Storage, card_to_dict, create_storage
+
+DEFAULT_LIMIT = 20
+# Largest accepted request body and number of writes applied as one batch
+MAX_BODY_BYTES = 16 * 1024 * 1024
+MAX_BATCH = 1000
+
+
+class APIError(Exception):
+    """An error reported to the client with an HTTP status"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class WriteJob:
+    """A write waiting for the writer task, and the future of its result"""
+
+    def __init__(self, kind: str, payload, future: asyncio.Future):
+        self.kind = kind
+        self.payload = payload
+        self.future = future
+
+
+def _int_param(query: dict, name: str, default: int) -> int:
+    try:
+        value = int(query.get(name, default))
+    except ValueError:
+        raise APIError(400, f"{name} must be an integer")
+    if value < 0:
+        raise APIError(400, f"{name} must not be negative")
+    return value
+
+
+def _quality(review: dict) -> Tuple[str, int]:
+    """(card ID, quality) of a rating in a request"""
+    if not isinstance(review, dict) or not isinstance(review.get("id"), str):
+        raise APIError(400, "A rating needs a card id")
+    quality = review.get("quality")
+    # bool is an int subclass, but true is not a grade
+    if isinstance(quality, bool) or not isinstance(quality, int) or not 0 <= quality <= 5:
+        raise APIError(400, "quality must be an integer from 0 to 5")
+    return review["id"], quality
+
+
+def _text_field(fields: dict, name: str) -> str:
+    value = fields.get(name)
+    if value is not None and not isinstance(value, str):
+        raise APIError(400, f"{name} must be a string")
+    return (value or "").strip()
+
+
+class ReviewAPI:
+    """Routes requests to a Storage; every write goes through one writer task"""
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self.sr = SpacedRepetition()
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        # The writer's thread, so storage writes never run concurrently
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-writer")
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._writer())
+
+    async def close(self):
+        if self._writer_task:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+        self._write_executor.shutdown()
+
+    # Writes
+
+    async def _write(self, kind: str, payload):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(WriteJob(kind, payload, future))
+        return await future
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = [await self._queue.get()]
+            while not self._queue.empty() and len(jobs) < MAX_BATCH:
+                jobs.append(self._queue.get_nowait())
+            outcomes = await loop.run_in_executor(self._write_executor, self._apply, jobs)
+            for job, outcome in zip(jobs, outcomes):
+                if job.future.done():
+                    continue
+                if isinstance(outcome, Exception):
+                    job.future.set_exception(outcome)
+                else:
+                    job.future.set_result(outcome)
+
+    def _apply(self, jobs: List[WriteJob]) -> list:
+        """Apply a batch of writes (in the writer thread); returns a result or error per job"""
+        outcomes = [None] * len(jobs)
+        added = []
+        for i, job in enumerate(jobs):
+            try:
+                if job.kind == "reviews":
+                    # One outcome per rating: a failed rating does not undo the others
+                    outcomes[i] = [self._rate(card_id, quality) for card_id, quality in job.payload]
+                elif job.kind == "card":
+                    added.append(i)
+                elif job.kind == "import":
+                    outcomes[i] = import_cards(self.storage, *job.payload)
+            except Exception as e:
+                outcomes[i] = e
+        try:
+            # All ratings of the batch become durable with one write
+            self.storage.flush()
+        except Exception as e:
+            for i, job in enumerate(jobs):
+                if job.kind == "reviews":
+                    outcomes[i] = e
+        if added:
+            try:
+                self.storage.add_cards(jobs[i].payload for i in added)
+                for i in added:
+                    outcomes[i] = jobs[i].payload
+            except Exception as e:
+                for i in added:
+                    outcomes[i] = e
+        return outcomes
+
+    def _rate(self, card_id: str, quality: int) -> Union[Card, None, Exception]:
+        """The rated card, None for an unknown card, or the error of the rating"""
+        try:
+            return self.storage.modify_card(
+                card_id,
+                lambda card: self.sr.calculate_next_review(card, quality),
+                review=True,
+                buffered=True,
+                quality=quality,
+                # Made durable by the flush after the batch, before it is answered
+                sync=False,
+            )
+        except Exception as e:
+            return e
+
+    # Routing
+
+    async def dispatch(self, method: str, target: str, body: bytes = b"") -> Tuple[int, dict]:
+        """Handle one request; returns the status and the JSON payload"""
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split("/") if part]
+        try:
+            return await self._route(method, parts, query, body)
+        except APIError as e:
+            return e.status, {"error": str(e)}
+        except ValidationError as e:
+            return 400, {"error": str(e.errors()[0]["msg"])}
+        except ConflictError as e:
+            return 409, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    def _json(self, body: bytes):
+        try:
+            return json.loads(body or b"null")
+        except json.JSONDecodeError as e:
+            raise APIError(400, f"Invalid JSON: {e.msg}")
+
+    async def _route(self, method: str, parts: List[str], query: dict, body: bytes):
+        route = (method, parts[0] if parts else "", len(parts))
+        if route == ("GET", "due", 1):
+            cards = await asyncio.to_thread(
+                self.storage.get_due_cards,
+                category=query.get("category"),
+                limit=_int_param(query, "limit", DEFAULT_LIMIT),
+            )
+            return 200, {"cards": [card_to_dict(card) for card in cards]}
+        if route == ("GET", "cards", 2):
+            card = await asyncio.to_thread(self.storage.get_card_by_id, parts[1])
+            if card is None:
+                raise APIError(404, f"No card {parts[1]}")
+            return 200, card_to_dict(card)
+        if route == ("GET", "search", 1):
+            card_ids = await asyncio.to_thread(
+                self.storage.search,
+                query.get("q", ""),
+                query.get("category"),
+                _int_param(query, "limit", DEFAULT_LIMIT),
+            )
+            cards = await asyncio.to_thread(self.storage.get_cards, card_ids)
+            return 200, {"cards": [card_to_dict(card) for card in cards]}
+        if route == ("GET", "stats", 1):
+            stats = await asyncio.to_thread(self.storage.get_stats)
+            categories = await asyncio.to_thread(self.storage.category_counts)
+            return 200, {**stats, "categories": categories}
+        if route == ("POST", "reviews", 1):
+            (card,) = await self._write("reviews", [_quality(self._json(body))])
+            if isinstance(card, Exception):
+                raise card
+            if card is None:
+                raise APIError(404, "No such card")
+            return 200, card_to_dict(card)
+        if route == ("POST", "reviews", 2) and parts[1] == "batch":
+            payload = self._json(body)
+            reviews = payload.get("reviews") if isinstance(payload, dict) else None
+            if not isinstance(reviews, list):
+                raise APIError(400, 'Expected {"reviews": [...]}')
+            cards = await self._write("reviews", [_quality(review) for review in reviews])
+            errors = [
+                {
+                    "index": i,
+                    "error": "not found" if card is None else f"{type(card).__name__}: {card}",
+                }
+                for i, card in enumerate(cards)
+                if not isinstance(card, Card)
+            ]
+            return 200, {
+                "cards": [card_to_dict(card) if isinstance(card, Card) else None for card in cards],
+                "errors": errors,
+            }
+        if route == ("POST", "cards", 1):
+            fields = self._json(body)
+            if not isinstance(fields, dict):
+                raise APIError(400, "Expected a card object")
+            card = Card(
+                id=str(uuid.uuid4()),
+                front=_text_field(fields, "front"),
+                back=_text_field(fields, "back"),
+                category=fields.get("category") or "vocabulary",
+                example=fields.get("example") or None,
+            )
+            if not (card.front and card.back):
+                raise APIError(400, "front and back are required")
+            return 201, card_to_dict(await self._write("card", card))
+        if route == ("POST", "import", 1):
+            fmt = query.get("format", "csv")
+            if fmt not in FORMATS.values():
+                raise APIError(400, f"Unknown import format: {fmt}")
+            try:
+                lines = io.StringIO(body.decode("utf-8-sig"), newline="")
+            except UnicodeDecodeError:
+                raise APIError(400, "The body must be UTF-8 text")
+            try:
+                result = await self._write(
+                    "import", (lines, fmt, query.get("category", "vocabulary"))
+                )
+            except (ValueError, csv.Error) as e:
+                # Unreadable data, e.g. an oversized CSV field; earlier batches are kept
+                raise APIError(400, f"Invalid {fmt} data: {e}")
+            return 200, {
+                "added": result.added,
+                "duplicates": result.duplicates,
+                "errors": result.errors,
+            }
+        raise APIError(404, f"No route for {method} /{'/'.join(parts)}")
+
+    # HTTP
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve the requests of one keep-alive connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection") != "close"
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # The body cannot be found, so neither can the next request
+                    status, payload, keep_alive = 400, {"error": "Invalid Content-Length"}, False
+                elif "transfer-encoding" in headers:
+                    status, payload, keep_alive = 411, {"error": "Send a Content-Length"}, False
+                elif length > MAX_BODY_BYTES:
+                    status, payload, keep_alive = 413, {"error": "Request body too large"}, False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.dispatch(method, target, body)
+
+                data = json.dumps(payload).encode("utf-8")
+                head = (
+                    f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                )
+                writer.write(head.encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class InProcessClient:
+    """Calls a ReviewAPI directly, without sockets, for local testing and scripting
+
+    Use it inside a running event loop, as an async context manager.
+    """
+
+    def __init__(self, storage: Storage):
+        self.api = ReviewAPI(storage)
+
+    async def __aenter__(self) -> "InProcessClient":
+        await self.api.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.api.close()
+
+    async def get(self, target: str) -> Tuple[int, dict]:
+        return await self.api.dispatch("GET", target)
+
+    async def post(self, target: str, payload=None, data: bytes = b"") -> Tuple[int, dict]:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else data
+        return await self.api.dispatch("POST", target, body)
+
+
+async def serve(storage: Storage, host: str = "127.0.0.1", port: int = 8502):
+    """Serve the API until cancelled"""
+    api = ReviewAPI(storage)
+    await api.start()
+    server = await asyncio.start_server(api.handle_connection, host, port)
+    print(f"Serving {storage.file_path} on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await api.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the review API over HTTP")
+    parser.add_argument("storage_path", nargs="?", default="data/vocabulary_cards.json")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(create_storage(args.storage_path), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
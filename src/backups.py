@@ -0,0 +1,250 @@
+"""
+Incremental, content-addressed deck backups
+
+A backup stores the deck as one JSON line per card, cut into chunks at
+boundaries chosen by card ID, so editing a card changes only its own chunk and
+adding cards only touches the last one. Chunks are compressed and stored once
+under their SHA-256 in objects/, shared by every backup (and deck) in the
+directory; a backup itself is a small manifest listing its chunks.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .storage import Storage, create_storage, file_lock
+
+# Backups kept: the N newest, plus the newest of each of the last N hours/days/weeks
+DEFAULT_RETENTION = {"last": 10, "hourly": 24, "daily": 7, "weekly": 8}
+PERIOD_FORMATS = {"hourly": "%Y%m%d%H", "daily": "%Y%m%d", "weekly": "%G%V"}
+# Average and maximum number of cards per chunk
+CHUNK_CARDS = 64
+MAX_CHUNK_CARDS = 1024
+
+# One backup at a time, off the Streamlit script thread
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup")
+
+
+def chunk_cards(cards: Iterable[dict]) -> Iterator[bytes]:
+    """Serialize cards as JSON lines in chunks whose boundaries depend only on the cards"""
+    chunk: List[str] = []
+    for card in cards:
+        chunk.append(json.dumps(card) + "\n")
+        boundary = zlib.crc32(card["id"].encode()) % CHUNK_CARDS == 0
+        if boundary or len(chunk) >= MAX_CHUNK_CARDS:
+            yield "".join(chunk).encode("utf-8")
+            chunk = []
+    if chunk:
+        yield "".join(chunk).encode("utf-8")
+
+
+class BackupStore:
+    """Backups of one deck, in a directory that may hold backups of other decks"""
+
+    def __init__(self, backup_dir: str, name: str, retention: Optional[Dict[str, int]] = None):
+        self.backup_dir = backup_dir
+        self.name = name
+        self.retention = DEFAULT_RETENTION if retention is None else retention
+        self.objects_dir = os.path.join(backup_dir, "objects")
+        self.manifests_dir = os.path.join(backup_dir, "manifests")
+
+    def _lock(self):
+        os.makedirs(self.backup_dir, exist_ok=True)
+        return file_lock(os.path.join(self.backup_dir, ".lock"))
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def _write_atomic(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def create(self, cards: Iterable[dict], created_at: Optional[datetime] = None) -> str:
+        """Store a backup of serialized cards and return its manifest path"""
+        created_at = created_at or datetime.now()
+        with self._lock():
+            chunks, written = [], 0
+            for data in chunk_cards(cards):
+                digest = hashlib.sha256(data).hexdigest()
+                path = self._object_path(digest)
+                if not os.path.exists(path):
+                    self._write_atomic(path, zlib.compress(data))
+                    written += 1
+                chunks.append(digest)
+            manifest = {
+                "deck": self.name,
+                "created_at": created_at.isoformat(),
+                "chunks": chunks,
+                "new_chunks": written,
+            }
+            path = os.path.join(
+                self.manifests_dir,
+                self.name,
+                created_at.strftime("%Y%m%d_%H%M%S_%f") + ".json",
+            )
+            self._write_atomic(path, json.dumps(manifest).encode("utf-8"))
+        return path
+
+    def _manifest_paths(self, name: Optional[str] = None) -> List[str]:
+        names = [name] if name else sorted(os.listdir(self.manifests_dir))
+        paths = []
+        for deck in names:
+            deck_dir = os.path.join(self.manifests_dir, deck)
+            if os.path.isdir(deck_dir):
+                paths += [os.path.join(deck_dir, f) for f in sorted(os.listdir(deck_dir))]
+        return [path for path in paths if path.endswith(".json")]
+
+    def manifests(self) -> List[dict]:
+        """This deck's backups, oldest first, each with its manifest path"""
+        if not os.path.isdir(self.manifests_dir):
+            return []
+        manifests = []
+        for path in self._manifest_paths(self.name):
+            with open(path, "r") as f:
+                manifest = json.load(f)
+            manifest["path"] = path
+            manifests.append(manifest)
+        return sorted(manifests, key=lambda manifest: manifest["created_at"])
+
+    def find(self, at: Optional[datetime] = None) -> Optional[dict]:
+        """The latest backup taken at or before at (default: the latest one)"""
+        candidates = [
+            manifest
+            for manifest in self.manifests()
+            if at is None or datetime.fromisoformat(manifest["created_at"]) <= at
+        ]
+        return candidates[-1] if candidates else None
+
+    def read(self, manifest: dict) -> Iterator[dict]:
+        """Card dicts of a backup, checking every chunk against its hash"""
+        for digest in manifest["chunks"]:
+            with open(self._object_path(digest), "rb") as f:
+                data = zlib.decompress(f.read())
+            if hashlib.sha256(data).hexdigest() != digest:
+                raise ValueError(f"Backup chunk {digest} is corrupt")
+            for line in data.decode("utf-8").splitlines():
+                yield json.loads(line)
+
+    def verify(self) -> List[str]:
+        """Check every chunk of every backup of this deck; returns the problems found"""
+        problems, checked = [], {}
+        for manifest in self.manifests():
+            for digest in manifest["chunks"]:
+                if digest not in checked:
+                    checked[digest] = self._check_object(digest)
+                if checked[digest]:
+                    problems.append(f"{os.path.basename(manifest['path'])}: {checked[digest]}")
+        return problems
+
+    def _check_object(self, digest: str) -> Optional[str]:
+        try:
+            with open(self._object_path(digest), "rb") as f:
+                data = zlib.decompress(f.read())
+        except FileNotFoundError:
+            return f"chunk {digest} is missing"
+        except zlib.error:
+            return f"chunk {digest} does not decompress"
+        if hashlib.sha256(data).hexdigest() != digest:
+            return f"chunk {digest} does not match its hash"
+        return None
+
+    def retained(self, manifests: List[dict]) -> List[dict]:
+        """The backups kept by the retention policy (always including the newest)"""
+        newest_first = manifests[::-1]
+        last = max(1, self.retention.get("last", 0))
+        keep = {id(manifest) for manifest in newest_first[:last]}
+        for period, count in self.retention.items():
+            if period not in PERIOD_FORMATS:
+                continue
+            buckets = set()
+            for manifest in newest_first:
+                bucket = datetime.fromisoformat(manifest["created_at"]).strftime(
+                    PERIOD_FORMATS[period]
+                )
+                if bucket not in buckets and len(buckets) < count:
+                    buckets.add(bucket)
+                    keep.add(id(manifest))
+        return [manifest for manifest in manifests if id(manifest) in keep]
+
+    def prune(self) -> int:
+        """Delete backups outside the retention policy and chunks no backup uses
+
+        Returns the number of deleted backups.
+        """
+        with self._lock():
+            manifests = self.manifests()
+            kept = {id(manifest) for manifest in self.retained(manifests)}
+            removed = 0
+            for manifest in manifests:
+                if id(manifest) not in kept:
+                    os.remove(manifest["path"])
+                    removed += 1
+            if removed:
+                self._collect_garbage()
+        return removed
+
+    def _collect_garbage(self):
+        """Remove chunks not referenced by any backup of any deck in the directory"""
+        used = set()
+        for path in self._manifest_paths():
+            with open(path, "r") as f:
+                used.update(json.load(f)["chunks"])
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            for rest in os.listdir(prefix_dir):
+                if prefix + rest not in used:
+                    os.remove(os.path.join(prefix_dir, rest))
+
+
+def backup_store(storage: Storage) -> BackupStore:
+    """The backups of a storage's deck, named by its file name (decks.json and decks.db differ)"""
+    name = os.path.basename(storage.file_path)
+    return BackupStore(storage.backup_dir, name, storage.backup_retention)
+
+
+def start_backup(storage: Storage) -> Future:
+    """Run storage.backup_now in the background; the future returns the manifest path"""
+    return _executor.submit(storage.backup_now)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage incremental deck backups")
+    parser.add_argument("command", choices=["create", "list", "verify", "prune", "restore"])
+    parser.add_argument("storage_path", nargs="?", default="data/vocabulary_cards.json")
+    parser.add_argument(
+        "--at", type=datetime.fromisoformat, help="restore the latest backup up to this time"
+    )
+    args = parser.parse_args()
+
+    storage = create_storage(args.storage_path)
+    store = backup_store(storage)
+    if args.command == "create":
+        print(f"Created {storage.backup_now()}")
+    elif args.command == "list":
+        for manifest in store.manifests():
+            print(f"{manifest['created_at']}  {len(manifest['chunks'])} chunks  {manifest['path']}")
+    elif args.command == "verify":
+        problems = store.verify()
+        for problem in problems:
+            print(problem)
+        print(f"{len(store.manifests())} backups checked, {len(problems)} problems")
+        raise SystemExit(1 if problems else 0)
+    elif args.command == "prune":
+        print(f"Removed {store.prune()} backups")
+    elif args.command == "restore":
+        manifest = storage.restore_backup(args.at)
+        print(f"Restored {args.storage_path} from the backup of {manifest['created_at']}")
+
+
+if __name__ == "__main__":
+    main()
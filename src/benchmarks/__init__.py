@@ -0,0 +1,7 @@
+"""
+Performance benchmarks: synthetic decks and timings of the hot paths
+"""
+
+from .deck import *  # noqa: F403
+from .startup import *  # noqa: F403
+from .suite import *  # noqa: F403
@@ -0,0 +1,152 @@
+"""
+Seeded generator of realistic synthetic decks
+
+Cards get made-up words in the usual category mix, and their schedules come
+from simulated review histories: each reviewed card is graded whenever it
+falls due, a little late, from its creation until now, with the vectorized
+SM-2 step. The same seed always gives the same deck relative to now.
+"""
+
+import argparse
+import uuid
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from ..columnar import DAY_MICROS, NO_TIME, CardColumns, from_micros, to_micros
+from ..forecast import DEFAULT_GRADE_PROBABILITIES
+from ..spaced_repetition import SpacedRepetition
+from ..storage import create_storage
+
+CATEGORIES = {
+    "vocabulary": 0.5,
+    "phrase": 0.2,
+    "idiom": 0.1,
+    "phrasal verb": 0.1,
+    "collocation": 0.07,
+    "other": 0.03,
+}
+SYLLABLES = "ba ce di fo gu ha je ki lo mu na pe qui ra se ti vo wa xe yo zu an el in or um".split()
+PARTICLES = ("up", "out", "off", "on", "in", "down", "over", "away")
+WORDS = 20_000
+# Share of cards that were never reviewed, and the days over which cards were added
+NEW_SHARE = 0.2
+HISTORY_DAYS = 365
+# Mean delay between a card falling due and its review
+MEAN_REVIEW_DELAY_DAYS = 1.5
+
+
+def _vocabulary(rng: np.random.Generator) -> List[str]:
+    lengths = rng.integers(1, 5, WORDS)
+    syllables = np.array(SYLLABLES)[rng.integers(0, len(SYLLABLES), int(lengths.sum()))]
+    ends = np.cumsum(lengths).tolist()
+    syllables = syllables.tolist()
+    return ["".join(syllables[end - n : end]) for n, end in zip(lengths.tolist(), ends)]
+
+
+def _sentences(rng: np.random.Generator, words: List[str], count: int, low: int, high: int):
+    lengths = rng.integers(low, high + 1, count)
+    picks = rng.integers(0, len(words), int(lengths.sum())).tolist()
+    start = 0
+    for n in lengths.tolist():
+        yield " ".join(words[i] for i in picks[start : start + n])
+        start += n
+
+
+def _schedules(rng: np.random.Generator, count: int, now: int) -> dict:
+    """Schedule columns of count cards after simulated review histories"""
+    created_at = now - (rng.random(count) * HISTORY_DAYS * DAY_MICROS).astype(np.int64)
+    ease_factor = np.full(count, 2.5)
+    interval = np.ones(count, dtype=np.int64)
+    repetitions = np.zeros(count, dtype=np.int64)
+    last_reviewed = np.full(count, NO_TIME, dtype=np.int64)
+    next_review = created_at.copy()
+
+    active = np.flatnonzero(rng.random(count) >= NEW_SHARE)
+    while len(active):
+        delay = rng.exponential(MEAN_REVIEW_DELAY_DAYS * DAY_MICROS, len(active))
+        reviewed_at = next_review[active] + delay.astype(np.int64)
+        in_past = reviewed_at <= now
+        active, reviewed_at = active[in_past], reviewed_at[in_past]
+        grades = rng.choice(6, len(active), p=DEFAULT_GRADE_PROBABILITIES)
+        ease, ivl, reps = SpacedRepetition.calculate_next_review_batch(
+            ease_factor[active], interval[active], repetitions[active], grades
+        )
+        ease_factor[active], interval[active], repetitions[active] = ease, ivl, reps
+        last_reviewed[active] = reviewed_at
+        next_review[active] = reviewed_at + ivl * DAY_MICROS
+
+    return {
+        "created_at": created_at,
+        "ease_factor": ease_factor,
+        "interval": interval,
+        "repetitions": repetitions,
+        "next_review": next_review,
+        "last_reviewed": last_reviewed,
+    }
+
+
+def generate_cards(count: int, seed: int = 0, now: Optional[datetime] = None) -> Iterator[dict]:
+    """Yield count serialized cards (the JSON storage format)"""
+    rng = np.random.default_rng(seed)
+    words = _vocabulary(rng)
+    categories = rng.choice(list(CATEGORIES), count, p=list(CATEGORIES.values())).tolist()
+    phrase_words = rng.integers(2, 5, count).tolist()
+    first_words = rng.integers(0, len(words), (count, 4)).tolist()
+    particles = rng.integers(0, len(PARTICLES), count).tolist()
+    has_example = (rng.random(count) < 0.6).tolist()
+    backs = _sentences(rng, words, count, 3, 10)
+    examples = _sentences(rng, words, count, 5, 12)
+    ids = rng.integers(0, 256, (count, 16), dtype=np.uint8)
+    schedules = _schedules(rng, count, to_micros(now or datetime.now()))
+    columns = {name: values.tolist() for name, values in schedules.items()}
+
+    for i in range(count):
+        category = categories[i]
+        if category == "vocabulary":
+            front = words[first_words[i][0]]
+        elif category == "phrasal verb":
+            front = f"{words[first_words[i][0]]} {PARTICLES[particles[i]]}"
+        else:
+            front = " ".join(words[w] for w in first_words[i][: phrase_words[i]])
+        example = next(examples)
+        last_reviewed = columns["last_reviewed"][i]
+        yield {
+            "id": str(uuid.UUID(bytes=ids[i].tobytes(), version=4)),
+            "front": front,
+            "back": next(backs),
+            "category": category,
+            "example": example if has_example[i] else None,
+            "created_at": from_micros(columns["created_at"][i]).isoformat(),
+            "ease_factor": columns["ease_factor"][i],
+            "interval": columns["interval"][i],
+            "repetitions": columns["repetitions"][i],
+            "next_review": from_micros(columns["next_review"][i]).isoformat(),
+            "last_reviewed": (
+                from_micros(last_reviewed).isoformat() if last_reviewed != NO_TIME else None
+            ),
+            "version": 0,
+        }
+
+
+def write_deck(path: str, count: int, seed: int = 0, now: Optional[datetime] = None) -> int:
+    """Write a generated deck to a card file (JSON or SQLite, by extension)"""
+    columns = CardColumns.from_dicts(generate_cards(count, seed, now))
+    create_storage(path).save_cards(columns.cards())
+    return len(columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic deck")
+    parser.add_argument("count", type=int)
+    parser.add_argument("path", help="card file to write, .json or .db")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    count = write_deck(args.path, args.count, args.seed)
+    print(f"Wrote {count} cards to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
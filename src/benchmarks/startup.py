@@ -0,0 +1,110 @@
+"""
+Cold start profile of the app
+
+Starts a fresh interpreter that imports streamlit, then the modules app.py
+imports, renders the app headlessly for the first time and visits every other
+page once. Reports each phase, the slowest imports (from python -X importtime)
+and the time from launch to first render against a budget.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+from ..pages import PAGES
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+# Launch to first rendered page of a cold process, including interpreter startup
+DEFAULT_BUDGET_MS = 2500
+SLOWEST_IMPORTS = 10
+
+# Runs in the fresh interpreter: times each phase and prints them as JSON
+CHILD = """
+import json, sys, time
+
+timings = {}
+
+def timed(phase, run):
+    start = time.perf_counter()
+    result = run()
+    timings[phase] = (time.perf_counter() - start) * 1000
+    return result
+
+root, pages = sys.argv[1], json.loads(sys.argv[2])
+timed("import streamlit", lambda: __import__("streamlit"))
+sys.path.insert(0, root)
+timed("import app modules", lambda: __import__("app"))
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(root + "/app.py", default_timeout=600)
+timed("first render", app.run)
+ready = time.time()
+for page in pages:
+    timed("first visit: " + page, app.sidebar.radio[0].set_value(page).run)
+errors = [exception.message for exception in app.exception]
+print(json.dumps({"timings": timings, "ready": ready, "errors": errors}))
+"""
+
+
+def slowest_imports(importtime: str, count: int = SLOWEST_IMPORTS) -> List[tuple]:
+    """(self ms, cumulative ms, module) of the slowest imports in -X importtime output"""
+    imports = []
+    for line in importtime.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) == 3 and fields[0].strip().isdigit():
+            imports.append((int(fields[0]) / 1000, int(fields[1]) / 1000, fields[2].strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def profile_startup(storage_path: Optional[str] = None) -> dict:
+    """Phase timings (ms) of a cold start, the launch-to-first-render time and slowest imports"""
+    env = dict(os.environ)
+    if storage_path:
+        env["FLIPZY_STORAGE"] = storage_path
+    pages = [page for page in PAGES if page != next(iter(PAGES))]
+    launched = time.time()
+    child = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD, ROOT, json.dumps(pages)],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if child.returncode != 0:
+        raise RuntimeError(f"Startup profile failed:\n{child.stderr[-2000:]}")
+    report = json.loads(child.stdout.strip().splitlines()[-1])
+    report["cold_start_ms"] = (report.pop("ready") - launched) * 1000
+    report["slowest_imports"] = slowest_imports(child.stderr)
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Profile the cold start of the app")
+    parser.add_argument("--storage", help="card file to start with (default: FLIPZY_STORAGE)")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    args = parser.parse_args(argv)
+
+    report = profile_startup(args.storage)
+    for phase, duration in report["timings"].items():
+        print(f"  {phase:<35} {duration:>9.1f} ms")
+    print("Slowest imports (self / cumulative):")
+    for self_ms, cumulative_ms, module in report["slowest_imports"]:
+        print(f"  {module:<35} {self_ms:>9.1f} ms {cumulative_ms:>9.1f} ms")
+    for error in report["errors"]:
+        print(f"ERROR {error}")
+
+    within = report["cold_start_ms"] <= args.budget_ms
+    print(
+        f"Cold start to first render: {report['cold_start_ms']:.0f} ms "
+        f"(budget {args.budget_ms:.0f} ms{'' if within else ', EXCEEDED'})"
+    )
+    raise SystemExit(0 if within and not report["errors"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Timings of the hot paths on synthetic decks, with a baseline comparison
+
+Every benchmark runs against a fresh copy of a generated deck, once as a
+warm-up and then repeat times. Results are written as JSON:
+{"meta": {...}, "results": {"<deck size>": {"<benchmark>": {"median_ms": ...}}}}.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from itertools import cycle
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from .. import config
+from ..binary_storage import convert_storage
+from ..spaced_repetition import SpacedRepetition
+from ..storage import Storage, create_storage
+from .deck import write_deck
+
+APP_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "app.py")
+DECK_DIR = "data/benchmarks/decks"
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+# A benchmark is reported as a regression when its median is this much slower
+DEFAULT_THRESHOLD = 0.25
+CALLS_PER_RUN = 1000
+
+
+def _load_cold(storage: Storage) -> Callable:
+    def run():
+        storage.invalidate_cache()
+        return storage.load_cards()
+
+    return run
+
+
+def _stats_cold(storage: Storage) -> Callable:
+    def run():
+        storage.invalidate_cache()
+        return storage.get_stats()
+
+    return run
+
+
+def _save_cards(storage: Storage) -> Callable:
+    cards = storage.load_cards()
+    return lambda: storage.save_cards(cards)
+
+
+def _update_card(storage: Storage) -> Callable:
+    card_ids = cycle(list(storage.columns.ids())[:CALLS_PER_RUN])
+
+    def run():
+        card = storage.get_card_by_id(next(card_ids))
+        card.back += "."
+        storage.update_card(card)
+
+    return run
+
+
+def _list_get_due_cards(storage: Storage) -> Callable:
+    cards = storage.load_cards()
+    return lambda: SpacedRepetition.get_due_cards(cards)
+
+
+def _list_get_stats(storage: Storage) -> Callable:
+    cards = storage.load_cards()
+    return lambda: SpacedRepetition.get_stats(cards)
+
+
+def _calculate_next_review(storage: Storage) -> Callable:
+    cards = storage.get_cards(list(storage.columns.ids())[:CALLS_PER_RUN])
+
+    def run():
+        for quality, card in enumerate(cards):
+            SpacedRepetition.calculate_next_review(card, quality % 6)
+
+    return run
+
+
+def _search(storage: Storage) -> Callable:
+    # Part of a real word, so the query has matches
+    query = storage.columns.text("front", storage.columns.rows()[0])[:3]
+    return lambda: storage.search(query)
+
+
+def _app_rerun(page: Optional[str] = None) -> Callable[[Storage], Callable]:
+    def setup(storage: Storage) -> Callable:
+        from streamlit.testing.v1 import AppTest
+
+        config.STORAGE_PATH = storage.file_path
+        config.get_decks.clear()
+        app = AppTest.from_file(APP_PATH, default_timeout=600)
+        app.run()
+        if page:
+            app.sidebar.radio[0].set_value(page).run()
+        return app.run
+
+    return setup
+
+
+# Name -> setup(storage) returning the operation to time
+BENCHMARKS: Dict[str, Callable[[Storage], Callable]] = {
+    "storage.load_cards (cold)": _load_cold,
+    "storage.load_cards (cached)": lambda storage: storage.load_cards,
+    "storage.save_cards": _save_cards,
+    "storage.update_card": _update_card,
+    "storage.get_due_cards": lambda storage: storage.get_due_cards,
+    "storage.get_stats": lambda storage: storage.get_stats,
+    "storage.get_stats (cold)": _stats_cold,
+    "SpacedRepetition.get_due_cards": _list_get_due_cards,
+    "SpacedRepetition.get_stats": _list_get_stats,
+    f"SpacedRepetition.calculate_next_review x{CALLS_PER_RUN}": _calculate_next_review,
+    "search (Manage Cards filter)": _search,
+    "app rerun (Home)": _app_rerun(),
+    "app rerun (Manage Cards)": _app_rerun("📝 Manage Cards"),
+}
+
+
+def time_runs(run: Callable, repeat: int) -> dict:
+    """Time repeat calls of run after one warm-up call"""
+    run()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "median_ms": statistics.median(times),
+        "min_ms": min(times),
+        "mean_ms": statistics.fmean(times),
+        "runs": repeat,
+    }
+
+
+def deck_path(size: int, seed: int) -> str:
+    """Generated deck of size cards, written on first use and reused afterwards"""
+    path = os.path.join(DECK_DIR, f"deck-{size}-{seed}.json")
+    if not os.path.exists(path):
+        write_deck(path, size, seed)
+    return path
+
+
+def run_benchmarks(
+    sizes=DEFAULT_SIZES,
+    repeat: int = 5,
+    seed: int = 0,
+    names: Optional[List[str]] = None,
+    progress: Optional[Callable[[int, str, dict], None]] = None,
+    extension: str = ".json",
+) -> dict:
+    """Run the benchmarks (all, or those whose name contains one of names)
+
+    extension selects the storage format the decks are converted to.
+    """
+    selected = [name for name in BENCHMARKS if not names or any(part in name for part in names)]
+    results = {}
+    for size in sizes:
+        source = deck_path(size, seed)
+        results[str(size)] = {}
+        for name in selected:
+            with tempfile.TemporaryDirectory() as work_dir:
+                path = os.path.join(work_dir, "deck" + extension)
+                if extension == ".json":
+                    shutil.copyfile(source, path)
+                else:
+                    convert_storage(source, path)
+                timing = time_runs(BENCHMARKS[name](create_storage(path)), repeat)
+            results[str(size)][name] = timing
+            if progress:
+                progress(size, name, timing)
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "seed": seed,
+            "repeat": repeat,
+            "format": extension,
+        },
+        "results": results,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """Describe the benchmarks whose median is more than threshold slower than baseline"""
+    regressions = []
+    for size, timings in results["results"].items():
+        for name, timing in timings.items():
+            base = baseline["results"].get(size, {}).get(name)
+            if base and timing["median_ms"] > base["median_ms"] * (1 + threshold):
+                regressions.append(
+                    f"{name} @ {size} cards: {base['median_ms']:.2f} ms -> "
+                    f"{timing['median_ms']:.2f} ms ({timing['median_ms'] / base['median_ms']:.2f}x)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths on synthetic decks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="run benchmarks whose name contains these")
+    parser.add_argument("--format", default=".json", help="storage format: .json, .npz or .db")
+    parser.add_argument("--output", default="data/benchmarks/results.json")
+    parser.add_argument("--baseline", default="data/benchmarks/baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="store results as baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    def report(size: int, name: str, timing: dict):
+        print(f"{size:>9} cards  {name:<45} {timing['median_ms']:>10.2f} ms")
+
+    results = run_benchmarks(args.sizes, args.repeat, args.seed, args.only, report, args.format)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        print(f"{len(regressions)} regressions against {args.baseline}")
+        raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Binary columnar storage backend for vocabulary cards
+"""
+
+import argparse
+import os
+from typing import Iterator
+
+import numpy as np
+
+from .columnar import CardColumns, serialize_rows
+from .storage import Storage, create_storage
+
+# Cards serialized at a time when streaming the archive
+CHUNK_ROWS = 1000
+
+
+class BinaryStorage(Storage):
+    """Stores the snapshot as a NumPy .npz archive of the deck's columns
+
+    Loading copies whole arrays into place instead of decoding every field of
+    every card: timestamps are int64 microseconds since the epoch and text is
+    one UTF-8 string table. Writes use the JSON journal like Storage.
+    """
+
+    def __init__(self, file_path: str = "data/vocabulary_cards.npz"):
+        super().__init__(file_path)
+
+    def _sidecar_path(self, suffix: str) -> str:
+        # cards.npz.journal, so a JSON deck of the same name keeps its own journal
+        return self.file_path + suffix
+
+    def _ensure_file_exists(self):
+        """Create an empty archive if it doesn't exist"""
+        if not os.path.exists(self.file_path):
+            self._write_columns(CardColumns())
+
+    def _read_snapshot(self) -> CardColumns:
+        """Load the columns from the archive"""
+        try:
+            with np.load(self.file_path) as arrays:
+                return CardColumns.from_arrays(arrays)
+        except FileNotFoundError:
+            return CardColumns()
+
+    def _iter_snapshot(self, f) -> Iterator[dict]:
+        """Cards of the archive a chunk at a time
+
+        The columns are read whole but strings are only decoded for the cards
+        being serialized, so no CardColumns or string table is built.
+        """
+        with np.load(f) as archive:
+            names = [*CardColumns.NUMERIC_COLUMNS, *CardColumns.TEXT_COLUMNS]
+            arrays = {name: archive[name] for name in names}
+            id_text = archive["id_data"].tobytes().decode("utf-8")
+            id_offsets = archive["id_offsets"]
+            text = archive["string_data"].tobytes().decode("utf-8")
+            offsets = archive["string_offsets"]
+
+        def string(string_id: int):
+            return None if string_id < 0 else text[offsets[string_id] : offsets[string_id + 1]]
+
+        for start in range(0, len(id_offsets) - 1, CHUNK_ROWS):
+            bounds = id_offsets[start : start + CHUNK_ROWS + 1].tolist()
+            ids = [id_text[begin:end] for begin, end in zip(bounds, bounds[1:])]
+            chunk = {name: array[start : start + len(ids)] for name, array in arrays.items()}
+            yield from serialize_rows(ids, chunk, string)
+
+    def _write_snapshot(self, f, columns: CardColumns):
+        """Write the live rows as an uncompressed archive"""
+        np.savez(f, **columns.to_arrays())
+
+
+def convert_storage(source_path: str, target_path: str) -> int:
+    """Copy a deck between storage formats (chosen by file extension)
+
+    Returns the number of copied cards.
+    """
+    columns = create_storage(source_path).columns
+    create_storage(target_path)._replace_columns(columns)
+    return len(columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a card file to another format")
+    parser.add_argument("source_path", nargs="?", default="data/vocabulary_cards.json")
+    parser.add_argument("target_path", nargs="?", default="data/vocabulary_cards.npz")
+    args = parser.parse_args()
+
+    count = convert_storage(args.source_path, args.target_path)
+    print(f"Converted {count} cards from {args.source_path} to {args.target_path}")
+
+
+if __name__ == "__main__":
+    main()
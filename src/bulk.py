@@ -0,0 +1,171 @@
+"""
+Bulk scheduling operations over a whole deck, vectorized with NumPy
+
+Each operation selects its rows and computes their new values inside
+Storage.update_schedules, on the current deck under the write lock.
+"""
+
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from .columnar import DAY_MICROS, NO_TIME, CardColumns, to_micros
+from .review_log import review_records
+from .spaced_repetition import SpacedRepetition
+from .storage import Storage
+
+
+def _select_rows(columns: CardColumns, category: Optional[str] = None) -> np.ndarray:
+    return columns.rows() if category is None else columns.category_rows(category)
+
+
+def reset_category(storage: Storage, category: str, now: Optional[datetime] = None) -> int:
+    """Reset every card in a category to the new, unreviewed state
+
+    Returns the number of reset cards.
+    """
+    next_review = to_micros(now or datetime.now())
+    return storage.update_schedules(
+        lambda columns: (
+            _select_rows(columns, category),
+            dict(
+                ease_factor=2.5,
+                interval=1,
+                repetitions=0,
+                next_review=next_review,
+                last_reviewed=NO_TIME,
+            ),
+        )
+    )
+
+
+def shift_schedules(storage: Storage, days: int, category: Optional[str] = None) -> int:
+    """Move the next review of every card (optionally in one category) by days
+
+    Useful after a break: shifting by the length of the break keeps the
+    backlog from landing on a single day. Returns the number of shifted cards.
+    """
+
+    def shift(columns: CardColumns):
+        rows = _select_rows(columns, category)
+        return rows, dict(next_review=columns.next_review[rows] + days * DAY_MICROS)
+
+    return storage.update_schedules(shift)
+
+
+def apply_reviews(
+    storage: Storage,
+    card_ids: Iterable[str],
+    qualities: Iterable[int],
+    reviewed_at: Optional[datetime] = None,
+) -> int:
+    """Rate many cards at once, as if each was reviewed at reviewed_at
+
+    Unknown IDs are skipped. Returns the number of rated cards.
+    """
+    return replay_history(
+        storage,
+        (
+            (card_id, quality, reviewed_at or datetime.now())
+            for card_id, quality in zip(card_ids, qualities)
+        ),
+    )
+
+
+def replay_history(storage: Storage, events: Iterable[Tuple[str, int, datetime]]) -> int:
+    """Replay (card_id, quality, reviewed_at) review events through SM-2
+
+    Events are applied in time order. Each pass rates every card that still has
+    a review left in one vectorized call, so the number of passes is the
+    length of the longest per-card history rather than the number of events.
+    Every rating is appended to the review log. Unknown IDs are skipped.
+    Returns the number of replayed events.
+    """
+    events = sorted(events, key=lambda event: event[2])
+    replayed = []
+
+    def replay(columns: CardColumns):
+        touched, values = _replay(columns, events)
+        replayed.append(len(values.get("reviews", ())))
+        return touched, values
+
+    storage.update_schedules(replay)
+    return replayed[0]
+
+
+def _replay(columns: CardColumns, events: list) -> tuple:
+    """Rows changed by time-sorted events and their new values, for update_schedules"""
+    rows, qualities, times = [], [], []
+    for card_id, quality, reviewed_at in events:
+        row = columns.row_of(card_id)
+        if row is not None:
+            rows.append(row)
+            qualities.append(quality)
+            times.append(to_micros(reviewed_at))
+    if not rows:
+        return [], {}
+
+    rows = np.array(rows, dtype=np.intp)
+    qualities = np.array(qualities, dtype=np.int64)
+    times = np.array(times, dtype=np.int64)
+
+    # Position of each event within its card's history (events are time sorted)
+    order = np.argsort(rows, kind="stable")
+    sorted_rows = rows[order]
+    starts = np.flatnonzero(np.r_[True, sorted_rows[1:] != sorted_rows[:-1]])
+    run_lengths = np.diff(np.r_[starts, len(sorted_rows)])
+    position = np.empty(len(rows), dtype=np.int64)
+    position[order] = np.arange(len(rows)) - np.repeat(starts, run_lengths)
+
+    touched = np.unique(rows)
+    ease_factor = columns.ease_factor.copy()
+    interval = columns.interval.astype(np.int64)
+    repetitions = columns.repetitions.astype(np.int64)
+    next_review = columns.next_review.copy()
+    last_reviewed = columns.last_reviewed.copy()
+    # Schedule before and after each event, for the review log
+    previous_ease_factor, new_ease_factor = np.empty(len(rows)), np.empty(len(rows))
+    previous_interval = np.empty(len(rows), dtype=np.int64)
+    new_interval = np.empty(len(rows), dtype=np.int64)
+    previous_repetitions = np.empty(len(rows), dtype=np.int64)
+
+    for step in range(int(position.max()) + 1):
+        batch = position == step
+        batch_rows = rows[batch]
+        previous_ease_factor[batch] = ease_factor[batch_rows]
+        previous_interval[batch] = interval[batch_rows]
+        previous_repetitions[batch] = repetitions[batch_rows]
+        ease, ivl, reps = SpacedRepetition.calculate_next_review_batch(
+            ease_factor[batch_rows],
+            interval[batch_rows],
+            repetitions[batch_rows],
+            qualities[batch],
+        )
+        new_ease_factor[batch], new_interval[batch] = ease, ivl
+        ease_factor[batch_rows] = ease
+        interval[batch_rows] = ivl
+        repetitions[batch_rows] = reps
+        last_reviewed[batch_rows] = times[batch]
+        next_review[batch_rows] = times[batch] + ivl * DAY_MICROS
+
+    reviews = review_records(
+        [columns.id_of(row) for row in rows.tolist()],
+        [columns.text("category", row) for row in rows.tolist()],
+        times,
+        qualities,
+        previous_ease_factor,
+        new_ease_factor,
+        previous_interval,
+        new_interval,
+        previous_repetitions,
+    )
+
+    return touched, dict(
+        reviews=reviews,
+        ease_factor=ease_factor[touched],
+        interval=interval[touched],
+        repetitions=repetitions[touched],
+        next_review=next_review[touched],
+        last_reviewed=last_reviewed[touched],
+    )
@@ -0,0 +1,28 @@
+"""
+JSON encoding for decks and journals
+
+Uses orjson when it is installed (pip install orjson, or the "fast" extra),
+and the standard library otherwise. Both produce interchangeable files, and
+both raise json.JSONDecodeError for invalid input.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library is used instead
+    orjson = None
+
+
+def loads(data):
+    """Decode JSON from bytes or str"""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value, indent: bool = False) -> bytes:
+    """Encode a value as UTF-8 JSON, optionally indented by two spaces"""
+    if orjson:
+        return orjson.dumps(value, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(value, indent=2 if indent else None).encode("utf-8")
@@ -0,0 +1,453 @@
+"""
+Columnar in-memory representation of a deck
+
+Scheduling fields are stored in typed NumPy arrays and text in an interned
+string table, so a large deck costs a few bytes per card plus its text instead
+of one pydantic model with three datetime objects per card. Card objects are
+only built for the rows a caller asks for.
+"""
+
+import warnings
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .spaced_repetition import MASTERED_INTERVAL, MASTERED_REPETITIONS, Card
+
+EPOCH = datetime(1970, 1, 1)
+DAY_MICROS = 86_400_000_000
+# Stored in timestamp columns for a missing datetime (last_reviewed of a new card)
+NO_TIME = np.iinfo(np.int64).min
+INITIAL_CAPACITY = 64
+
+
+def to_micros(dt: Optional[datetime]) -> int:
+    """Convert a naive datetime to microseconds since the epoch (wall clock, no timezone)"""
+    if dt is None:
+        return NO_TIME
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value: int) -> Optional[datetime]:
+    """Inverse of to_micros"""
+    if value == NO_TIME:
+        return None
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def parse_micros(value, default: int = NO_TIME) -> int:
+    """Convert a serialized (ISO string) or parsed datetime to microseconds"""
+    if not value:
+        return default
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return to_micros(value)
+
+
+def parse_micros_array(values: list, default: int = NO_TIME) -> np.ndarray:
+    """parse_micros of many values at once (NumPy parses naive ISO strings in bulk)"""
+    try:
+        with warnings.catch_warnings():
+            # Timezone-aware strings warn; parse_micros rejects them like before
+            warnings.simplefilter("error")
+            micros = np.array(values, dtype="datetime64[us]").astype(np.int64)
+    except (ValueError, TypeError, UserWarning):
+        return np.array([parse_micros(value, default) for value in values], dtype=np.int64)
+    micros[micros == NO_TIME] = default
+    return micros
+
+
+def format_micros_array(micros: np.ndarray) -> List[Optional[str]]:
+    """ISO strings of many timestamps, as isoformat writes them (None for NO_TIME)"""
+    strings = np.datetime_as_string(micros.astype("datetime64[us]")).tolist()
+    return [
+        None if string == "NaT" else string[:-7] if string.endswith(".000000") else string
+        for string in strings
+    ]
+
+
+def schedule_stats(
+    alive: np.ndarray,
+    next_review: np.ndarray,
+    interval: np.ndarray,
+    repetitions: np.ndarray,
+    now: Optional[datetime] = None,
+) -> dict:
+    """SpacedRepetition.get_stats computed from aligned scheduling columns"""
+    total = int(np.count_nonzero(alive))
+    new = int(np.count_nonzero(alive & (repetitions == 0)))
+    mastered = int(
+        np.count_nonzero(
+            alive & (repetitions >= MASTERED_REPETITIONS) & (interval >= MASTERED_INTERVAL)
+        )
+    )
+    due = int(np.count_nonzero(alive & (next_review <= to_micros(now or datetime.now()))))
+    return {
+        "total_cards": total,
+        "due_for_review": due,
+        "mastered": mastered,
+        "new_cards": new,
+        "in_progress": total - new - mastered,
+    }
+
+
+def pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Strings as one UTF-8 byte array and their character offsets"""
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in strings], out=offsets[1:])
+    return np.frombuffer("".join(strings).encode("utf-8"), dtype=np.uint8), offsets
+
+
+def unpack_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """Inverse of pack_strings"""
+    text = data.tobytes().decode("utf-8")
+    bounds = offsets.tolist()
+    return [text[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def serialize_rows(
+    ids: List[str], arrays: Dict[str, np.ndarray], string: Callable[[int], Optional[str]]
+) -> List[dict]:
+    """Cards in the JSON storage format from aligned column arrays, column by column
+
+    Text columns hold string IDs, which string resolves (-1 to None).
+    """
+    fields = {"id": ids}
+    for name in CardColumns.TEXT_COLUMNS:
+        fields[name] = [string(string_id) for string_id in arrays[name].tolist()]
+    fields["created_at"] = format_micros_array(arrays["created_at"])
+    for name in ("ease_factor", "interval", "repetitions"):
+        fields[name] = arrays[name].tolist()
+    fields["next_review"] = format_micros_array(arrays["next_review"])
+    fields["last_reviewed"] = format_micros_array(arrays["last_reviewed"])
+    fields["version"] = arrays["version"].tolist()
+    names = list(fields)
+    return [dict(zip(names, values)) for values in zip(*fields.values())]
+
+
+class StringTable:
+    """Interned strings addressed by integer ID (-1 stands for None)"""
+
+    def __init__(self):
+        self._strings: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._strings)
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(value)
+            self._ids[value] = string_id
+        return string_id
+
+    def find(self, value: str) -> Optional[int]:
+        """ID of an already interned string, without interning it"""
+        return self._ids.get(value)
+
+    def get(self, string_id: int) -> Optional[str]:
+        return None if string_id < 0 else self._strings[string_id]
+
+
+class CardColumns:
+    """A deck stored column by column
+
+    Rows are never renumbered while the object lives: deleting a card only
+    clears its row, so row numbers can be used as stable handles by indexes.
+    """
+
+    NUMERIC_COLUMNS = {
+        "ease_factor": np.float64,
+        "interval": np.int32,
+        "repetitions": np.int32,
+        "next_review": np.int64,
+        "last_reviewed": np.int64,
+        "created_at": np.int64,
+        "version": np.int64,
+    }
+    TEXT_COLUMNS = ("front", "back", "category", "example")
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.strings = StringTable()
+        self._size = 0
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._arrays = {
+            name: np.zeros(capacity, dtype=dtype) for name, dtype in self.NUMERIC_COLUMNS.items()
+        }
+        for name in self.TEXT_COLUMNS:
+            self._arrays[name] = np.full(capacity, -1, dtype=np.int32)
+        self._arrays["alive"] = np.zeros(capacity, dtype=bool)
+
+    @classmethod
+    def from_cards(cls, cards: Iterable[Card]) -> "CardColumns":
+        columns = cls()
+        for card in cards:
+            columns.put(card)
+        return columns
+
+    @classmethod
+    def from_dicts(cls, items: Iterable[dict]) -> "CardColumns":
+        """Build columns from serialized cards without creating Card objects
+
+        Each field is converted for all cards at once; a card ID seen again
+        overwrites the earlier card in place.
+        """
+        items = list({item["id"]: item for item in items}.values())
+        columns = cls(max(len(items), INITIAL_CAPACITY))
+        columns._ids = [item["id"] for item in items]
+        columns._rows = {card_id: row for row, card_id in enumerate(columns._ids)}
+        columns._size = size = len(items)
+        arrays = columns._arrays
+        intern = columns.strings.intern
+        now = to_micros(datetime.now())
+
+        arrays["front"][:size] = [intern(item["front"]) for item in items]
+        arrays["back"][:size] = [intern(item["back"]) for item in items]
+        arrays["category"][:size] = [intern(item.get("category") or "general") for item in items]
+        arrays["example"][:size] = [intern(item.get("example")) for item in items]
+        arrays["ease_factor"][:size] = [float(item.get("ease_factor", 2.5)) for item in items]
+        arrays["interval"][:size] = [int(item.get("interval", 1)) for item in items]
+        arrays["repetitions"][:size] = [int(item.get("repetitions", 0)) for item in items]
+        arrays["version"][:size] = [int(item.get("version") or 0) for item in items]
+        for name in ("next_review", "last_reviewed", "created_at"):
+            default = NO_TIME if name == "last_reviewed" else now
+            arrays[name][:size] = parse_micros_array([item.get(name) for item in items], default)
+        arrays["alive"][:size] = True
+        return columns
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """The live rows as plain arrays (see from_arrays), for binary snapshots"""
+        rows = self.rows()
+        arrays = {name: self._arrays[name][rows] for name in self.NUMERIC_COLUMNS}
+        for name in self.TEXT_COLUMNS:
+            arrays[name] = self._arrays[name][rows]
+        arrays["id_data"], arrays["id_offsets"] = pack_strings([self._ids[row] for row in rows])
+        arrays["string_data"], arrays["string_offsets"] = pack_strings(list(self.strings))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "CardColumns":
+        """Columns from the arrays written by to_arrays"""
+        ids = unpack_strings(arrays["id_data"], arrays["id_offsets"])
+        columns = cls(max(len(ids), INITIAL_CAPACITY))
+        columns._ids = ids
+        columns._rows = {card_id: row for row, card_id in enumerate(ids)}
+        columns._size = size = len(ids)
+        for name in list(cls.NUMERIC_COLUMNS) + list(cls.TEXT_COLUMNS):
+            columns._arrays[name][:size] = arrays[name]
+        columns._arrays["alive"][:size] = True
+        strings = columns.strings
+        strings._strings = unpack_strings(arrays["string_data"], arrays["string_offsets"])
+        strings._ids = {string: string_id for string_id, string in enumerate(strings._strings)}
+        return columns
+
+    def copy(self) -> "CardColumns":
+        """A compacted copy of the live rows, for reading outside the storage lock
+
+        The string table is shared: strings are only ever appended to it.
+        """
+        rows = self.rows()
+        columns = CardColumns(max(len(rows), INITIAL_CAPACITY))
+        columns.strings = self.strings
+        columns._ids = [self._ids[row] for row in rows.tolist()]
+        columns._rows = {card_id: row for row, card_id in enumerate(columns._ids)}
+        columns._size = size = len(rows)
+        for name in list(self.NUMERIC_COLUMNS) + list(self.TEXT_COLUMNS):
+            columns._arrays[name][:size] = self._arrays[name][rows]
+        columns._arrays["alive"][:size] = True
+        return columns
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, card_id: str) -> bool:
+        return card_id in self._rows
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        # Column views over the used rows, e.g. columns.next_review
+        arrays = self.__dict__.get("_arrays")
+        if arrays is not None and name in arrays:
+            return arrays[name][: self._size]
+        raise AttributeError(name)
+
+    def _grow(self):
+        capacity = max(INITIAL_CAPACITY, len(self._arrays["alive"]) * 2)
+        for name, array in self._arrays.items():
+            grown = np.full(capacity, -1 if name in self.TEXT_COLUMNS else 0, dtype=array.dtype)
+            grown[: len(array)] = array
+            self._arrays[name] = grown
+
+    def _row_for(self, card_id: str) -> int:
+        """Row of an existing card, or a new row for an unknown ID"""
+        row = self._rows.get(card_id)
+        if row is None:
+            if self._size == len(self._arrays["alive"]):
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._ids.append(card_id)
+            self._rows[card_id] = row
+        return row
+
+    def _set_values(self, row: int, **values):
+        for name, value in values.items():
+            if name in self.TEXT_COLUMNS:
+                value = self.strings.intern(value)
+            self._arrays[name][row] = value
+        self._arrays["alive"][row] = True
+
+    def row_of(self, card_id: str) -> Optional[int]:
+        return self._rows.get(card_id)
+
+    def id_of(self, row: int) -> Optional[str]:
+        return self._ids[row]
+
+    def rows(self) -> np.ndarray:
+        """Row numbers of live cards, in insertion order"""
+        return np.flatnonzero(self.alive)
+
+    def category_rows(self, category: str) -> np.ndarray:
+        """Row numbers of live cards in a category"""
+        string_id = self.strings.find(category)
+        if string_id is None:
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(self.alive & (self.category == string_id))
+
+    def ids(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def put(self, card: Card) -> int:
+        """Insert or overwrite a card and return its row"""
+        row = self._row_for(card.id)
+        self._set_values(
+            row,
+            front=card.front,
+            back=card.back,
+            category=card.category,
+            example=card.example,
+            ease_factor=card.ease_factor,
+            interval=card.interval,
+            repetitions=card.repetitions,
+            next_review=to_micros(card.next_review),
+            last_reviewed=to_micros(card.last_reviewed),
+            created_at=to_micros(card.created_at),
+            version=card.version,
+        )
+        return row
+
+    def delete(self, card_id: str) -> Optional[int]:
+        """Clear a card's row and return it"""
+        row = self._rows.pop(card_id, None)
+        if row is not None:
+            self._ids[row] = None
+            self._arrays["alive"][row] = False
+        return row
+
+    def text(self, name: str, row: int) -> Optional[str]:
+        return self.strings.get(int(self._arrays[name][row]))
+
+    def card(self, row: int) -> Card:
+        """Materialize the Card stored in a row"""
+        arrays = self._arrays
+        return Card.model_construct(
+            id=self._ids[row],
+            front=self.text("front", row),
+            back=self.text("back", row),
+            category=self.text("category", row),
+            example=self.text("example", row),
+            created_at=from_micros(arrays["created_at"][row]),
+            ease_factor=float(arrays["ease_factor"][row]),
+            interval=int(arrays["interval"][row]),
+            repetitions=int(arrays["repetitions"][row]),
+            next_review=from_micros(arrays["next_review"][row]),
+            last_reviewed=from_micros(arrays["last_reviewed"][row]),
+            version=int(arrays["version"][row]),
+        )
+
+    def cards(self, rows: Optional[Iterable[int]] = None) -> List[Card]:
+        """Materialize the cards of the given rows (default: all live rows)"""
+        if rows is None:
+            rows = self.rows()
+        return [self.card(row) for row in rows]
+
+    def row_dict(self, row: int) -> dict:
+        """Serialize a row to the JSON storage format"""
+        card_dict = {"id": self._ids[row]}
+        for name in ("front", "back", "category", "example"):
+            card_dict[name] = self.text(name, row)
+        card_dict["created_at"] = from_micros(self._arrays["created_at"][row]).isoformat()
+        card_dict["ease_factor"] = float(self._arrays["ease_factor"][row])
+        card_dict["interval"] = int(self._arrays["interval"][row])
+        card_dict["repetitions"] = int(self._arrays["repetitions"][row])
+        card_dict["next_review"] = from_micros(self._arrays["next_review"][row]).isoformat()
+        last_reviewed = from_micros(self._arrays["last_reviewed"][row])
+        card_dict["last_reviewed"] = last_reviewed.isoformat() if last_reviewed else None
+        card_dict["version"] = int(self._arrays["version"][row])
+        return card_dict
+
+    def row_dicts(self, rows: Optional[np.ndarray] = None) -> List[dict]:
+        """row_dict of many rows (default: all live rows), converting column by column"""
+        if rows is None:
+            rows = self.rows()
+        return serialize_rows(
+            [self._ids[row] for row in rows.tolist()],
+            {name: array[rows] for name, array in self._arrays.items()},
+            self.strings.get,
+        )
+
+    def put_dict(self, item: dict) -> int:
+        """Insert or overwrite a serialized card and return its row"""
+        row = self._row_for(item["id"])
+        now = to_micros(datetime.now())
+        self._set_values(
+            row,
+            front=item["front"],
+            back=item["back"],
+            category=item.get("category") or "general",
+            example=item.get("example"),
+            ease_factor=float(item.get("ease_factor", 2.5)),
+            interval=int(item.get("interval", 1)),
+            repetitions=int(item.get("repetitions", 0)),
+            next_review=parse_micros(item.get("next_review"), now),
+            last_reviewed=parse_micros(item.get("last_reviewed")),
+            created_at=parse_micros(item.get("created_at"), now),
+            version=int(item.get("version") or 0),
+        )
+        return row
+
+    def update_schedule(self, card_id: str, item: dict) -> Optional[int]:
+        """Overwrite a card's schedule fields and version from a serialized review"""
+        row = self._rows.get(card_id)
+        if row is not None:
+            self._set_values(
+                row,
+                ease_factor=float(item["ease_factor"]),
+                interval=int(item["interval"]),
+                repetitions=int(item["repetitions"]),
+                next_review=parse_micros(item["next_review"]),
+                last_reviewed=parse_micros(item.get("last_reviewed")),
+                version=int(item.get("version") or 0),
+            )
+        return row
+
+    def due_mask(self, now: Optional[datetime] = None) -> np.ndarray:
+        """Boolean mask over all rows of live cards due at now"""
+        return self.alive & (self.next_review <= to_micros(now or datetime.now()))
+
+    def stats(self, now: Optional[datetime] = None) -> dict:
+        """Full vectorized recomputation of SpacedRepetition.get_stats"""
+        return schedule_stats(self.alive, self.next_review, self.interval, self.repetitions, now)
+
+    def category_counts(self) -> Dict[str, int]:
+        """Full vectorized count of cards per category"""
+        string_ids, counts = np.unique(self.category[self.alive], return_counts=True)
+        return {self.strings.get(int(s)): int(c) for s, c in zip(string_ids, counts)}
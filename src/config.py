@@ -2,9 +2,20 @@
 Configuration and session state initialization
 """
 
+import os
+
 import streamlit as st
 
+from .decks import DEFAULT_DECK, DEFAULT_USER, DeckRegistry
+from .spaced_repetition import SpacedRepetition
 from .storage import Storage
+from .tracing import SpanStats, is_enabled
+
+# Card file of the default deck; a .db/.sqlite path selects the SQLite backend
+# (for every deck). Other decks are stored next to it, see DeckRegistry.
+STORAGE_PATH = os.environ.get("FLIPZY_STORAGE", "data/vocabulary_cards.json")
+# Buffer review ratings and store them in batches (see Storage.flush)
+WRITE_BEHIND = os.environ.get("FLIPZY_WRITE_BEHIND", "") == "1"
 
 
 def configure_page():
@@ -14,13 +25,49 @@ def configure_page():
     )
 
 
+@st.cache_resource
+def get_decks() -> DeckRegistry:
+    """Deck registry shared by every session, so each deck's cache is built once per process"""
+    return DeckRegistry(STORAGE_PATH)
+
+
+@st.cache_resource
+def get_scheduler() -> SpacedRepetition:
+    """Scheduler shared by every session"""
+    return SpacedRepetition()
+
+
+def get_storage() -> Storage:
+    """Storage of the default deck"""
+    return get_decks().open()
+
+
+def select_deck(deck: str):
+    """Make deck the session's working deck, creating it if the user has none by that name"""
+    decks = get_decks()
+    user = st.session_state.user
+    if deck not in decks.decks(user):
+        decks.create(user, deck)
+    st.session_state.deck = deck
+    st.session_state.storage = decks.open(user, deck)
+    # The review position belongs to the previous deck
+    st.session_state.pop("review_session", None)
+
+
 def initialize_session_state():
     """Initialize session state variables"""
+    if "user" not in st.session_state:
+        # Learners pick their partition with ?user=name; there is no login
+        st.session_state.user = st.query_params.get("user", DEFAULT_USER)
     if "storage" not in st.session_state:
-        st.session_state.storage = Storage()
+        select_deck(DEFAULT_DECK)
     if "current_card_index" not in st.session_state:
         st.session_state.current_card_index = 0
     if "show_answer" not in st.session_state:
         st.session_state.show_answer = False
     if "review_mode" not in st.session_state:
         st.session_state.review_mode = False
+    if "trace_enabled" not in st.session_state:
+        st.session_state.trace_enabled = is_enabled()
+    if "span_stats" not in st.session_state:
+        st.session_state.span_stats = SpanStats()
@@ -0,0 +1,109 @@
+"""
+Deck partitions: every deck of every user in its own storage file
+"""
+
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .storage import Storage, create_storage, file_lock
+
+DEFAULT_USER = "default"
+DEFAULT_DECK = "default"
+
+
+def slugify(name: str) -> str:
+    """File-name-safe form of a user or deck name"""
+    return re.sub(r"[^\w-]+", "-", name.strip().lower()).strip("-") or "deck"
+
+
+class DeckRegistry:
+    """Decks of every user, each stored in its own file and opened on demand
+
+    The manifest (decks.json next to the default card file) maps user and deck
+    names to storage files. The default deck of the default user is the
+    original card file, so an existing install needs no migration. Each opened
+    deck gets its own Storage, and with it its own cache, indexes, journal and
+    backups, so a session only ever loads the deck it works in.
+    """
+
+    def __init__(self, default_path: str = "data/vocabulary_cards.json"):
+        self.default_path = default_path
+        self.root = os.path.dirname(default_path) or "."
+        self.manifest_path = os.path.join(self.root, "decks.json")
+        # New decks use the backend of the default deck
+        self.extension = os.path.splitext(default_path)[1]
+        self._lock = threading.Lock()
+        self._storages: Dict[Tuple[str, str], Storage] = {}
+        self._manifest: Tuple[Optional[tuple], dict] = (None, {})
+
+    def _read_manifest(self) -> dict:
+        """The manifest, parsed again only when the file has changed (do not modify it)"""
+        signature = Storage._file_signature(self.manifest_path)
+        cached_signature, manifest = self._manifest
+        if signature is None or signature != cached_signature:
+            manifest = self._load_manifest()
+            self._manifest = (signature, manifest)
+        return manifest
+
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        manifest.setdefault(DEFAULT_USER, {}).setdefault(DEFAULT_DECK, {"path": self.default_path})
+        return manifest
+
+    def _write_manifest(self, manifest: dict):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def users(self) -> List[str]:
+        return sorted(self._read_manifest())
+
+    def decks(self, user: str = DEFAULT_USER) -> List[str]:
+        """Deck names of a user, sorted"""
+        return sorted(self._read_manifest().get(user, {}))
+
+    def path(self, user: str = DEFAULT_USER, deck: str = DEFAULT_DECK) -> Optional[str]:
+        """Storage file of a deck, or None if it does not exist"""
+        info = self._read_manifest().get(user, {}).get(deck)
+        return info["path"] if info else None
+
+    def create(self, user: str, deck: str) -> Storage:
+        """Register a new, empty deck and open it"""
+        deck = deck.strip()
+        if not deck:
+            raise ValueError("Deck name is required")
+        os.makedirs(self.root, exist_ok=True)
+        with file_lock(self.manifest_path + ".lock"):
+            manifest = self._load_manifest()
+            decks = manifest.setdefault(user, {})
+            if deck in decks:
+                raise ValueError(f"Deck '{deck}' already exists")
+            used = {info["path"] for info in decks.values()}
+            base = os.path.join(self.root, "decks", slugify(user), slugify(deck))
+            path, n = base + self.extension, 1
+            while path in used or os.path.exists(path):
+                n += 1
+                path = f"{base}-{n}{self.extension}"
+            decks[deck] = {"path": path, "created_at": datetime.now().isoformat()}
+            self._write_manifest(manifest)
+        return self.open(user, deck)
+
+    def open(self, user: str = DEFAULT_USER, deck: str = DEFAULT_DECK) -> Storage:
+        """Storage of a deck, shared by every caller in this process"""
+        with self._lock:
+            storage = self._storages.get((user, deck))
+            if storage is None:
+                path = self.path(user, deck)
+                if path is None:
+                    raise KeyError(f"No deck '{deck}' for user '{user}'")
+                storage = self._storages[(user, deck)] = create_storage(path)
+            return storage
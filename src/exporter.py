@@ -0,0 +1,208 @@
+"""
+Streaming export of cards as JSONL, CSV or JSON, optionally gzip-compressed
+
+Cards are serialized from a stream of card dicts a chunk at a time. Exports
+to a file stream them from the storage files (Storage.iter_card_dicts), so
+the deck is never loaded: memory stays at about a chunk of cards plus the
+journal, whatever the deck size.
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from .columnar import CardColumns, parse_micros, to_micros
+from .spaced_repetition import MASTERED_INTERVAL, MASTERED_REPETITIONS
+from .storage import Storage, create_storage
+
+FORMATS = {".jsonl": "jsonl", ".csv": "csv", ".json": "json"}
+CSV_FIELDS = (
+    "id",
+    "front",
+    "back",
+    "category",
+    "example",
+    "created_at",
+    "ease_factor",
+    "interval",
+    "repetitions",
+    "next_review",
+    "last_reviewed",
+    "version",
+)
+CHUNK_ROWS = 1000
+# wbits for zlib to write a gzip header and trailer
+GZIP_WBITS = 31
+
+
+def detect_format(filename: str) -> tuple:
+    """Return (format, compressed) from a file name such as cards.json.gz"""
+    name, ext = os.path.splitext(filename.lower())
+    compressed = ext == ".gz"
+    if compressed:
+        ext = os.path.splitext(name)[1]
+    fmt = FORMATS.get(ext)
+    if fmt is None:
+        raise ValueError(f"Unknown export format for {filename}")
+    return fmt, compressed
+
+
+def _filter_mask(
+    columns: CardColumns,
+    category: Optional[str] = None,
+    due_before: Optional[datetime] = None,
+    mastered: Optional[bool] = None,
+) -> np.ndarray:
+    """Mask over all rows of the live cards passing the filters"""
+    keep = columns.alive.copy()
+    if category is not None:
+        category_id = columns.strings.find(category)
+        if category_id is None:
+            return np.zeros_like(keep)
+        keep &= columns.category == category_id
+    if due_before is not None:
+        keep &= columns.next_review <= to_micros(due_before)
+    if mastered is not None:
+        is_mastered = (columns.repetitions >= MASTERED_REPETITIONS) & (
+            columns.interval >= MASTERED_INTERVAL
+        )
+        keep &= is_mastered == mastered
+    return keep
+
+
+def _filter_cards(
+    cards: Iterable[dict],
+    category: Optional[str] = None,
+    due_before: Optional[datetime] = None,
+    mastered: Optional[bool] = None,
+) -> Iterator[dict]:
+    """Cards passing the filters, in the CSV_FIELDS order"""
+    due_micros = None if due_before is None else to_micros(due_before)
+    for card in cards:
+        card = {name: card.get(name) for name in CSV_FIELDS}
+        card["category"] = card["category"] or "general"
+        if category is not None and card["category"] != category:
+            continue
+        if due_micros is not None and parse_micros(card["next_review"]) > due_micros:
+            continue
+        if mastered is not None:
+            is_mastered = (
+                card["repetitions"] >= MASTERED_REPETITIONS
+                and card["interval"] >= MASTERED_INTERVAL
+            )
+            if is_mastered != mastered:
+                continue
+        yield card
+
+
+def _chunks(cards: Iterable[dict], **filters) -> Iterator[list]:
+    """Filtered cards, CHUNK_ROWS at a time"""
+    cards = _filter_cards(cards, **filters)
+    while chunk := list(islice(cards, CHUNK_ROWS)):
+        yield chunk
+
+
+def export_text(cards: Iterable[dict], fmt: str, **filters) -> Iterator[str]:
+    """Serialize the filtered cards as pieces of text, one chunk of cards each
+
+    cards are serialized cards (as in the JSON storage format), consumed
+    as the pieces are.
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, CSV_FIELDS, lineterminator="\n")
+        writer.writeheader()
+        for chunk in _chunks(cards, **filters):
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    elif fmt == "jsonl":
+        for chunk in _chunks(cards, **filters):
+            yield "".join(json.dumps(card) + "\n" for card in chunk)
+    elif fmt == "json":
+        separator = "[\n"
+        for chunk in _chunks(cards, **filters):
+            for card in chunk:
+                yield separator + json.dumps(card)
+                separator = ",\n"
+        yield "[]\n" if separator == "[\n" else "\n]\n"
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+
+def export_bytes(
+    cards: Iterable[dict], fmt: str, compressed: bool = False, **filters
+) -> Iterator[bytes]:
+    """Like export_text, encoded as UTF-8 and optionally gzip-compressed"""
+    compressor = zlib.compressobj(wbits=GZIP_WBITS) if compressed else None
+    for text in export_text(cards, fmt, **filters):
+        data = text.encode("utf-8")
+        yield compressor.compress(data) if compressor else data
+    if compressor:
+        yield compressor.flush()
+
+
+def count_cards(columns: CardColumns, **filters) -> int:
+    """Number of cards of a loaded deck an export with these filters contains"""
+    return int(_filter_mask(columns, **filters).sum())
+
+
+def export_file(storage: Storage, path: str, **filters) -> int:
+    """Stream the filtered deck to path, in the format given by its extension
+
+    Cards are read from the storage files as they are written out, without
+    loading the deck. The file is written under a temporary name and renamed
+    when complete. Returns the number of exported cards.
+    """
+    fmt, compressed = detect_format(path)
+    count = 0
+
+    def counted(cards: Iterable[dict]) -> Iterator[dict]:
+        nonlocal count
+        for card in cards:
+            count += 1
+            yield card
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        cards = counted(_filter_cards(storage.iter_card_dicts(), **filters))
+        for data in export_bytes(cards, fmt, compressed):
+            f.write(data)
+    os.replace(tmp_path, path)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export cards as JSONL, CSV or JSON")
+    parser.add_argument("output", help="e.g. cards.jsonl, cards.csv or cards.json.gz")
+    parser.add_argument("storage_path", nargs="?", default="data/vocabulary_cards.json")
+    parser.add_argument("--category")
+    parser.add_argument("--due-before", type=datetime.fromisoformat, help="ISO date or time")
+    mastered = parser.add_mutually_exclusive_group()
+    mastered.add_argument("--mastered", action="store_true", default=None)
+    mastered.add_argument("--not-mastered", dest="mastered", action="store_false")
+    parser.set_defaults(mastered=None)
+    args = parser.parse_args()
+
+    count = export_file(
+        create_storage(args.storage_path),
+        args.output,
+        category=args.category,
+        due_before=args.due_before,
+        mastered=args.mastered,
+    )
+    print(f"Exported {count} cards from {args.storage_path} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Review workload forecast by Monte Carlo simulation of SM-2
+
+Every card is simulated forward from its current schedule: whenever it comes
+due it is given a random grade, rescheduled with the vectorized SM-2 step and
+counted on that day. Cards not due within the horizon are left out. Runs are
+independent, so they are simulated in chunks (cards x runs flattened into one
+array), one after another by default or on a thread pool with workers > 1;
+NumPy releases the GIL for the array operations, so threads use several
+cores without starting processes inside the Streamlit server.
+
+ForecastCache runs simulations off the Streamlit script thread and keeps
+their results across reruns and ratings.
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .columnar import DAY_MICROS, CardColumns, to_micros
+from .spaced_repetition import SpacedRepetition
+
+# Probability of grades 0-5 when no history is available
+DEFAULT_GRADE_PROBABILITIES = (0.05, 0.05, 0.10, 0.25, 0.35, 0.20)
+SECONDS_PER_REVIEW = 10
+# Simulated card-runs per chunk; bounds the memory of one simulation step
+CHUNK_CARD_RUNS = 2_000_000
+# Below this many card-runs the thread pool costs more than it saves
+PARALLEL_THRESHOLD = 4_000_000
+# Resolution of sampled grade probabilities
+GRADE_TABLE_SIZE = 4096
+# A forecast is reused for this long while the deck changes
+FORECAST_MAX_AGE = timedelta(minutes=10)
+# Forecasts kept per process (one per deck and settings)
+FORECAST_ENTRIES = 16
+
+# One simulation at a time, off the Streamlit script thread
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="forecast")
+
+
+def estimate_grade_probabilities(grades: Sequence[int], prior: float = 1.0) -> tuple:
+    """Estimate grade probabilities from observed grades"""
+    counts = np.bincount(np.asarray(grades, dtype=np.int64), minlength=6)[:6]
+    return grade_probabilities_from_counts(counts, prior)
+
+
+def grade_probabilities_from_counts(counts: Sequence[int], prior: float = 1.0) -> tuple:
+    """Estimate grade probabilities from the number of ratings of each grade 0-5
+
+    A pseudo-count of prior per grade, spread like the defaults, keeps grades
+    that were never observed possible.
+    """
+    counts = np.asarray(counts, dtype=float)[:6]
+    counts += prior * 6 * np.asarray(DEFAULT_GRADE_PROBABILITIES)
+    return tuple((counts / counts.sum()).tolist())
+
+
+def _simulate_chunk(
+    ease_factor: np.ndarray,
+    interval: np.ndarray,
+    repetitions: np.ndarray,
+    due_day: np.ndarray,
+    horizon: int,
+    runs: int,
+    grade_probabilities: Sequence[float],
+    seed,
+) -> np.ndarray:
+    """Simulate runs of one deck and return due counts with shape (runs, horizon)"""
+    rng = np.random.default_rng(seed)
+    # Grades are drawn by indexing a table with uniform integers, which is much
+    # cheaper than searchsorted over uniform floats
+    cumulative = np.cumsum(grade_probabilities) / np.sum(grade_probabilities)
+    grade_table = np.searchsorted(
+        cumulative, (np.arange(GRADE_TABLE_SIZE) + 0.5) / GRADE_TABLE_SIZE, side="right"
+    )
+
+    # Only card-runs still inside the horizon are kept, compacted after each step
+    slot = np.arange(runs, dtype=np.int64).repeat(len(ease_factor)) * horizon
+    ease_factor = np.tile(ease_factor, runs)
+    interval = np.tile(interval, runs)
+    repetitions = np.tile(repetitions, runs)
+    due_day = np.tile(due_day, runs)
+
+    counts = np.zeros(runs * horizon, dtype=np.int64)
+    while len(due_day):
+        inside = due_day < horizon
+        if not inside.all():
+            slot, ease_factor, interval, repetitions, due_day = (
+                slot[inside],
+                ease_factor[inside],
+                interval[inside],
+                repetitions[inside],
+                due_day[inside],
+            )
+        counts += np.bincount(slot + due_day.astype(np.int64), minlength=len(counts))
+
+        grades = grade_table[rng.integers(0, GRADE_TABLE_SIZE, len(due_day), dtype=np.int32)]
+        ease_factor, interval, repetitions = SpacedRepetition.calculate_next_review_batch(
+            ease_factor, interval, repetitions, grades
+        )
+        due_day = due_day + interval
+    return counts.reshape(runs, horizon)
+
+
+def simulate_workload(
+    columns: CardColumns,
+    horizon: int = 30,
+    runs: int = 200,
+    grade_probabilities: Sequence[float] = DEFAULT_GRADE_PROBABILITIES,
+    now: Optional[datetime] = None,
+    seed: Optional[int] = None,
+    workers: int = 1,
+) -> np.ndarray:
+    """Simulate the deck forward and return daily due counts, shape (runs, horizon)
+
+    Day 0 is today (by the date of now); overdue cards are due today.
+    """
+    # Whole days since the start of today, so a card due later today is due on day 0
+    today = datetime.combine((now or datetime.now()).date(), time.min)
+    rows = columns.rows()
+    due_day = (columns.next_review[rows] - to_micros(today)) // DAY_MICROS
+    # Cards first due after the horizon are never counted
+    rows, due_day = rows[due_day < horizon], due_day[due_day < horizon]
+    if not len(rows) or runs <= 0:
+        return np.zeros((max(runs, 0), horizon), dtype=np.int64)
+
+    deck = (
+        columns.ease_factor[rows].copy(),
+        columns.interval[rows].astype(np.int64),
+        columns.repetitions[rows].astype(np.int64),
+        np.maximum(due_day, 0),
+    )
+
+    runs_per_chunk = max(1, CHUNK_CARD_RUNS // len(rows))
+    chunk_runs = [min(runs_per_chunk, runs - start) for start in range(0, runs, runs_per_chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_runs))
+    tasks = [
+        (*deck, horizon, n, tuple(grade_probabilities), chunk_seed)
+        for n, chunk_seed in zip(chunk_runs, seeds)
+    ]
+
+    if workers > 1 and len(tasks) > 1 and len(rows) * runs >= PARALLEL_THRESHOLD:
+        with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(_simulate_chunk, *zip(*tasks)))
+    else:
+        results = [_simulate_chunk(*task) for task in tasks]
+    return np.concatenate(results)
+
+
+def summarize_workload(
+    counts: np.ndarray, seconds_per_review: float = SECONDS_PER_REVIEW
+) -> dict[str, np.ndarray]:
+    """Per-day mean and 10th/90th percentile review counts, and mean minutes"""
+    return {
+        "mean": counts.mean(axis=0),
+        "p10": np.percentile(counts, 10, axis=0),
+        "p90": np.percentile(counts, 90, axis=0),
+        "minutes": counts.mean(axis=0) * seconds_per_review / 60,
+    }
+
+
+class ForecastCache:
+    """Workload forecasts simulated in the background and reused across reruns
+
+    A forecast is kept per deck and settings, and reused until it is
+    FORECAST_MAX_AGE old or the day changes, so ratings (which change the deck
+    a card at a time) do not restart the simulation. get starts a missing or
+    outdated forecast on a background thread and returns the previous result
+    for the same settings meanwhile.
+    """
+
+    def __init__(self, max_age: timedelta = FORECAST_MAX_AGE, workers: int = 1):
+        self.max_age = max_age
+        self.workers = workers
+        self._lock = threading.Lock()
+        # key -> (start time, running or finished simulation, previous result)
+        self._entries: Dict[tuple, Tuple[datetime, Future, Optional[dict]]] = {}
+
+    def get(
+        self,
+        deck: str,
+        columns: Callable[[], CardColumns],
+        horizon: int,
+        runs: int,
+        grade_probabilities: Sequence[float],
+        seconds_per_review: float = SECONDS_PER_REVIEW,
+        now: Optional[datetime] = None,
+    ) -> Tuple[Optional[dict], bool]:
+        """The summarized forecast (None until one is ready) and whether it is current
+
+        columns is called for a copy of the deck only when a simulation starts.
+        A failed simulation raises its exception here.
+        """
+        now = now or datetime.now()
+        key = (deck, now.date(), horizon, runs, tuple(grade_probabilities), seconds_per_review)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                started, future, previous = entry
+                if not future.done():
+                    return previous, False
+                if future.exception() is not None:
+                    # Raised once; the next call simulates again
+                    del self._entries[key]
+                    raise future.exception()
+                if now - started < self.max_age:
+                    return future.result(), True
+                previous = future.result()
+            else:
+                previous = None
+            future = _executor.submit(
+                self._simulate, columns(), horizon, runs, grade_probabilities, seconds_per_review
+            )
+            self._entries[key] = (now, future, previous)
+            if len(self._entries) > FORECAST_ENTRIES:
+                del self._entries[min(self._entries, key=lambda k: self._entries[k][0])]
+            return previous, False
+
+    def _simulate(
+        self,
+        columns: CardColumns,
+        horizon: int,
+        runs: int,
+        grade_probabilities: Sequence[float],
+        seconds_per_review: float,
+    ) -> dict:
+        counts = simulate_workload(
+            columns, horizon, runs, grade_probabilities, seed=0, workers=self.workers
+        )
+        return summarize_workload(counts, seconds_per_review)
@@ -0,0 +1,259 @@
+"""
+Streaming bulk import of cards from CSV, TSV, JSONL and Anki text exports
+
+Rows flow through a chain of generators (parse, validate, deduplicate) and
+are written in batches, so a large file is never held in memory and each
+batch costs a single storage write.
+"""
+
+import argparse
+import csv
+import html
+import json
+import os
+import re
+import sys
+import uuid
+from itertools import chain, islice
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from pydantic import ValidationError
+
+from .indexes import front_key
+from .spaced_repetition import Card
+from .storage import Storage, create_storage
+
+FIELDS = ("front", "back", "category", "example")
+FORMATS = {
+    ".csv": "csv",
+    ".tsv": "tsv",
+    ".tab": "tsv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".txt": "anki",
+}
+ANKI_SEPARATORS = {
+    "tab": "\t",
+    "comma": ",",
+    "semicolon": ";",
+    "space": " ",
+    "pipe": "|",
+    "colon": ":",
+}
+DEFAULT_BATCH_SIZE = 1000
+HTML_TAG = re.compile(r"<[^>]+>")
+
+# (line number, parsed fields / card, or the error for that line)
+Row = Tuple[int, Union[dict, Card, ValueError]]
+
+
+class DuplicateCardError(ValueError):
+    """A card whose front already exists in the deck or earlier in the file"""
+
+
+class ImportResult:
+    """Counts and error rows of an import"""
+
+    def __init__(self):
+        self.added = 0
+        self.duplicates = 0
+        self.errors: List[Tuple[int, str]] = []
+        self.lines = 0  # Last line read from the source
+
+
+def detect_format(filename: str) -> str:
+    """Guess the format from a file extension"""
+    fmt = FORMATS.get(os.path.splitext(filename)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Unknown import format for {filename}")
+    return fmt
+
+
+def _delimited_rows(lines: Iterable[str], delimiter: str) -> Iterator[Row]:
+    """Rows of a CSV/TSV file; a header row naming front and back is optional"""
+    reader = csv.reader(lines, delimiter=delimiter)
+    header, first = FIELDS, True
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        names = [value.strip().lower() for value in values]
+        if first and "front" in names and "back" in names:
+            header, first = names, False
+            continue
+        first = False
+        yield reader.line_num, dict(zip(header, values))
+
+
+def _jsonl_rows(lines: Iterable[str]) -> Iterator[Row]:
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, ValueError(f"Invalid JSON: {e.msg}")
+            continue
+        yield line_no, item if isinstance(item, dict) else ValueError("Expected a JSON object")
+
+
+def _anki_rows(lines: Iterable[str]) -> Iterator[Row]:
+    """Rows of an Anki "Notes in Plain Text" export (front, back, then ignored fields)"""
+    separator, is_html, header_lines = "\t", False, 0
+    lines = iter(lines)
+    for line in lines:
+        if not line.startswith("#"):
+            lines = chain([line], lines)
+            break
+        header_lines += 1
+        key, _, value = line[1:].strip().partition(":")
+        if key == "separator":
+            separator = ANKI_SEPARATORS.get(value.lower(), value)
+        elif key == "html":
+            is_html = value.lower() == "true"
+
+    for line_no, fields in _delimited_rows(lines, separator):
+        fields = {name: fields.get(name) for name in ("front", "back")}
+        if is_html:
+            fields = {
+                name: html.unescape(HTML_TAG.sub("", value)) if value else value
+                for name, value in fields.items()
+            }
+        yield line_no + header_lines, fields
+
+
+def read_rows(lines: Iterable[str], fmt: str) -> Iterator[Row]:
+    """Parse a text source into (line number, fields) rows"""
+    if fmt == "csv":
+        return _delimited_rows(lines, ",")
+    if fmt == "tsv":
+        return _delimited_rows(lines, "\t")
+    if fmt == "jsonl":
+        return _jsonl_rows(lines)
+    if fmt == "anki":
+        return _anki_rows(lines)
+    raise ValueError(f"Unknown import format: {fmt}")
+
+
+def validate_rows(rows: Iterable[Row], category: str = "vocabulary") -> Iterator[Row]:
+    """Turn field dicts into new Cards; rows without front and back become errors"""
+    for line_no, fields in rows:
+        if isinstance(fields, ValueError):
+            yield line_no, fields
+            continue
+        # JSONL values can be of any type
+        wrong_type = [
+            name
+            for name in FIELDS
+            if fields.get(name) is not None and not isinstance(fields[name], str)
+        ]
+        if wrong_type:
+            yield line_no, ValueError(f"{wrong_type[0]} must be text")
+            continue
+        text = {name: (fields.get(name) or "").strip() for name in FIELDS}
+        if not (text["front"] and text["back"]):
+            yield line_no, ValueError("Missing front or back")
+            continue
+        try:
+            card = Card(
+                id=str(uuid.uuid4()),
+                front=text["front"],
+                back=text["back"],
+                category=text["category"] or category,
+                example=text["example"] or None,
+            )
+        except ValidationError as e:
+            yield line_no, ValueError(str(e.errors()[0]["msg"]))
+            continue
+        yield line_no, card
+
+
+def dedupe_rows(
+    rows: Iterable[Row], seen: Set[str], exists: Callable[[str], bool] = lambda front: False
+) -> Iterator[Row]:
+    """Replace cards whose front exists or was already seen with DuplicateCardError
+
+    seen holds the front_key of cards passed through and not yet written
+    (dedupe_rows adds to it); exists tells whether a front is already stored.
+    """
+    for line_no, card in rows:
+        if isinstance(card, Card):
+            key = front_key(card.front)
+            if key in seen or exists(card.front):
+                card = DuplicateCardError(f"Duplicate front '{card.front}'")
+            else:
+                seen.add(key)
+        yield line_no, card
+
+
+def import_cards(
+    storage: Storage,
+    lines: Iterable[str],
+    fmt: str,
+    category: str = "vocabulary",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    progress: Optional[Callable[[ImportResult], None]] = None,
+) -> ImportResult:
+    """Import cards from lines of text, writing batch_size cards per storage write
+
+    progress, if given, is called with the running result after every batch.
+    """
+    result = ImportResult()
+    # Fronts of the current chunk; written cards are found through the storage
+    seen: Set[str] = set()
+    rows = dedupe_rows(validate_rows(read_rows(lines, fmt), category), seen, storage.has_front)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        batch = []
+        for line_no, item in chunk:
+            if isinstance(item, Card):
+                batch.append(item)
+            elif isinstance(item, DuplicateCardError):
+                result.duplicates += 1
+            else:
+                result.errors.append((line_no, str(item)))
+        result.added += storage.add_cards(batch)
+        seen.clear()
+        result.lines = chunk[-1][0]
+        if progress:
+            progress(result)
+    return result
+
+
+def import_file(storage: Storage, path: str, fmt: Optional[str] = None, **kwargs) -> ImportResult:
+    """Import cards from a file, detecting the format from its extension"""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return import_cards(storage, f, fmt or detect_format(path), **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import cards into a card file")
+    parser.add_argument("source", help="CSV, TSV, JSONL or Anki plain text export")
+    parser.add_argument("storage_path", nargs="?", default="data/vocabulary_cards.json")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())))
+    parser.add_argument("--category", default="vocabulary", help="for rows without one")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    def report(result: ImportResult):
+        print(f"line {result.lines}: {result.added} added", file=sys.stderr)
+
+    result = import_file(
+        create_storage(args.storage_path),
+        args.source,
+        args.format,
+        category=args.category,
+        batch_size=args.batch_size,
+        progress=report,
+    )
+    for line_no, message in result.errors:
+        print(f"line {line_no}: {message}", file=sys.stderr)
+    print(
+        f"Imported {result.added} cards into {args.storage_path} "
+        f"({result.duplicates} duplicates skipped, {len(result.errors)} errors)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+In-memory card indexes kept in sync by Storage
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .columnar import NO_TIME, CardColumns, to_micros
+from .spaced_repetition import MASTERED_INTERVAL, MASTERED_REPETITIONS
+
+
+class CardIndex:
+    """Base class for indexes over CardColumns that Storage updates on every write
+
+    Storage calls remove(row) before a row is overwritten or deleted and add(row)
+    after it is written, so an index can read a card's previous values from the
+    columns instead of keeping its own copy.
+    """
+
+    columns: CardColumns
+
+    def rebuild(self, columns: CardColumns):
+        """Rebuild the index from scratch"""
+        self.columns = columns
+        self.clear()
+        for row in columns.rows():
+            self.add(int(row))
+
+    def clear(self):
+        raise NotImplementedError
+
+    def add(self, row: int):
+        raise NotImplementedError
+
+    def remove(self, row: int):
+        raise NotImplementedError
+
+
+class DueIndex(CardIndex):
+    """Cards ordered by next review time
+
+    Entries are (next_review, row) pairs in a sorted list, so lookups and range
+    counts are O(log n) binary searches.
+    """
+
+    def __init__(self):
+        self.columns = CardColumns()
+        self._entries: List[Tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def rebuild(self, columns: CardColumns):
+        self.columns = columns
+        rows = columns.rows()
+        due_at = columns.next_review[rows]
+        order = np.argsort(due_at, kind="stable")
+        self._entries = list(zip(due_at[order].tolist(), rows[order].tolist()))
+
+    def clear(self):
+        self._entries = []
+
+    def _entry(self, row: int) -> Tuple[int, int]:
+        return (int(self.columns.next_review[row]), row)
+
+    def add(self, row: int):
+        insort(self._entries, self._entry(row))
+
+    def remove(self, row: int):
+        entry = self._entry(row)
+        i = bisect_left(self._entries, entry)
+        if i < len(self._entries) and self._entries[i] == entry:
+            del self._entries[i]
+
+    def count_due_before(self, t: Optional[datetime] = None) -> int:
+        """Count cards due at or before t (default: now)"""
+        cutoff = to_micros(t or datetime.now())
+        return bisect_right(self._entries, cutoff, key=lambda entry: entry[0])
+
+    def is_due(self, card_id: str, now: Optional[datetime] = None) -> bool:
+        row = self.columns.row_of(card_id)
+        return row is not None and self.columns.next_review[row] <= to_micros(now or datetime.now())
+
+    def due_rows(self, now: Optional[datetime] = None) -> List[int]:
+        """Rows of all due cards, most overdue first"""
+        return [row for _, row in self._entries[: self.count_due_before(now)]]
+
+
+class RecencyIndex(CardIndex):
+    """Cards ordered by a timestamp column, for the most recent ones
+
+    Entries are (timestamp, -row) pairs in a sorted list, so the newest k
+    cards are the last k entries; cards without the timestamp are left out.
+    Equal timestamps list the earlier row first.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.columns = CardColumns()
+        self._entries: List[Tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def rebuild(self, columns: CardColumns):
+        self.columns = columns
+        rows = columns.rows()
+        times = getattr(columns, self.field)[rows]
+        rows, times = rows[times != NO_TIME], times[times != NO_TIME]
+        order = np.lexsort((-rows, times))
+        self._entries = list(zip(times[order].tolist(), (-rows[order]).tolist()))
+
+    def clear(self):
+        self._entries = []
+
+    def _entry(self, row: int) -> Tuple[int, int]:
+        return (int(getattr(self.columns, self.field)[row]), -row)
+
+    def add(self, row: int):
+        entry = self._entry(row)
+        if entry[0] != NO_TIME:
+            insort(self._entries, entry)
+
+    def remove(self, row: int):
+        entry = self._entry(row)
+        i = bisect_left(self._entries, entry)
+        if i < len(self._entries) and self._entries[i] == entry:
+            del self._entries[i]
+
+    def latest(self, k: int) -> List[int]:
+        """Rows of the k cards with the latest timestamps, newest first"""
+        entries = self._entries[-k:] if k > 0 else []
+        return [-row for _, row in reversed(entries)]
+
+
+def front_key(front: str) -> str:
+    """Normalized front used to detect duplicates"""
+    return " ".join(front.casefold().split())
+
+
+class FrontIndex(CardIndex):
+    """Number of cards per normalized front (see front_key)
+
+    Built on the first lookup after a reload from the distinct front strings,
+    so each is normalized once, and then maintained incrementally.
+    """
+
+    def __init__(self):
+        self.columns = CardColumns()
+        self._built = False
+        self.clear()
+
+    def clear(self):
+        self._counts: Dict[str, int] = {}
+
+    def rebuild(self, columns: CardColumns):
+        self.columns = columns
+        self._built = False
+        self.clear()
+
+    def _ensure_built(self):
+        if not self._built:
+            self.clear()
+            self._built = True
+            string_ids, counts = np.unique(
+                self.columns.front[self.columns.rows()], return_counts=True
+            )
+            for string_id, count in zip(string_ids.tolist(), counts.tolist()):
+                key = front_key(self.columns.strings.get(string_id))
+                self._counts[key] = self._counts.get(key, 0) + count
+
+    def add(self, row: int):
+        if self._built:
+            key = front_key(self.columns.text("front", row))
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def remove(self, row: int):
+        if self._built:
+            key = front_key(self.columns.text("front", row))
+            self._counts[key] -= 1
+            if not self._counts[key]:
+                del self._counts[key]
+
+    def __contains__(self, front: str) -> bool:
+        self._ensure_built()
+        return front_key(front) in self._counts
+
+
+class DeckStats(CardIndex):
+    """Learning progress counters updated by delta on every write
+
+    Each card is counted as new, mastered or in progress and under its
+    category; the due count comes from the DueIndex.
+    """
+
+    def __init__(self):
+        self.columns = CardColumns()
+        self.clear()
+
+    def clear(self):
+        self.counts = {"new": 0, "mastered": 0, "in_progress": 0}
+        self.categories: Dict[str, int] = {}
+
+    def rebuild(self, columns: CardColumns):
+        self.columns = columns
+        stats = columns.stats()
+        self.counts = {
+            "new": stats["new_cards"],
+            "mastered": stats["mastered"],
+            "in_progress": stats["in_progress"],
+        }
+        self.categories = columns.category_counts()
+
+    def _status(self, row: int) -> str:
+        repetitions = self.columns.repetitions[row]
+        if repetitions == 0:
+            return "new"
+        if repetitions >= MASTERED_REPETITIONS and self.columns.interval[row] >= MASTERED_INTERVAL:
+            return "mastered"
+        return "in_progress"
+
+    def add(self, row: int):
+        category = self.columns.text("category", row)
+        self.counts[self._status(row)] += 1
+        self.categories[category] = self.categories.get(category, 0) + 1
+
+    def remove(self, row: int):
+        category = self.columns.text("category", row)
+        self.counts[self._status(row)] -= 1
+        self.categories[category] -= 1
+        if not self.categories[category]:
+            del self.categories[category]
+
+    def as_dict(self, due_for_review: int) -> dict:
+        """Stats in the format returned by SpacedRepetition.get_stats"""
+        return {
+            "total_cards": sum(self.counts.values()),
+            "due_for_review": due_for_review,
+            "mastered": self.counts["mastered"],
+            "new_cards": self.counts["new"],
+            "in_progress": self.counts["in_progress"],
+        }
@@ -1,9 +1,34 @@
 """
 Pages module for Flipzy
+
+Page modules are imported on first use, so a rerun only imports the page it
+shows (and whatever that page depends on).
 """
 
-from .add_vocabulary import *  # noqa: F403
-from .home import *  # noqa: F403
-from .manage_cards import *  # noqa: F403
-from .review import *  # noqa: F403
-from .statistics import *  # noqa: F403
+from importlib import import_module
+from typing import Callable
+
+# Sidebar label -> (module, render function), in navigation order
+PAGES = {
+    "🏠 Home": ("home", "show_home"),
+    "➕ Add Vocabulary": ("add_vocabulary", "show_add_vocabulary"),
+    "📖 Review": ("review", "show_review"),
+    "📊 Statistics": ("statistics", "show_statistics"),
+    "📝 Manage Cards": ("manage_cards", "show_manage_cards"),
+}
+
+
+def load_page(page: str) -> Callable:
+    """Render function of a page, importing its module if needed"""
+    module, function = PAGES[page]
+    return getattr(import_module(f".{module}", __name__), function)
+
+
+def __getattr__(name: str):
+    # from src.pages import show_home keeps working without importing every page
+    if not name.startswith("__"):
+        for module, _ in PAGES.values():
+            value = getattr(import_module(f".{module}", __name__), name, None)
+            if value is not None:
+                return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,10 +2,12 @@
 Add vocabulary page component
 """
 
+import io
 import uuid
 
 import streamlit as st
 
+from src.importer import FORMATS, detect_format, import_cards
 from src.spaced_repetition import Card
 
 
@@ -50,12 +52,13 @@ def show_add_vocabulary(storage):
             else:
                 st.error("Please fill in at least the Word/Phrase and Definition fields.")
 
+    show_import(storage)
+
     # Show recent cards
     st.markdown("---")
     st.subheader("📋 Recent Cards")
-    cards = storage.load_cards()
-    if cards:
-        recent_cards = sorted(cards, key=lambda x: x.created_at, reverse=True)[:10]
+    recent_cards = storage.recent("created_at", 10)
+    if recent_cards:
         for card in recent_cards:
             with st.expander(f"{card.front} ({card.category})"):
                 st.write(f"**Definition:** {card.back}")
@@ -64,3 +67,45 @@ def show_add_vocabulary(storage):
                 st.caption(f"Created: {card.created_at.strftime('%Y-%m-%d %H:%M')}")
     else:
         st.info("No cards yet. Add your first vocabulary word above!")
+
+
+def show_import(storage):
+    """Bulk import from a CSV, TSV, JSONL or Anki text file"""
+    with st.expander("📥 Import from file"):
+        uploaded = st.file_uploader(
+            "CSV, TSV, JSONL or Anki plain text export",
+            type=[ext.lstrip(".") for ext in FORMATS],
+            help="CSV/TSV columns: front, back, category, example (a header row is optional)",
+        )
+        category = st.selectbox(
+            "Category for rows without one",
+            ["vocabulary", "phrase", "idiom", "phrasal verb", "collocation", "other"],
+            key="import_category",
+        )
+        if uploaded is None or not st.button("Import", use_container_width=True):
+            return
+
+        total_lines = max(1, uploaded.getvalue().count(b"\n"))
+        bar = st.progress(0.0, text="Importing...")
+
+        def report(result):
+            bar.progress(
+                min(1.0, result.lines / total_lines),
+                text=f"Line {result.lines} of about {total_lines}: {result.added} added",
+            )
+
+        lines = io.TextIOWrapper(uploaded, encoding="utf-8-sig", newline="")
+        result = import_cards(
+            storage, lines, detect_format(uploaded.name), category=category, progress=report
+        )
+        bar.progress(1.0, text="Done")
+        st.success(
+            f"✅ Imported {result.added} cards "
+            f"({result.duplicates} duplicates skipped, {len(result.errors)} errors)"
+        )
+        if result.errors:
+            st.dataframe(
+                [{"line": line_no, "error": message} for line_no, message in result.errors],
+                use_container_width=True,
+                hide_index=True,
+            )
@@ -2,187 +2,281 @@
 Manage cards page component
 """
 
+from datetime import datetime, time
+
 import streamlit as st
 
+from src.bulk import reset_category, shift_schedules
+from src.exporter import count_cards, detect_format, export_bytes
+
+PAGE_SIZES = [12, 24, 48, 96]
+EXPORT_FILES = ["cards.jsonl", "cards.csv", "cards.json.gz", "cards.jsonl.gz", "cards.csv.gz"]
+MASTERED_FILTERS = {"All cards": None, "Mastered only": True, "Not mastered": False}
+NUM_COLS = 2
+CATEGORIES = ["vocabulary", "phrase", "idiom", "phrasal verb", "collocation", "other"]
+
+# Keeps all cards in a grid row the same height
+CARD_GRID_CSS = """
+<style>
+/* Ensure all columns in a row have equal height */
+div[data-testid="column"] {
+    align-self: stretch !important;
+}
+div[data-testid="column"] > div {
+    height: 100% !important;
+    display: flex !important;
+    flex-direction: column !important;
+}
+div[data-testid="column"] > div > div {
+    flex: 1 !important;
+}
+</style>
+"""
+
 
 def show_manage_cards(storage):
     """Page to manage (edit/delete) cards"""
     st.header("📝 Manage Cards")
 
-    cards = storage.load_cards()
+    total_cards = storage.get_stats()["total_cards"]
 
-    if not cards:
+    if not total_cards:
         st.info("No cards to manage. Add some vocabulary first!")
         return
 
     # Search and filter
-    col_search, col_count = st.columns([3, 1])
+    col_search, col_category, col_count = st.columns([3, 1, 1])
     with col_search:
         search_term = st.text_input(
             "🔍 Search cards", placeholder="Search by word, phrase, or definition..."
         )
 
+    with col_category:
+        category_filter = st.selectbox("Category", ["All"] + sorted(storage.category_counts()))
+
     with col_count:
         st.write("")  # Spacing
-        st.caption(f"**{len(cards)}** total cards")
-
-    # Filter cards
-    filtered_cards = cards
-    if search_term:
-        search_lower = search_term.lower()
-        filtered_cards = [
-            c
-            for c in cards
-            if search_lower in c.front.lower()
-            or search_lower in c.back.lower()
-            or (c.example and search_lower in c.example.lower())
-        ]
-
-    if search_term:
-        st.caption(f"Showing {len(filtered_cards)} of {len(cards)} cards")
+        st.caption(f"**{total_cards}** total cards")
+
+    with st.expander("⚙️ Bulk actions"):
+        col_reset, col_shift = st.columns(2)
+        with col_reset:
+            bulk_category = st.selectbox(
+                "Category", sorted(storage.category_counts()), key="bulk_category"
+            )
+            if st.button("🔄 Reset category progress", use_container_width=True):
+                count = reset_category(storage, bulk_category)
+                st.success(f"Reset {count} cards")
+                st.rerun()
+        with col_shift:
+            shift_days = st.number_input(
+                "Days", min_value=-365, max_value=365, value=7, help="e.g. the length of a break"
+            )
+            if st.button("⏩ Shift all reviews", use_container_width=True):
+                count = shift_schedules(storage, int(shift_days))
+                st.success(f"Shifted {count} cards")
+                st.rerun()
+
+    show_export(storage)
+
+    # Filter cards (IDs only; cards are materialized for the visible page)
+    category = None if category_filter == "All" else category_filter
+    card_ids = storage.search(search_term, category)
+
+    if search_term or category:
+        st.caption(f"Showing {len(card_ids)} of {total_cards} cards")
 
     st.markdown("---")
 
     # Initialize editing state
-    if "editing_card_id" not in st.session_state:
-        st.session_state.editing_card_id = None
+    if "editing_card_ids" not in st.session_state:
+        st.session_state.editing_card_ids = set()
+
+    if not card_ids:
+        st.info("No cards match your search. Try a different search term.")
+        return
+
+    page_ids = show_pagination(card_ids, (search_term, category))
 
     # Display cards in a grid layout (card-style, not expanders)
-    if filtered_cards:
-        # Add CSS to ensure cards have equal heights within rows
-        st.markdown(
-            """
-        <style>
-        /* Ensure all columns in a row have equal height */
-        div[data-testid="column"] {
-            align-self: stretch !important;
-        }
-        div[data-testid="column"] > div {
-            height: 100% !important;
-            display: flex !important;
-            flex-direction: column !important;
-        }
-        div[data-testid="column"] > div > div {
-            flex: 1 !important;
+    st.markdown(CARD_GRID_CSS, unsafe_allow_html=True)
+    for i in range(0, len(page_ids), NUM_COLS):
+        cols = st.columns(NUM_COLS, gap="medium")
+        for col, card_id in zip(cols, page_ids[i : i + NUM_COLS]):
+            with col:
+                show_card(storage, card_id)
+
+
+def show_export(storage):
+    """Download the deck, optionally filtered"""
+    with st.expander("📤 Export"):
+        col_file, col_category, col_mastered = st.columns(3)
+        with col_file:
+            file_name = st.selectbox("Format", EXPORT_FILES, key="export_file")
+        with col_category:
+            category = st.selectbox(
+                "Category", ["All"] + sorted(storage.category_counts()), key="export_category"
+            )
+        with col_mastered:
+            mastered = st.selectbox("Progress", list(MASTERED_FILTERS), key="export_mastered")
+        due_date = None
+        if st.checkbox("Only cards due by a date", key="export_due"):
+            due_date = st.date_input("Due by", key="export_due_date")
+
+        filters = {
+            "category": None if category == "All" else category,
+            "due_before": datetime.combine(due_date, time.max) if due_date else None,
+            "mastered": MASTERED_FILTERS[mastered],
         }
-        </style>
-        """,
-            unsafe_allow_html=True,
+        fmt, compressed = detect_format(file_name)
+
+        def export():
+            # Runs when the button is clicked, on the deck as it is then;
+            # Streamlit serves the download from memory
+            return b"".join(export_bytes(storage.iter_card_dicts(), fmt, compressed, **filters))
+
+        st.download_button(
+            f"⬇️ Download {count_cards(storage.read_columns(), **filters)} cards",
+            data=export,
+            file_name=file_name,
+            on_click="ignore",
+            use_container_width=True,
         )
-        # Calculate number of columns (3 columns for card layout)
-        num_cols = 2
-        for i in range(0, len(filtered_cards), num_cols):
-            cols = st.columns(num_cols, gap="medium")
-            for j, col in enumerate(cols):
-                if i + j < len(filtered_cards):
-                    card = filtered_cards[i + j]
-                    with col:
-                        # Check if this card is being edited
-                        if st.session_state.editing_card_id == card.id:
-                            # Show edit form in a container
-                            with st.container():
-                                st.markdown("#### ✏️ Editing Card")
-                                with st.form(f"edit_form_{card.id}"):
-                                    edit_front = st.text_input(
-                                        "Word or Phrase *",
-                                        value=card.front,
-                                        key=f"edit_front_{card.id}",
-                                    )
-                                    edit_category = st.selectbox(
-                                        "Category",
-                                        [
-                                            "vocabulary",
-                                            "phrase",
-                                            "idiom",
-                                            "phrasal verb",
-                                            "collocation",
-                                            "other",
-                                        ],
-                                        index=[
-                                            "vocabulary",
-                                            "phrase",
-                                            "idiom",
-                                            "phrasal verb",
-                                            "collocation",
-                                            "other",
-                                        ].index(card.category),
-                                        key=f"edit_category_{card.id}",
-                                    )
-                                    edit_back = st.text_area(
-                                        "Definition *",
-                                        value=card.back,
-                                        key=f"edit_back_{card.id}",
-                                        height=100,
-                                    )
-                                    edit_example = st.text_area(
-                                        "Example (Optional)",
-                                        value=card.example or "",
-                                        key=f"edit_example_{card.id}",
-                                        height=80,
-                                    )
-
-                                    col_save, col_cancel = st.columns(2)
-                                    with col_save:
-                                        if st.form_submit_button(
-                                            "💾 Save", use_container_width=True, type="primary"
-                                        ):
-                                            if edit_front and edit_back:
-                                                card.front = edit_front.strip()
-                                                card.back = edit_back.strip()
-                                                card.category = edit_category
-                                                card.example = (
-                                                    edit_example.strip()
-                                                    if edit_example.strip()
-                                                    else None
-                                                )
-                                                storage.update_card(card)
-                                                st.session_state.editing_card_id = None
-                                                st.success("✅ Updated!")
-                                                st.rerun()
-                                            else:
-                                                st.error("Fill required fields.")
-                                    with col_cancel:
-                                        if st.form_submit_button(
-                                            "❌ Cancel", use_container_width=True
-                                        ):
-                                            st.session_state.editing_card_id = None
-                                            st.rerun()
-                        else:
-                            # Display card using Streamlit components
-                            # Wrap in container to ensure consistent height
-                            with st.container():
-                                st.markdown(f"#### {card.front}")
-                                st.caption(f"Category: {card.category}")
-                                st.write(
-                                    f"**Definition:** {card.back[:100]}{'...' if len(card.back) > 100 else ''}"
-                                )
-                                if card.example:
-                                    st.caption(
-                                        f'Example: "{card.example[:80]}{"..." if len(card.example) > 80 else ""}"'
-                                    )
-                                st.write(
-                                    f"📊 {card.repetitions} reviews • ⏰ {card.interval}d interval"
-                                )
-                                st.write(f"📅 Next: {card.next_review.strftime('%Y-%m-%d')}")
-                                st.markdown("---")
-
-                                # Action buttons below card
-                                col_edit, col_delete = st.columns(2)
-                                with col_edit:
-                                    if st.button(
-                                        "✏️ Edit", key=f"edit_{card.id}", use_container_width=True
-                                    ):
-                                        st.session_state.editing_card_id = card.id
-                                        st.rerun()
-                                with col_delete:
-                                    if st.button(
-                                        "🗑️ Delete",
-                                        key=f"delete_{card.id}",
-                                        type="secondary",
-                                        use_container_width=True,
-                                    ):
-                                        storage.delete_card(card.id)
-                                        st.success("Card deleted!")
-                                        st.rerun()
+
+
+def show_pagination(card_ids, filter_key):
+    """Render page controls and return the IDs on the current page"""
+    # Go back to the first page whenever the filter changes
+    if st.session_state.get("manage_filter") != filter_key:
+        st.session_state.manage_filter = filter_key
+        st.session_state.manage_page = 0
+
+    col_size, col_prev, col_page, col_next = st.columns([2, 1, 2, 1])
+    with col_size:
+        page_size = st.selectbox("Cards per page", PAGE_SIZES, key="manage_page_size")
+
+    page_count = (len(card_ids) + page_size - 1) // page_size
+    page = max(0, min(st.session_state.get("manage_page", 0), page_count - 1))
+
+    with col_prev:
+        st.write("")  # Spacing
+        if st.button("◀ Prev", disabled=page == 0, use_container_width=True):
+            page -= 1
+    with col_next:
+        st.write("")  # Spacing
+        if st.button("Next ▶", disabled=page >= page_count - 1, use_container_width=True):
+            page += 1
+    with col_page:
+        st.write("")  # Spacing
+        st.caption(f"Page **{page + 1}** of **{page_count}**")
+
+    st.session_state.manage_page = page
+    return card_ids[page * page_size : (page + 1) * page_size]
+
+
+def save_card(storage, card_id):
+    """Save an edit form; runs as a callback, before the fragment reruns"""
+    state = st.session_state
+    front = state[f"edit_front_{card_id}"].strip()
+    back = state[f"edit_back_{card_id}"].strip()
+    if not (front and back):
+        return  # Left in edit mode, where the error is shown
+
+    def apply_edit(card):
+        card.front = front
+        card.back = back
+        card.category = state[f"edit_category_{card_id}"]
+        card.example = state[f"edit_example_{card_id}"].strip() or None
+
+    storage.modify_card(card_id, apply_edit)
+    state.editing_card_ids.discard(card_id)
+
+
+@st.fragment
+def show_card(storage, card_id):
+    """One card of the grid
+
+    Edit, save and cancel only rerun this fragment. State changes happen in
+    button callbacks, which run before the rerun.
+    """
+    card = storage.get_card_by_id(card_id)
+    if card is None:
+        return
+    editing = st.session_state.editing_card_ids
+
+    # Check if this card is being edited
+    if card.id in editing:
+        # Show edit form in a container
+        with st.container():
+            st.markdown("#### ✏️ Editing Card")
+            with st.form(f"edit_form_{card.id}"):
+                st.text_input("Word or Phrase *", value=card.front, key=f"edit_front_{card.id}")
+                st.selectbox(
+                    "Category",
+                    CATEGORIES,
+                    index=CATEGORIES.index(card.category) if card.category in CATEGORIES else 0,
+                    key=f"edit_category_{card.id}",
+                )
+                st.text_area(
+                    "Definition *", value=card.back, key=f"edit_back_{card.id}", height=100
+                )
+                st.text_area(
+                    "Example (Optional)",
+                    value=card.example or "",
+                    key=f"edit_example_{card.id}",
+                    height=80,
+                )
+
+                col_save, col_cancel = st.columns(2)
+                with col_save:
+                    if st.form_submit_button(
+                        "💾 Save",
+                        use_container_width=True,
+                        type="primary",
+                        on_click=save_card,
+                        args=(storage, card.id),
+                    ):
+                        # Still editing after the callback, so validation failed
+                        st.error("Fill required fields.")
+                with col_cancel:
+                    st.form_submit_button(
+                        "❌ Cancel",
+                        use_container_width=True,
+                        on_click=editing.discard,
+                        args=(card.id,),
+                    )
     else:
-        st.info("No cards match your search. Try a different search term.")
+        # Display card using Streamlit components
+        # Wrap in container to ensure consistent height
+        with st.container():
+            st.markdown(f"#### {card.front}")
+            st.caption(f"Category: {card.category}")
+            st.write(f"**Definition:** {card.back[:100]}{'...' if len(card.back) > 100 else ''}")
+            if card.example:
+                st.caption(
+                    f'Example: "{card.example[:80]}{"..." if len(card.example) > 80 else ""}"'
+                )
+            st.write(f"📊 {card.repetitions} reviews • ⏰ {card.interval}d interval")
+            st.write(f"📅 Next: {card.next_review.strftime('%Y-%m-%d')}")
+            st.markdown("---")
+
+            # Action buttons below card
+            col_edit, col_delete = st.columns(2)
+            with col_edit:
+                st.button(
+                    "✏️ Edit",
+                    key=f"edit_{card.id}",
+                    use_container_width=True,
+                    on_click=editing.add,
+                    args=(card.id,),
+                )
+            with col_delete:
+                if st.button(
+                    "🗑️ Delete",
+                    key=f"delete_{card.id}",
+                    type="secondary",
+                    use_container_width=True,
+                ):
+                    storage.delete_card(card.id)
+                    # The page shifts by one card, so rerun the whole page
+                    st.rerun()
@@ -4,33 +4,41 @@ Review page component with spaced repetition
 
 import streamlit as st
 
+from src.config import WRITE_BEHIND
+from src.review_session import ORDERINGS, ReviewSession
+
 
 def show_review(storage, sr):
     """Review page with spaced repetition"""
     st.header("📖 Review Cards")
 
-    cards = storage.load_cards()
-    due_cards = sr.get_due_cards(cards)
+    ordering = st.selectbox(
+        "Order",
+        list(ORDERINGS),
+        format_func=ORDERINGS.get,
+        key="review_ordering",
+        on_change=end_session,
+    )
+
+    session = st.session_state.get("review_session")
+    if session is None or (not len(session) and storage.count_due()):
+        # Cards that became due since the last session was queued start a new one
+        session = st.session_state.review_session = ReviewSession(storage, ordering)
 
-    if not due_cards:
+    current_card = session.current()
+    if current_card is None:
         st.info(
             "🎉 Great job! No cards due for review right now. Check back later or add more cards!"
         )
         return
-
-    # Reset state if no current card
-    if (
-        "current_review_card" not in st.session_state
-        or st.session_state.current_review_card is None
-    ):
-        st.session_state.current_review_card = due_cards[0]
+    if current_card.id != st.session_state.get("review_card_id"):
+        st.session_state.review_card_id = current_card.id
         st.session_state.show_answer = False
 
-    current_card = st.session_state.current_review_card
-
+    remaining = len(session)
     st.progress(
-        len(due_cards) - due_cards.index(current_card) if current_card in due_cards else 0,
-        text=f"Cards remaining: {len(due_cards)}",
+        session.reviewed / (session.reviewed + remaining),
+        text=f"Cards remaining: {remaining}",
     )
 
     # Card display
@@ -92,24 +100,24 @@ def show_review(storage, sr):
             st.write("**Last Reviewed:** Never")
 
 
+def end_session():
+    """Drop the review session, so the next run queues the due cards again"""
+    st.session_state.pop("review_session", None)
+
+
 def rate_card(storage, sr, card, quality):
     """Rate a card and update it"""
-    updated_card = sr.calculate_next_review(card, quality)
-    storage.update_card(updated_card)
+    # Applied to the latest stored version, in case another session rated it meanwhile
+    storage.modify_card(
+        card.id,
+        lambda latest: sr.calculate_next_review(latest, quality),
+        review=True,
+        buffered=WRITE_BEHIND,
+        quality=quality,
+    )
 
     # Move to next card
-    cards = storage.load_cards()
-    due_cards = sr.get_due_cards(cards)
-
-    if due_cards:
-        # Remove current card from due list if it's no longer due
-        remaining_due = [c for c in due_cards if c.id != card.id]
-        if remaining_due:
-            st.session_state.current_review_card = remaining_due[0]
-        else:
-            st.session_state.current_review_card = None
-    else:
-        st.session_state.current_review_card = None
+    st.session_state.review_session.advance()
 
     st.session_state.show_answer = False
     st.rerun()
@@ -2,15 +2,29 @@
 Statistics page component
 """
 
+import os
+from datetime import date
+
+import numpy as np
 import streamlit as st
 
+from src.forecast import (
+    DEFAULT_GRADE_PROBABILITIES,
+    SECONDS_PER_REVIEW,
+    ForecastCache,
+    grade_probabilities_from_counts,
+)
+from src.review_log import review_streaks
+
+# How often a page waiting for a forecast checks for it
+FORECAST_POLL_SECONDS = 2
+
 
 def show_statistics(storage, sr):
     """Statistics page"""
     st.header("📊 Learning Statistics")
 
-    cards = storage.load_cards()
-    stats = sr.get_stats(cards)
+    stats = storage.get_stats()
 
     col1, col2 = st.columns(2)
 
@@ -26,11 +40,9 @@ def show_statistics(storage, sr):
     st.markdown("---")
 
     # Category breakdown
-    if cards:
+    if stats["total_cards"]:
         st.subheader("📚 Cards by Category")
-        categories = {}
-        for card in cards:
-            categories[card.category] = categories.get(card.category, 0) + 1
+        categories = storage.category_counts()
 
         for category, count in sorted(categories.items(), key=lambda x: x[1], reverse=True):
             st.write(f"**{category.capitalize()}:** {count}")
@@ -39,9 +51,7 @@ def show_statistics(storage, sr):
 
         # Recent activity
         st.subheader("📅 Recent Activity")
-        recent_cards = sorted(
-            [c for c in cards if c.last_reviewed], key=lambda x: x.last_reviewed, reverse=True
-        )[:10]
+        recent_cards = storage.recent("last_reviewed", 10)
         if recent_cards:
             for card in recent_cards:
                 st.write(
@@ -50,3 +60,150 @@ def show_statistics(storage, sr):
                 )
         else:
             st.info("No cards reviewed yet. Start reviewing to see your activity here!")
+
+        st.markdown("---")
+        show_history(storage)
+
+        st.markdown("---")
+        show_forecast(storage)
+
+
+def show_history(storage):
+    """Reviews per day, retention and streaks from the review log"""
+    st.subheader("📈 Review History")
+
+    daily = storage.review_log.daily()
+    if not len(daily["day"]):
+        st.info("Rate some cards to start your review history!")
+        return
+
+    window = st.radio(
+        "History",
+        [30, 90, 365, 0],
+        format_func=lambda days: f"Last {days} days" if days else "All time",
+        horizontal=True,
+    )
+    today = np.datetime64(date.today(), "D")
+    first_day = today - window + 1 if window else daily["day"][0]
+    in_window = daily["day"] >= first_day
+    current_streak, longest_streak = review_streaks(daily["day"], date.today())
+
+    reviews = int(daily["reviews"][in_window].sum())
+    recall_reviews = int(daily["recall_reviews"][in_window].sum())
+    recalled = int(daily["recalled"][in_window].sum())
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Reviews", reviews)
+    with col2:
+        st.metric("Retention", f"{recalled / recall_reviews:.0%}" if recall_reviews else "–")
+    with col3:
+        st.metric("Current Streak (days)", current_streak)
+    with col4:
+        st.metric("Longest Streak (days)", longest_streak)
+
+    # Reviews per day and category, with the days without reviews
+    rollups = storage.review_log.rollups()
+    days = np.arange(first_day, today + 1, dtype="datetime64[D]")
+    day_index = rollups["day"].astype("datetime64[D]") - first_day
+    shown = (day_index >= 0) & (day_index < len(days))
+    chart = {"Day": days.astype(str).tolist()}
+    for category in np.unique(rollups["category"][shown]).tolist():
+        mask = shown & (rollups["category"] == category)
+        counts = np.bincount(
+            day_index[mask].astype(np.int64), weights=rollups["reviews"][mask], minlength=len(days)
+        )
+        chart[category] = counts.astype(np.int64).tolist()
+    st.bar_chart(chart, x="Day", y=[name for name in chart if name != "Day"])
+    st.caption("Retention is the share of reviews of already learned cards rated 3 or better.")
+
+
+@st.cache_resource
+def get_forecasts() -> ForecastCache:
+    """Forecasts shared by every session, simulated on all cores off the script thread"""
+    return ForecastCache(workers=os.cpu_count() or 1)
+
+
+def show_forecast(storage):
+    """Forecast of daily reviews and review time"""
+    st.subheader("🔮 Workload Forecast")
+
+    horizon = st.radio(
+        "Forecast horizon",
+        [30, 90, 365],
+        format_func=lambda days: f"Next {days} days",
+        horizontal=True,
+    )
+    # Rating probabilities default to the ones seen in the review history
+    grade_counts = storage.review_log.grade_counts()
+    default_grades = (
+        grade_probabilities_from_counts(grade_counts)
+        if grade_counts.sum()
+        else DEFAULT_GRADE_PROBABILITIES
+    )
+    with st.expander("Simulation settings"):
+        runs = st.slider("Simulation runs", 50, 1000, 200, step=50)
+        seconds_per_review = st.number_input(
+            "Seconds per review", min_value=1, max_value=120, value=SECONDS_PER_REVIEW
+        )
+        st.caption("How likely is each rating (0-5)?")
+        if grade_counts.sum():
+            st.caption(f"Estimated from your {grade_counts.sum()} ratings so far.")
+        grade_cols = st.columns(6)
+        grade_probabilities = tuple(
+            col.number_input(
+                str(grade),
+                min_value=0.0,
+                max_value=1.0,
+                value=round(default_grades[grade], 2),
+                step=0.05,
+                key=f"forecast_grade_{grade}",
+            )
+            for grade, col in enumerate(grade_cols)
+        )
+
+    if not sum(grade_probabilities):
+        st.warning("Give at least one rating a non-zero probability.")
+        return
+
+    settings = (horizon, runs, grade_probabilities, seconds_per_review)
+    if get_forecasts().get(storage.file_path, storage.copy_columns, *settings)[1]:
+        show_forecast_results(storage, settings)
+    else:
+        # Check back until the background simulation is done
+        st.fragment(show_forecast_results, run_every=FORECAST_POLL_SECONDS)(
+            storage, settings, polling=True
+        )
+
+
+def show_forecast_results(storage, settings, polling=False):
+    """Metrics and chart of the latest forecast for settings"""
+    horizon, runs, grade_probabilities, seconds_per_review = settings
+    forecast, current = get_forecasts().get(storage.file_path, storage.copy_columns, *settings)
+    if polling and current:
+        # Ready: rerun the page, which stops polling
+        st.rerun()
+    if forecast is None:
+        st.info("⏳ Simulating future reviews in the background...")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Reviews Today", f"{forecast['mean'][0]:.0f}")
+    with col2:
+        st.metric("Avg Reviews / Day", f"{forecast['mean'].mean():.1f}")
+    with col3:
+        st.metric("Avg Minutes / Day", f"{forecast['minutes'].mean():.1f}")
+
+    st.line_chart(
+        {
+            "Expected reviews": forecast["mean"],
+            "10th percentile": forecast["p10"],
+            "90th percentile": forecast["p90"],
+        }
+    )
+    caption = f"Day 0 is today. Based on {runs} simulated runs of every card"
+    if current:
+        st.caption(f"{caption}, refreshed every few minutes while the deck changes.")
+    else:
+        st.caption(f"{caption}. ⏳ Updating in the background...")
@@ -0,0 +1,306 @@
+"""
+Review history of a deck, with daily rollups
+
+A card only keeps its latest schedule, so every rating is also appended as
+one fixed-width record (card, time, grade, and the schedule before and after
+it) to a log file next to the deck; its category is an index into a table of
+category names kept next to the log. Statistics over the history read a
+table of counts per day and category instead of the records: the table is
+stored next to the log with the number of records it covers, so a read only
+folds in the records appended since, and charts over years of reviews never
+rescan the log.
+"""
+
+import json
+import os
+import threading
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .columnar import DAY_MICROS
+
+MAGIC = b"FLPZREV1"
+RECORD = np.dtype(
+    [
+        ("reviewed_at", "<i8"),
+        ("previous_ease_factor", "<f8"),
+        ("ease_factor", "<f8"),
+        ("previous_interval", "<i4"),
+        ("interval", "<i4"),
+        ("previous_repetitions", "<i4"),
+        ("quality", "u1"),
+        ("category", "<i4"),  # Index into the log's category table
+        ("card_id", "S36"),  # uuid4 strings
+    ],
+    align=True,
+)
+# Records as built by review_records, naming their category; ReviewLog.append
+# replaces the names with their indexes
+REVIEW = np.dtype(
+    [(name, RECORD[name]) for name in RECORD.names if name != "category"] + [("category", object)]
+)
+GRADE_FIELDS = tuple(f"grade_{grade}" for grade in range(6))
+# Counts per day and category: ratings, ratings of cards reviewed successfully
+# before (recall_reviews) and how many of those were 3 or better (recalled),
+# and ratings per grade
+ROLLUP_FIELDS = ("reviews", "recall_reviews", "recalled") + GRADE_FIELDS
+
+
+def review_records(
+    card_ids: Iterable[str],
+    categories: Iterable[str],
+    reviewed_at,
+    quality,
+    previous_ease_factor,
+    ease_factor,
+    previous_interval,
+    interval,
+    previous_repetitions,
+) -> np.ndarray:
+    """Reviews to append to a log, from aligned values (timestamps in epoch microseconds)"""
+    card_ids = [card_id.encode("utf-8") for card_id in card_ids]
+    records = np.zeros(len(card_ids), dtype=REVIEW)
+    records["card_id"] = card_ids
+    records["category"] = list(categories)
+    records["reviewed_at"] = reviewed_at
+    records["quality"] = quality
+    records["previous_ease_factor"] = previous_ease_factor
+    records["ease_factor"] = ease_factor
+    records["previous_interval"] = previous_interval
+    records["interval"] = interval
+    records["previous_repetitions"] = previous_repetitions
+    return records
+
+
+def _empty_rollups() -> Dict[str, np.ndarray]:
+    table = {"day": np.empty(0, dtype=np.int64), "category": np.empty(0, dtype="U1")}
+    table.update((field, np.empty(0, dtype=np.int64)) for field in ROLLUP_FIELDS)
+    return table
+
+
+def _group(table: Dict[str, np.ndarray], keys: Tuple[str, ...]) -> Dict[str, np.ndarray]:
+    """Sum the count fields of rows with equal keys; rows come out sorted by the keys"""
+    if not len(table["day"]):
+        return {**{key: table[key] for key in keys}, **{f: table[f] for f in ROLLUP_FIELDS}}
+    key_values = np.empty(len(table["day"]), dtype=[(key, table[key].dtype) for key in keys])
+    for key in keys:
+        key_values[key] = table[key]
+    unique, inverse = np.unique(key_values, return_inverse=True)
+    grouped = {key: unique[key] for key in keys}
+    for field in ROLLUP_FIELDS:
+        grouped[field] = np.bincount(
+            inverse.ravel(), weights=table[field], minlength=len(unique)
+        ).astype(np.int64)
+    return grouped
+
+
+def rollup_records(records: np.ndarray, categories: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Counts per day (since the epoch) and category of log records, sorted by both
+
+    categories is the log's category table.
+    """
+    # Group by one integer key; categories are few, so only they are looked up
+    codes, category_codes = np.unique(records["category"], return_inverse=True)
+    names = np.array(
+        [categories[code] if 0 <= code < len(categories) else "" for code in codes.tolist()],
+        dtype=str,
+    )
+    day = records["reviewed_at"] // DAY_MICROS
+    keys, inverse = np.unique(day * len(codes) + category_codes.ravel(), return_inverse=True)
+    inverse = inverse.ravel()
+    quality = records["quality"]
+    recall = records["previous_repetitions"] > 0
+    table = {
+        "day": keys // len(codes),
+        "category": names[keys % len(codes)],
+        "reviews": np.bincount(inverse, minlength=len(keys)),
+        "recall_reviews": np.bincount(inverse, weights=recall, minlength=len(keys)),
+        "recalled": np.bincount(inverse, weights=recall & (quality >= 3), minlength=len(keys)),
+    }
+    for grade, field in enumerate(GRADE_FIELDS):
+        table[field] = np.bincount(inverse, weights=quality == grade, minlength=len(keys))
+    return {
+        name: values.astype(np.int64) if name != "category" else values
+        for name, values in table.items()
+    }
+
+
+def review_streaks(days: np.ndarray, today: date) -> Tuple[int, int]:
+    """Current and longest runs of consecutive days in sorted days with reviews
+
+    The current streak still counts if there are no reviews yet today.
+    """
+    if not len(days):
+        return 0, 0
+    days = days.astype("datetime64[D]").astype(np.int64)
+    breaks = np.flatnonzero(np.diff(days) != 1)
+    starts = np.r_[0, breaks + 1]
+    ends = np.r_[breaks, len(days) - 1]
+    longest = int((ends - starts).max()) + 1
+    last_day = np.datetime64(today, "D").astype(np.int64)
+    current = int(ends[-1] - starts[-1]) + 1 if last_day - days[-1] <= 1 else 0
+    return current, longest
+
+
+class ReviewLog:
+    """Append-only log of the ratings of a deck's cards, and its rollups"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rollup_path = path + ".rollups"
+        # One JSON string per line; a record's category is its line number
+        self.category_path = path + ".categories"
+        self._rollups: Optional[Dict[str, np.ndarray]] = None
+        self._rollups_count = None
+        self._categories: List[str] = []
+        self._category_ids: Dict[str, int] = {}
+        self._categories_size = 0
+        self._unsynced = False
+
+    def __len__(self) -> int:
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+        return max(size - len(MAGIC), 0) // RECORD.itemsize
+
+    def categories(self) -> List[str]:
+        """The category table, reread when another process added to it"""
+        try:
+            size = os.path.getsize(self.category_path)
+        except FileNotFoundError:
+            size = 0
+        if size != self._categories_size:
+            with open(self.category_path, "rb") as f:
+                data = f.read()
+            # A torn last line (an interrupted append) is not part of the table
+            lines = data[: data.rfind(b"\n") + 1].splitlines()
+            self._categories = [json.loads(line) for line in lines]
+            self._category_ids = {name: i for i, name in enumerate(self._categories)}
+            self._categories_size = size
+        return self._categories
+
+    def _category_codes(self, categories: List[str]) -> np.ndarray:
+        """Indexes of categories in the table, durably adding new ones first"""
+        self.categories()
+        new = [name for name in dict.fromkeys(categories) if name not in self._category_ids]
+        if new:
+            with open(self.category_path, "a+b") as f:
+                f.seek(0)
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)
+                f.write(b"".join(json.dumps(name).encode("utf-8") + b"\n" for name in new))
+                f.flush()
+                os.fsync(f.fileno())
+            self.categories()
+        return np.array([self._category_ids[name] for name in categories], dtype=np.int32)
+
+    def append(self, reviews: np.ndarray, sync: bool = True):
+        """Append reviews (from review_records); callers serialize appends
+
+        With sync=False the records are not fsynced until sync() is called.
+        """
+        if not len(reviews):
+            return
+        records = np.zeros(len(reviews), dtype=RECORD)
+        for name in RECORD.names:
+            if name != "category":
+                records[name] = reviews[name]
+        records["category"] = self._category_codes(reviews["category"].tolist())
+        with open(self.path, "ab") as f:
+            size = f.tell()
+            if size < len(MAGIC):
+                f.truncate(0)
+                f.write(MAGIC)
+            elif (size - len(MAGIC)) % RECORD.itemsize:
+                # An interrupted append left a partial record
+                f.truncate(size - (size - len(MAGIC)) % RECORD.itemsize)
+            f.write(records.tobytes())
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+        self._unsynced = self._unsynced or not sync
+
+    def sync(self):
+        """fsync the records appended with sync=False"""
+        if self._unsynced:
+            with open(self.path, "rb") as f:
+                os.fsync(f.fileno())
+            self._unsynced = False
+
+    def records(self, start: int = 0) -> np.ndarray:
+        """Read-only mapped records from index start on"""
+        count = len(self)
+        if start >= count:
+            return np.empty(0, dtype=RECORD)
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return np.empty(0, dtype=RECORD)
+        return np.memmap(
+            self.path,
+            dtype=RECORD,
+            mode="r",
+            offset=len(MAGIC) + start * RECORD.itemsize,
+            shape=(count - start,),
+        )
+
+    def _read_rollups(self) -> Tuple[Dict[str, np.ndarray], int]:
+        """The stored rollup table and the number of records it covers"""
+        try:
+            with np.load(self.rollup_path) as arrays:
+                table = {name: arrays[name] for name in ("day", "category") + ROLLUP_FIELDS}
+                return table, int(arrays["covered"])
+        except (OSError, KeyError, ValueError):
+            return _empty_rollups(), 0
+
+    def _write_rollups(self, table: Dict[str, np.ndarray], covered: int):
+        # Readers of the same log may fold and store it concurrently
+        tmp_path = f"{self.rollup_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, covered=covered, **table)
+        os.replace(tmp_path, self.rollup_path)
+
+    def rollups(self) -> Dict[str, np.ndarray]:
+        """Counts per day and category (columns named by ROLLUP_FIELDS), sorted by day
+
+        day holds days since the epoch. Records appended since the stored
+        table was written are folded in, and the table is stored again.
+        """
+        count = len(self)
+        if self._rollups is not None and self._rollups_count == count:
+            return self._rollups
+        table, covered = self._read_rollups()
+        if covered > count:
+            # The log was replaced; count it again
+            table, covered = _empty_rollups(), 0
+        if covered < count:
+            new = rollup_records(self.records(covered), self.categories())
+            merged = {
+                name: np.concatenate([table[name], new[name]])
+                for name in ("day", "category") + ROLLUP_FIELDS
+            }
+            table = _group(merged, ("day", "category"))
+            try:
+                self._write_rollups(table, count)
+            except OSError:
+                pass  # Folded again by the next read
+        self._rollups, self._rollups_count = table, count
+        return table
+
+    def daily(self, category: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Counts per day (of all categories, or of one), with day as datetime64[D]"""
+        table = self.rollups()
+        if category is not None:
+            mask = table["category"] == category
+            table = {name: values[mask] for name, values in table.items()}
+        table = _group(table, ("day",))
+        table["day"] = table["day"].astype("datetime64[D]")
+        return table
+
+    def grade_counts(self, category: Optional[str] = None) -> np.ndarray:
+        """Number of ratings of each grade 0-5"""
+        table = self.daily(category)
+        return np.array([int(table[field].sum()) for field in GRADE_FIELDS], dtype=np.int64)
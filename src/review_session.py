@@ -0,0 +1,112 @@
+"""
+Review sessions: the queue of due cards worked through on the Review page
+"""
+
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from typing import Deque, Dict, List, Optional
+
+import numpy as np
+
+from .columnar import CardColumns
+from .spaced_repetition import Card
+from .storage import Storage
+
+ORDERINGS = {
+    "most_overdue": "Most overdue first",
+    "lowest_ease": "Hardest first (lowest ease)",
+    "interleave": "Mix categories",
+    "random": "Random",
+}
+# Cards materialized ahead of the one under review
+PREFETCH = 5
+
+
+def order_rows(
+    columns: CardColumns, rows: List[int], ordering: str, seed: Optional[int] = None
+) -> np.ndarray:
+    """Order due rows (given most overdue first) for a review session"""
+    rows = np.asarray(rows, dtype=np.intp)
+    if ordering == "most_overdue":
+        return rows
+    if ordering == "lowest_ease":
+        # Stable, so cards of equal ease stay most overdue first
+        return rows[np.argsort(columns.ease_factor[rows], kind="stable")]
+    if ordering == "interleave":
+        # One card of each category in turn, each category most overdue first
+        seen: Dict[int, int] = {}
+        turns = np.empty(len(rows), dtype=np.int64)
+        for i, category in enumerate(columns.category[rows].tolist()):
+            turns[i] = seen.get(category, 0)
+            seen[category] = turns[i] + 1
+        return rows[np.argsort(turns, kind="stable")]
+    if ordering == "random":
+        return np.random.default_rng(seed).permutation(rows)
+    raise ValueError(f"Unknown review ordering: {ordering}")
+
+
+class ReviewSession:
+    """Due cards queued once when the session starts, in the chosen order
+
+    The next PREFETCH cards are kept as Card objects, so moving to the next
+    card neither reads the storage nor scans the deck. Cards that become due
+    during the session wait for the next one.
+    """
+
+    def __init__(
+        self,
+        storage: Storage,
+        ordering: str = "most_overdue",
+        prefetch: int = PREFETCH,
+        now: Optional[datetime] = None,
+        seed: Optional[int] = None,
+    ):
+        self.storage = storage
+        self.ordering = ordering
+        self.prefetch = prefetch
+        columns = storage.columns
+        rows = order_rows(columns, storage.due_index.due_rows(now), ordering, seed)
+        self._queue: Deque[str] = deque(columns.id_of(row) for row in rows.tolist())
+        self._cards: Dict[str, Card] = {}
+        self.reviewed = 0
+        self._fill()
+
+    def __len__(self) -> int:
+        """Cards left, including the one under review"""
+        return len(self._queue)
+
+    def _fill(self):
+        """Materialize the cards at the head of the queue that are not yet prefetched"""
+        ahead = islice(self._queue, self.prefetch + 1)
+        missing = [card_id for card_id in ahead if card_id not in self._cards]
+        if missing:
+            for card in self.storage.get_cards(missing):
+                self._cards[card.id] = card
+
+    def current(self) -> Optional[Card]:
+        """The card under review, skipping cards deleted or rated in another session"""
+        due_index = self.storage.due_index
+        columns = self.storage.columns
+        while self._queue:
+            card_id = self._queue[0]
+            if due_index.is_due(card_id):
+                row = columns.row_of(card_id)
+                card = self._cards.get(card_id)
+                if card is None or card.version != columns.version[row]:
+                    # Edited since it was prefetched
+                    card = self._cards[card_id] = columns.card(row)
+                return card
+            self._skip()
+        return None
+
+    def _skip(self):
+        self._cards.pop(self._queue.popleft(), None)
+        self._fill()
+
+    def advance(self) -> Optional[Card]:
+        """Move on after the current card was rated; returns the next card"""
+        if self._queue:
+            self._skip()
+            self.reviewed += 1
+        return self.current()
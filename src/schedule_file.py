@@ -0,0 +1,180 @@
+"""
+Memory-mapped scheduling sidecar of a deck
+
+A fixed-width record per CardColumns row holds the fields that due and stats
+queries read, so a process whose cached deck is stale, or that has not loaded
+the deck yet, can answer them from a read-only memory map without decoding
+any card text. Writes rewrite only the records of the rows they change.
+
+The header names the deck version the records describe (a digest of the
+storage signature); a file describing another version is ignored. It also
+carries a layout token that changes whenever the file is rewritten, so a
+process only updates records in place while its row numbers are the file's.
+"""
+
+import hashlib
+import os
+import secrets
+import threading
+from datetime import datetime
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .columnar import CardColumns, schedule_stats, to_micros
+
+MAGIC = b"FLPZSCH1"
+# Changed rows above which update() rewrites all records in one write
+MAX_RECORD_WRITES = 256
+# Magic, record count, layout token and signature digest, padded
+HEADER = np.dtype(
+    [("magic", "S8"), ("count", "<i8"), ("token", "<i8"), ("signature", "V16"), ("pad", "S32")]
+)
+RECORD = np.dtype(
+    [
+        ("next_review", "<i8"),
+        ("last_reviewed", "<i8"),
+        ("ease_factor", "<f8"),
+        ("interval", "<i4"),
+        ("repetitions", "<i4"),
+        ("alive", "u1"),
+    ],
+    align=True,
+)
+
+
+def signature_digest(signature) -> bytes:
+    """Digest of a Storage signature (nested tuples of ints), stable across processes"""
+    return hashlib.blake2b(repr(signature).encode("ascii"), digest_size=16).digest()
+
+
+class ScheduleFile:
+    """Scheduling records of a deck's rows in a file next to it"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map: Optional[np.memmap] = None
+        self._map_key = None
+
+    def _header(self, f=None) -> Optional[np.void]:
+        if f is None:
+            try:
+                with open(self.path, "rb") as f:
+                    return self._header(f)
+            except FileNotFoundError:
+                return None
+        data = f.read(HEADER.itemsize)
+        if len(data) < HEADER.itemsize:
+            return None
+        header = np.frombuffer(data, dtype=HEADER).copy()[0]
+        return header if header["magic"] == MAGIC else None
+
+    @staticmethod
+    def _records(columns: CardColumns, rows) -> np.ndarray:
+        records = np.zeros(len(rows), dtype=RECORD)
+        for name in RECORD.names:
+            records[name] = getattr(columns, name)[rows]
+        return records
+
+    def records(self, signature) -> Optional[np.ndarray]:
+        """Read-only mapped records if the file describes the deck version signature"""
+        header = self._header()
+        if header is None or header["signature"].tobytes() != signature_digest(signature):
+            return None
+        stat = os.stat(self.path)
+        key = (stat.st_ino, stat.st_size, int(header["count"]))
+        if self._map is None or self._map_key != key:
+            self._map = np.memmap(
+                self.path,
+                dtype=RECORD,
+                mode="r",
+                offset=HEADER.itemsize,
+                shape=(int(header["count"]),),
+            )
+            self._map_key = key
+        return self._map
+
+    def stats(self, signature, now: Optional[datetime] = None) -> Optional[dict]:
+        """Learning stats of the deck version signature, or None if the file is stale"""
+        records = self.records(signature)
+        if records is None:
+            return None
+        return schedule_stats(
+            records["alive"].astype(bool),
+            records["next_review"],
+            records["interval"],
+            records["repetitions"],
+            now,
+        )
+
+    def count_due(self, signature, now: Optional[datetime] = None) -> Optional[int]:
+        """Number of due cards of the deck version signature, or None if the file is stale"""
+        records = self.records(signature)
+        if records is None:
+            return None
+        due = records["alive"].astype(bool) & (
+            records["next_review"] <= to_micros(now or datetime.now())
+        )
+        return int(np.count_nonzero(due))
+
+    def write(self, columns: CardColumns, signature) -> int:
+        """Replace the file with the records of every row; returns the new layout token"""
+        token = secrets.randbits(63)
+        header = np.zeros(1, dtype=HEADER)
+        header[0] = (MAGIC, len(columns.alive), token, signature_digest(signature), b"")
+        # Readers of the same deck version may rewrite it concurrently
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header.tobytes())
+            f.write(self._records(columns, np.arange(len(columns.alive))).tobytes())
+        os.replace(tmp_path, self.path)
+        return token
+
+    def sync(self, columns: CardColumns, signature, write: bool = True) -> Optional[int]:
+        """Layout token of a file matching freshly loaded columns
+
+        A file that does not match is rewritten, or with write=False left as it
+        is (returning None).
+        """
+        header = self._header()
+        if (
+            header is not None
+            and header["signature"].tobytes() == signature_digest(signature)
+            and header["count"] == len(columns.alive)
+        ):
+            records = self.records(signature)
+            if records is not None and np.array_equal(records["alive"].astype(bool), columns.alive):
+                return int(header["token"])
+        return self.write(columns, signature) if write else None
+
+    def update(self, columns: CardColumns, rows: Iterable[int], signature, token: int) -> bool:
+        """Rewrite the records of rows (and append new rows) in place
+
+        Returns False, without writing, if the file does not have the layout
+        token (it was rewritten by another process); rewrite it then.
+        """
+        try:
+            f = open(self.path, "r+b", buffering=0)
+        except FileNotFoundError:
+            return False
+        with f:
+            header = self._header(f)
+            size = len(columns.alive)
+            if header is None or header["token"] != token or header["count"] > size:
+                return False
+            count = int(header["count"])
+            rows = sorted({row for row in rows if row < count})
+            if len(rows) > MAX_RECORD_WRITES:
+                # One sequential write of every record beats many scattered ones
+                rows, count = [], 0
+            for row in rows:
+                f.seek(HEADER.itemsize + row * RECORD.itemsize)
+                f.write(self._records(columns, [row]).tobytes())
+            if size > count:
+                f.seek(HEADER.itemsize + count * RECORD.itemsize)
+                f.write(self._records(columns, np.arange(count, size)).tobytes())
+            header["count"] = size
+            header["signature"] = signature_digest(signature)
+            f.seek(0)
+            f.write(header.tobytes())
+        return True
@@ -0,0 +1,446 @@
+"""
+Full-text search index over card text
+"""
+
+import os
+import re
+import threading
+from bisect import bisect_left, insort
+from contextlib import suppress
+from functools import reduce
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from zipfile import BadZipFile
+
+import numpy as np
+
+from .columnar import CardColumns, pack_strings, unpack_strings
+from .indexes import CardIndex
+
+TOKEN_PATTERN = re.compile(r"\w+")
+TEXT_FIELDS = ("front", "back", "example")
+OTHER_FIELDS = ("back", "example")
+# Kinds of keys and the fields they come from: words of any field, trigrams of
+# the front, trigrams of the back and example
+POSTINGS = {"tokens": TEXT_FIELDS, "front": ("front",), "other": OTHER_FIELDS}
+INDEX_FORMAT = 1
+# A stored index with more changed rows than this share is rebuilt instead
+MAX_CHANGED_SHARE = 0.25
+EMPTY = np.zeros(0, dtype=np.int64)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def trigrams(text: Optional[str]) -> Set[str]:
+    if not text:
+        return set()
+    text = text.lower()
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _rows_holding(
+    string_ids: np.ndarray, field_ids: np.ndarray, rows: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Pair each of string_ids with every row whose field holds it
+
+    field_ids[i] is the field of rows[i]. Returns the pairs as two aligned
+    arrays of indexes into string_ids and rows.
+    """
+    order = np.argsort(field_ids, kind="stable")
+    sorted_ids = field_ids[order]
+    starts = np.searchsorted(sorted_ids, string_ids, "left")
+    counts = np.searchsorted(sorted_ids, string_ids, "right") - starts
+    index = np.repeat(np.arange(len(string_ids)), counts)
+    first = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return index, rows[order][first + np.arange(len(index))]
+
+
+class Postings:
+    """Rows of each key as sorted keys and one flat array of rows
+
+    The rows of keys[i] are rows[offsets[i]:offsets[i + 1]] in ascending order,
+    so the rows of all keys starting with a prefix are a single slice.
+    """
+
+    def __init__(self, keys: List[str], offsets: np.ndarray, rows: np.ndarray):
+        self.keys = keys
+        self.offsets = offsets
+        self.rows = rows
+
+    @classmethod
+    def empty(cls) -> "Postings":
+        return cls([], np.zeros(1, dtype=np.int64), EMPTY)
+
+    @classmethod
+    def from_pairs(cls, keys: List[str], key_ids: np.ndarray, rows: np.ndarray) -> "Postings":
+        """Postings of the (keys[key_ids[i]], rows[i]) pairs"""
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        rank = np.empty(len(keys), dtype=np.int64)
+        rank[order] = np.arange(len(keys))
+        span = int(rows.max()) + 1 if len(rows) else 1
+        pairs = np.unique(rank[key_ids] * span + rows)
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs // span, minlength=len(keys)), out=offsets[1:])
+        return cls([keys[i] for i in order], offsets, (pairs % span).astype(np.int32))
+
+    def get(self, key: str) -> np.ndarray:
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return EMPTY
+        return self.rows[self.offsets[i] : self.offsets[i + 1]]
+
+    def prefix(self, prefix: str) -> np.ndarray:
+        """Rows of the keys starting with prefix (a row may repeat)"""
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + "\U0010ffff", start)
+        return self.rows[self.offsets[start] : self.offsets[end]]
+
+
+class SearchIndex(CardIndex):
+    """Token and trigram postings for ranked search
+
+    A card matches a query when the query is a substring of its front, back or
+    example (found through trigram postings, or a scan of the distinct strings
+    for queries shorter than a trigram) or when every query word is the
+    prefix of one of its words (token postings searched by prefix). Matches
+    are ranked front equals query, front starts with query, front contains
+    query, a word equals a query word, then the rest; ties keep deck order.
+    Front trigrams are kept apart so only front matches need scoring.
+
+    The postings are built on the first search after a reload and stored in a
+    file next to the deck, for the snapshot the deck was loaded from and the
+    journal events replayed on top of it. Later loads of the same snapshot,
+    in this process or another, read that file and re-index only the rows the
+    journal changed since. Writes go to small per-key sets on top of the
+    stored postings: a changed row is marked stale there and indexed again in
+    the sets.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        # (snapshot version, journal events, [(event, row)] text changes) the
+        # loaded deck was read from, set by Storage after a reload; None when
+        # the rows do not number from a stored snapshot
+        self.origin = None
+        self.columns = CardColumns()
+        self._built = False
+        # Rows written while the index was not built
+        self._dirty: Set[int] = set()
+        self.clear()
+
+    def clear(self):
+        self._base = {name: Postings.empty() for name in POSTINGS}
+        # Rows whose base postings are out of date (one flag per base row)
+        self._stale = np.zeros(0, dtype=bool)
+        self._delta: Dict[str, Dict[str, Set[int]]] = {name: {} for name in POSTINGS}
+        # Sorted tokens of the delta postings, for prefix lookups
+        self._vocabulary: List[str] = []
+        self._lowered: List[str] = []
+
+    def rebuild(self, columns: CardColumns):
+        self.columns = columns
+        self.origin = None
+        self._built = False
+        self._dirty = set()
+        self.clear()
+
+    def _ensure_built(self):
+        if self._built:
+            return
+        self.clear()
+        self._built = True
+        changed = self._load()
+        if changed is None:
+            self._base = self._build()
+            self._stale = np.zeros(len(self.columns.alive), dtype=bool)
+            if not self._dirty:
+                self._save()
+            changed = set()
+        else:
+            changed |= self._dirty
+        self._dirty = set()
+
+        alive = self.columns.alive
+        changed.update(range(len(self._stale), len(alive)))
+        for row in sorted(changed):
+            if row < len(self._stale):
+                self._stale[row] = True
+            if alive[row]:
+                self.add(row)
+
+    def _build(self) -> Dict[str, Postings]:
+        """Postings of the live rows, extracting the keys of each distinct string once"""
+        columns = self.columns
+        rows = columns.rows()
+        key_ids: Dict[str, Dict[str, int]] = {name: {} for name in POSTINGS}
+        pairs: Dict[str, Tuple[list, list]] = {name: ([], []) for name in POSTINGS}
+        for field in TEXT_FIELDS:
+            field_ids = getattr(columns, field)[rows]
+            names = [name for name, fields in POSTINGS.items() if field in fields]
+            keys_of_strings = {name: ([], []) for name in names}
+            for string_id in np.unique(field_ids[field_ids >= 0]).tolist():
+                text = columns.strings.get(string_id)
+                grams = trigrams(text)
+                for name in names:
+                    ids = key_ids[name]
+                    keys = set(tokenize(text)) if name == "tokens" else grams
+                    string_key_ids, string_ids = keys_of_strings[name]
+                    string_key_ids.extend(ids.setdefault(key, len(ids)) for key in keys)
+                    string_ids.extend([string_id] * len(keys))
+            for name in names:
+                string_key_ids, string_ids = keys_of_strings[name]
+                index, field_rows = _rows_holding(
+                    np.array(string_ids, dtype=np.int64), field_ids, rows
+                )
+                pairs[name][0].append(np.array(string_key_ids, dtype=np.int64)[index])
+                pairs[name][1].append(field_rows)
+        return {
+            name: Postings.from_pairs(
+                list(key_ids[name]),
+                np.concatenate(pairs[name][0]),
+                np.concatenate(pairs[name][1]),
+            )
+            for name in POSTINGS
+        }
+
+    def _load(self) -> Optional[Set[int]]:
+        """Use the stored postings if they fit the loaded deck
+
+        Returns the rows changed since they were stored, or None when there
+        are no usable stored postings.
+        """
+        if self.path is None or self.origin is None:
+            return None
+        version, journal_events, changes = self.origin
+        try:
+            with np.load(self.path) as arrays:
+                stored_events = int(arrays["journal_events"])
+                size = int(arrays["size"])
+                if (
+                    int(arrays["format"]) != INDEX_FORMAT
+                    or str(arrays["origin"]) != str(version)
+                    or stored_events > journal_events
+                    or size > len(self.columns.alive)
+                ):
+                    return None
+                changed = {row for event, row in changes if event >= stored_events}
+                if len(changed) + len(self.columns.alive) - size > MAX_CHANGED_SHARE * size:
+                    return None
+                base = {
+                    name: Postings(
+                        unpack_strings(arrays[f"{name}_keys"], arrays[f"{name}_key_offsets"]),
+                        arrays[f"{name}_offsets"],
+                        arrays[f"{name}_rows"],
+                    )
+                    for name in POSTINGS
+                }
+        except (OSError, ValueError, KeyError, EOFError, BadZipFile):
+            # Missing or unreadable; it is rebuilt
+            return None
+        self._base = base
+        self._stale = np.zeros(size, dtype=bool)
+        return changed
+
+    def _save(self):
+        """Store the postings next to the deck (best effort, they can be rebuilt)"""
+        if self.path is None or self.origin is None:
+            return
+        version, journal_events, _ = self.origin
+        arrays = {
+            "format": INDEX_FORMAT,
+            "origin": str(version),
+            "journal_events": journal_events,
+            "size": len(self._stale),
+        }
+        for name, postings in self._base.items():
+            arrays[f"{name}_keys"], arrays[f"{name}_key_offsets"] = pack_strings(postings.keys)
+            arrays[f"{name}_offsets"] = postings.offsets
+            arrays[f"{name}_rows"] = postings.rows
+        # Unique per writer, as other processes may store the same deck's index
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            with suppress(FileNotFoundError):
+                os.remove(tmp_path)
+
+    def _keys(self, row: int) -> Dict[str, Set[str]]:
+        text = {field: self.columns.text(field, row) for field in TEXT_FIELDS}
+        tokens = set()
+        for value in text.values():
+            tokens.update(tokenize(value))
+        other = set()
+        for field in OTHER_FIELDS:
+            other |= trigrams(text[field])
+        return {"tokens": tokens, "front": trigrams(text["front"]), "other": other}
+
+    def add(self, row: int):
+        if not self._built:
+            self._dirty.add(row)
+            return
+        if row < len(self._stale):
+            self._stale[row] = True
+        for name, keys in self._keys(row).items():
+            delta = self._delta[name]
+            for key in keys:
+                postings = delta.get(key)
+                if postings is None:
+                    postings = delta[key] = set()
+                    if name == "tokens":
+                        insort(self._vocabulary, key)
+                postings.add(row)
+
+    def remove(self, row: int):
+        if not self._built:
+            self._dirty.add(row)
+            return
+        if row < len(self._stale) and not self._stale[row]:
+            # Only in the base postings, which now skip it
+            self._stale[row] = True
+            return
+        for name, keys in self._keys(row).items():
+            delta = self._delta[name]
+            for key in keys:
+                postings = delta[key]
+                postings.discard(row)
+                if not postings:
+                    del delta[key]
+                    if name == "tokens":
+                        del self._vocabulary[bisect_left(self._vocabulary, key)]
+
+    def _current(self, rows: np.ndarray) -> np.ndarray:
+        """Base postings rows that are not stale"""
+        return rows[~self._stale[rows]] if len(rows) else rows
+
+    def _lookup(self, name: str, key: str) -> np.ndarray:
+        rows = self._current(self._base[name].get(key))
+        extra = self._delta[name].get(key)
+        return np.union1d(rows, list(extra)) if extra else rows
+
+    def _prefix_rows(self, prefix: str) -> np.ndarray:
+        # A mask merges the rows of many keys without sorting them
+        mask = np.zeros(len(self.columns.alive), dtype=bool)
+        mask[self._current(self._base["tokens"].prefix(prefix))] = True
+        i = bisect_left(self._vocabulary, prefix)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(prefix):
+            mask[list(self._delta["tokens"][self._vocabulary[i]])] = True
+            i += 1
+        return np.flatnonzero(mask)
+
+    def _lowered_strings(self) -> List[str]:
+        """The string table in lower case, extended as strings are interned"""
+        strings = self.columns.strings
+        if len(self._lowered) < len(strings):
+            self._lowered.extend(
+                value.lower() for value in islice(strings, len(self._lowered), None)
+            )
+        return self._lowered
+
+    def _contains(self, rows: np.ndarray, query: str, fields: Iterable[str]) -> np.ndarray:
+        """Mask of the rows containing query in any of fields"""
+        lowered = self._lowered_strings()
+        mask = np.zeros(len(rows), dtype=bool)
+        for field in fields:
+            string_ids, inverse = np.unique(getattr(self.columns, field)[rows], return_inverse=True)
+            found = np.array(
+                [i >= 0 and query in lowered[i] for i in string_ids.tolist()], dtype=bool
+            )
+            mask |= found[inverse.ravel()]
+        return mask
+
+    def _substring_rows(self, query: str, name: str, fields: Iterable[str]) -> np.ndarray:
+        postings = sorted((self._lookup(name, gram) for gram in trigrams(query)), key=len)
+        if not len(postings[0]):
+            return EMPTY
+        rows = reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), postings)
+        if len(query) == 3:
+            # The single trigram is the query itself, no false positives
+            return rows
+        return rows[self._contains(rows, query, fields)]
+
+    def _scan_rows(self, string_ids: List[int], fields: Iterable[str]) -> np.ndarray:
+        """Rows holding one of string_ids in any of fields"""
+        columns = self.columns
+        mask = np.zeros(len(columns.alive), dtype=bool)
+        for field in fields:
+            mask |= np.isin(getattr(columns, field), string_ids)
+        return np.flatnonzero(mask & columns.alive)
+
+    @staticmethod
+    def _front_score(front: str, query: str) -> int:
+        if front == query:
+            return 4
+        if front.startswith(query):
+            return 3
+        return 2 if query in front else 0
+
+    def _by_front_score(self, rows: np.ndarray, query: str) -> np.ndarray:
+        """Rows ordered by how well their front matches query, then by row"""
+        string_ids, inverse = np.unique(self.columns.front[rows], return_inverse=True)
+        lowered = self._lowered_strings()
+        scores = np.array(
+            [self._front_score(lowered[i], query) for i in string_ids.tolist()], dtype=np.int64
+        )
+        return rows[np.lexsort((rows, -scores[inverse.ravel()]))]
+
+    def _in_category(self, rows: np.ndarray, category_id: Optional[int]) -> np.ndarray:
+        if category_id is None:
+            return rows
+        return rows[self.columns.category[rows] == category_id]
+
+    def search(
+        self, query: str, category: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[int]:
+        """Rows matching query, best match first (all rows in order for an empty query)"""
+        query = query.lower()
+        columns = self.columns
+
+        category_id = None
+        if category is not None:
+            category_id = columns.strings.find(category)
+            if category_id is None:
+                return []
+
+        if not query.strip():
+            rows = columns.rows() if category is None else columns.category_rows(category)
+            return rows[:limit].tolist()
+
+        self._ensure_built()
+        words = tokenize(query)
+        word_rows = EMPTY
+        if words:
+            word_rows = reduce(
+                lambda a, b: np.intersect1d(a, b, assume_unique=True), map(self._prefix_rows, words)
+            )
+        if len(query) >= 3:
+            front_rows = self._substring_rows(query, "front", ("front",))
+            other_rows = self._substring_rows(query, "other", OTHER_FIELDS)
+        else:
+            # Too short for trigrams; scanning the distinct strings is still cheap
+            string_ids = [i for i, value in enumerate(self._lowered_strings()) if query in value]
+            front_rows = self._scan_rows(string_ids, ("front",))
+            other_rows = self._scan_rows(string_ids, OTHER_FIELDS)
+        # Masks over all rows merge large row sets without sorting them
+        other = np.zeros(len(columns.alive), dtype=bool)
+        other[other_rows] = True
+        other[word_rows] = True
+        other[front_rows] = False
+        if category_id is not None:
+            other &= columns.category == category_id
+        exact = np.zeros_like(other)
+        for word in words:
+            exact[self._lookup("tokens", word)] = True
+        front_rows = self._in_category(front_rows, category_id)
+
+        ranked = np.concatenate(
+            [
+                self._by_front_score(front_rows, query),
+                np.flatnonzero(other & exact),
+                np.flatnonzero(other & ~exact),
+            ]
+        )
+        return ranked[:limit].tolist()
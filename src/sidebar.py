@@ -2,15 +2,22 @@
 Sidebar component with navigation and quick stats
 """
 
+import os
 import random
 from datetime import datetime
 
 import streamlit as st
 
+from src.backups import start_backup
+from src.config import get_decks, select_deck
+from src.pages import PAGES
+
 
 def render_sidebar(storage, stats):
     """Render the sidebar with stats, navigation, and quick actions"""
     with st.sidebar:
+        render_deck_picker()
+
         st.markdown("### 🎯 Quick Stats")
 
         # Stats cards in sidebar
@@ -48,7 +55,7 @@ def render_sidebar(storage, stats):
         st.markdown("### 🧭 Navigation")
         page = st.radio(
             "Choose a page",
-            ["🏠 Home", "➕ Add Vocabulary", "📖 Review", "📊 Statistics", "📝 Manage Cards"],
+            list(PAGES),
             label_visibility="collapsed",
         )
 
@@ -57,12 +64,8 @@ def render_sidebar(storage, stats):
         # Quick actions
         st.markdown("### ⚡ Quick Actions")
         if st.button("💾 Create Backup", use_container_width=True):
-            backup_path = storage.backup_now()
-            if backup_path:
-                st.success("✅ Backup created!")
-                st.caption(f"📁 {backup_path.split('/')[-1]}")
-            else:
-                st.warning("No data to backup.")
+            st.session_state.backup = start_backup(storage)
+        render_backup_status()
 
         st.markdown("---")
 
@@ -80,22 +83,106 @@ def render_sidebar(storage, stats):
         st.markdown("---")
 
         # Recent activity preview
-        cards = storage.load_cards()
-        if cards:
-            recent_reviewed = sorted(
-                [c for c in cards if c.last_reviewed], key=lambda x: x.last_reviewed, reverse=True
-            )[:3]
-            if recent_reviewed:
-                st.markdown("#### 🕐 Recent Activity")
-                for card in recent_reviewed:
-                    days_ago = (datetime.now() - card.last_reviewed).days
-                    if days_ago == 0:
-                        time_str = "Today"
-                    elif days_ago == 1:
-                        time_str = "Yesterday"
-                    else:
-                        time_str = f"{days_ago} days ago"
-                    st.caption(f"📌 {card.front}")
-                    st.caption(f"   {time_str} • {card.repetitions}x reviewed")
+        recent_reviewed = storage.recent("last_reviewed", 3)
+        if recent_reviewed:
+            st.markdown("#### 🕐 Recent Activity")
+            for card in recent_reviewed:
+                days_ago = (datetime.now() - card.last_reviewed).days
+                if days_ago == 0:
+                    time_str = "Today"
+                elif days_ago == 1:
+                    time_str = "Yesterday"
+                else:
+                    time_str = f"{days_ago} days ago"
+                st.caption(f"📌 {card.front}")
+                st.caption(f"   {time_str} • {card.repetitions}x reviewed")
 
     return page
+
+
+def render_backup_status():
+    """Show the outcome of the last backup started by this session"""
+    backup = st.session_state.get("backup")
+    if backup is None:
+        return
+    if not backup.done():
+        st.caption("⏳ Backup running...")
+    elif backup.exception():
+        st.error(f"Backup failed: {backup.exception()}")
+    elif backup.result():
+        st.success("✅ Backup created!")
+        st.caption(f"📁 {os.path.basename(backup.result())}")
+    else:
+        st.warning("No data to backup.")
+
+
+def render_deck_picker():
+    """Select or create the deck the session works in"""
+    st.markdown("### 🗂️ Deck")
+    decks = get_decks().decks(st.session_state.user)
+    # Keyed by the current deck, so the picker follows decks selected elsewhere
+    key = f"deck_picker_{st.session_state.deck}"
+    st.selectbox(
+        "Deck",
+        decks,
+        index=decks.index(st.session_state.deck),
+        key=key,
+        on_change=lambda: select_deck(st.session_state[key]),
+        label_visibility="collapsed",
+    )
+    with st.expander("➕ New deck"):
+        name = st.text_input("Deck name", key="new_deck_name")
+        if st.button("Create deck", use_container_width=True):
+            if not name.strip():
+                st.error("Enter a deck name.")
+            elif name.strip() in decks:
+                st.error("A deck with this name already exists.")
+            else:
+                select_deck(name.strip())
+                st.rerun()
+    st.markdown("---")
+
+
+def render_debug_panel():
+    """Timings of the last rerun and of the session, for finding slow steps"""
+    with st.sidebar.expander("🐞 Performance"):
+        st.toggle("Record timings", key="trace_enabled")
+        span_stats = st.session_state.span_stats
+        if not span_stats.traces:
+            st.caption("Timings are shown from the next rerun on.")
+            return
+
+        last = span_stats.traces[-1]
+        st.caption(f"Last rerun: {last.duration * 1000:.1f} ms")
+        st.dataframe(
+            [
+                {"span": "  " * s.depth + s.name, "ms": round(s.duration * 1000, 2)}
+                for s in last.ordered()
+            ],
+            hide_index=True,
+            use_container_width=True,
+        )
+        st.caption(f"Session ({len(span_stats.traces)} reruns)")
+        st.dataframe(
+            span_stats.summary(),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "p50_ms": st.column_config.NumberColumn("p50 ms", format="%.2f"),
+                "p95_ms": st.column_config.NumberColumn("p95 ms", format="%.2f"),
+            },
+        )
+        st.download_button(
+            "Prometheus metrics",
+            span_stats.to_prometheus(),
+            "flipzy_metrics.prom",
+            "text/plain",
+            use_container_width=True,
+        )
+        st.download_button(
+            "JSONL trace",
+            span_stats.to_jsonl(),
+            "flipzy_trace.jsonl",
+            "application/jsonl",
+            use_container_width=True,
+        )
@@ -6,8 +6,18 @@ Based on SuperMemo 2 algorithm for optimal learning intervals
 from datetime import datetime, timedelta
 from typing import Optional
 
+import numpy as np
 from pydantic import BaseModel, Field
 
+from .tracing import traced
+
+# Card fields changed by a review
+SCHEDULE_FIELDS = ("ease_factor", "interval", "repetitions", "next_review", "last_reviewed")
+
+# A card is mastered after this many successful reviews with an interval of this many days
+MASTERED_REPETITIONS = 5
+MASTERED_INTERVAL = 30
+
 
 class Card(BaseModel):
     """Represents a vocabulary or phrase card"""
@@ -26,11 +36,15 @@ class Card(BaseModel):
     next_review: datetime = Field(default_factory=datetime.now)
     last_reviewed: Optional[datetime] = None
 
+    # Incremented by Storage on every stored change, for optimistic concurrency
+    version: int = 0
+
 
 class SpacedRepetition:
     """Implements SM-2 spaced repetition algorithm"""
 
     @staticmethod
+    @traced
     def calculate_next_review(card: Card, quality: int) -> Card:
         """
         Calculate next review date based on SM-2 algorithm
@@ -70,17 +84,54 @@ class SpacedRepetition:
         return card
 
     @staticmethod
+    def calculate_next_review_batch(
+        ease_factor: np.ndarray, interval: np.ndarray, repetitions: np.ndarray, quality: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Apply calculate_next_review to many cards at once
+
+        Takes equally shaped arrays (one element per card) and returns the new
+        (ease_factor, interval, repetitions) arrays. Results are identical to the
+        scalar method: the same float64 operations in the same order, the 1.3
+        ease floor and int() truncation of the grown interval. Callers set
+        next_review to the review time plus the new interval in days.
+        """
+        ease_factor = np.asarray(ease_factor, dtype=np.float64)
+        interval = np.asarray(interval, dtype=np.int64)
+        repetitions = np.asarray(repetitions, dtype=np.int64)
+        quality = np.asarray(quality, dtype=np.int64)
+
+        correct = quality >= 3
+        grown = np.trunc(interval * ease_factor).astype(np.int64)
+        next_interval = np.where(repetitions == 0, 1, np.where(repetitions == 1, 6, grown))
+        penalty = 5 - quality
+        next_ease = np.maximum(1.3, ease_factor + (0.1 - penalty * (0.08 + penalty * 0.02)))
+
+        return (
+            np.where(correct, next_ease, ease_factor),
+            np.where(correct, next_interval, 1),
+            np.where(correct, repetitions + 1, 0),
+        )
+
+    @staticmethod
+    @traced
     def get_due_cards(cards: list[Card]) -> list[Card]:
         """Get all cards that are due for review"""
         now = datetime.now()
         return [card for card in cards if card.next_review <= now]
 
     @staticmethod
+    def is_mastered(card: Card) -> bool:
+        """Whether a card has been learned well enough to count as mastered"""
+        return card.repetitions >= MASTERED_REPETITIONS and card.interval >= MASTERED_INTERVAL
+
+    @staticmethod
+    @traced
     def get_stats(cards: list[Card]) -> dict:
         """Get statistics about the learning progress"""
         total = len(cards)
         due = len(SpacedRepetition.get_due_cards(cards))
-        mastered = len([c for c in cards if c.repetitions >= 5 and c.interval >= 30])
+        mastered = len([c for c in cards if SpacedRepetition.is_mastered(c)])
         new = len([c for c in cards if c.repetitions == 0])
 
         return {
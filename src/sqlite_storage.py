@@ -0,0 +1,214 @@
+"""
+SQLite storage backend for vocabulary cards
+"""
+
+import argparse
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator
+
+import numpy as np
+
+from .columnar import CardColumns
+from .spaced_repetition import Card
+from .storage import REVIEW_FIELDS, Storage
+from .tracing import traced
+
+CARD_COLUMNS = (
+    "id",
+    "front",
+    "back",
+    "category",
+    "example",
+    "created_at",
+    "ease_factor",
+    "interval",
+    "repetitions",
+    "next_review",
+    "last_reviewed",
+    "version",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    id TEXT PRIMARY KEY,
+    front TEXT NOT NULL,
+    back TEXT NOT NULL,
+    category TEXT NOT NULL DEFAULT 'general',
+    example TEXT,
+    created_at TEXT NOT NULL,
+    ease_factor REAL NOT NULL,
+    interval INTEGER NOT NULL,
+    repetitions INTEGER NOT NULL,
+    next_review TEXT NOT NULL,
+    last_reviewed TEXT,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_cards_next_review ON cards (next_review);
+CREATE INDEX IF NOT EXISTS idx_cards_category ON cards (category);
+CREATE INDEX IF NOT EXISTS idx_cards_last_reviewed ON cards (last_reviewed);
+
+-- Bumped on every write so readers can tell when their cached cards are stale
+CREATE TABLE IF NOT EXISTS meta (generation INTEGER NOT NULL);
+INSERT INTO meta (generation) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM meta);
+CREATE TRIGGER IF NOT EXISTS cards_generation_insert AFTER INSERT ON cards
+BEGIN UPDATE meta SET generation = generation + 1; END;
+CREATE TRIGGER IF NOT EXISTS cards_generation_update AFTER UPDATE ON cards
+BEGIN UPDATE meta SET generation = generation + 1; END;
+CREATE TRIGGER IF NOT EXISTS cards_generation_delete AFTER DELETE ON cards
+BEGIN UPDATE meta SET generation = generation + 1; END;
+"""
+
+INSERT_SQL = (
+    f"INSERT INTO cards ({', '.join(CARD_COLUMNS)}) VALUES ({', '.join('?' * len(CARD_COLUMNS))})"
+)
+UPDATE_SQL = f"UPDATE cards SET {', '.join(f'{c} = ?' for c in CARD_COLUMNS[1:])} WHERE id = ?"
+REVIEW_SQL = f"UPDATE cards SET {', '.join(f'{c} = ?' for c in REVIEW_FIELDS)} WHERE id = ?"
+
+
+def card_to_row(card: Card) -> tuple:
+    """Convert a card to a row tuple in CARD_COLUMNS order"""
+    return (
+        card.id,
+        card.front,
+        card.back,
+        card.category,
+        card.example,
+        card.created_at.isoformat(),
+        card.ease_factor,
+        card.interval,
+        card.repetitions,
+        card.next_review.isoformat(),
+        card.last_reviewed.isoformat() if card.last_reviewed else None,
+        card.version,
+    )
+
+
+class SQLiteStorage(Storage):
+    """Stores cards in a SQLite database with single-row writes"""
+
+    def __init__(self, file_path: str = "data/vocabulary_cards.db"):
+        super().__init__(file_path)
+
+    def _sidecar_path(self, suffix: str) -> str:
+        # cards.db.pending, so a JSON deck of the same name keeps its own files
+        return self.file_path + suffix
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, committing on success and always closing it"""
+        conn = sqlite3.connect(self.file_path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _ensure_file_exists(self):
+        """Create the database schema if it doesn't exist"""
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            # Databases created before cards had versions
+            if "version" not in {row[1] for row in conn.execute("PRAGMA table_info(cards)")}:
+                conn.execute("ALTER TABLE cards ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def _signature(self):
+        """Return the write generation counter of the database and the pending reviews"""
+        with self._connect() as conn:
+            generation = conn.execute("SELECT generation FROM meta").fetchone()[0]
+        return generation, self._file_signature(self.pending_path)
+
+    def _search_origin(self):
+        # Rows of a load number from the cards in rowid order, which any write may change
+        return self._signature()[0], 0, []
+
+    @traced
+    def _read_columns(self) -> CardColumns:
+        """Read all cards from the database, with the buffered reviews applied"""
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {', '.join(CARD_COLUMNS)} FROM cards ORDER BY rowid")
+            columns = CardColumns.from_dicts(dict(zip(CARD_COLUMNS, row)) for row in rows)
+        self._replay_pending(columns)
+        return columns
+
+    def iter_card_dicts(self) -> Iterator[dict]:
+        """Serialized cards in rowid order, fetched from a cursor as they are consumed"""
+        with self._locked(shared=True):
+            reviews = self._pending_reviews()
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {', '.join(CARD_COLUMNS)} FROM cards ORDER BY rowid")
+            for row in rows:
+                yield self._apply_pending(dict(zip(CARD_COLUMNS, row)), reviews)
+
+    @traced
+    def _write_columns(self, columns: CardColumns):
+        """Replace all stored cards in a single transaction"""
+        rows = columns.row_dicts()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cards")
+            conn.executemany(INSERT_SQL, (tuple(r[c] for c in CARD_COLUMNS) for r in rows))
+
+    def _persist_add(self, card: Card):
+        """Insert a single card row"""
+        with self._connect() as conn:
+            conn.execute(INSERT_SQL, card_to_row(card))
+
+    def _persist_adds(self, cards):
+        """Insert many card rows in one transaction"""
+        with self._connect() as conn:
+            conn.executemany(INSERT_SQL, map(card_to_row, cards))
+
+    def _persist_update(self, card: Card):
+        """Update a single card row"""
+        row = card_to_row(card)
+        with self._connect() as conn:
+            conn.execute(UPDATE_SQL, row[1:] + row[:1])
+
+    def _persist_review(self, card: Card):
+        """Update the scheduling columns of a single card row"""
+        row = dict(zip(CARD_COLUMNS, card_to_row(card)))
+        with self._connect() as conn:
+            conn.execute(REVIEW_SQL, tuple(row[c] for c in REVIEW_FIELDS) + (card.id,))
+
+    def _persist_pending(self, events):
+        """Update the scheduling columns of the buffered reviews in one transaction"""
+        params = [tuple(event[c] for c in REVIEW_FIELDS) + (event["id"],) for event in events]
+        with self._connect() as conn:
+            conn.executemany(REVIEW_SQL, params)
+
+    def _persist_schedules(self, rows):
+        """Update the scheduling columns of many rows in one transaction"""
+        row_dicts = self._columns.row_dicts(np.asarray(rows))
+        params = [tuple(r[c] for c in REVIEW_FIELDS) + (r["id"],) for r in row_dicts]
+        with self._connect() as conn:
+            conn.executemany(REVIEW_SQL, params)
+
+    def _persist_delete(self, card_id: str):
+        """Delete a single card row"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cards WHERE id = ?", (card_id,))
+
+
+def migrate_json_to_sqlite(json_path: str, db_path: str) -> int:
+    """Copy every card from a JSON storage file into a SQLite database
+
+    Returns the number of migrated cards.
+    """
+    cards = Storage(json_path).load_cards()
+    SQLiteStorage(db_path).save_cards(cards)
+    return len(cards)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate a JSON card file to SQLite")
+    parser.add_argument("json_path", nargs="?", default="data/vocabulary_cards.json")
+    parser.add_argument("db_path", nargs="?", default="data/vocabulary_cards.db")
+    args = parser.parse_args()
+
+    count = migrate_json_to_sqlite(args.json_path, args.db_path)
+    print(f"Migrated {count} cards from {args.json_path} to {args.db_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,280 @@
 Data storage and persistence for vocabulary cards
 """
 
+import atexit
+import codecs
 import json
 import os
-import shutil
+import threading
+from contextlib import contextmanager, suppress
 from datetime import datetime
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from .spaced_repetition import Card
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locking between processes
+    fcntl = None
+
+from . import codec
+from .columnar import CardColumns, to_micros
+from .indexes import DeckStats, DueIndex, FrontIndex, RecencyIndex
+from .review_log import ReviewLog, review_records
+from .schedule_file import ScheduleFile
+from .search import SearchIndex
+from .spaced_repetition import SCHEDULE_FIELDS, Card
+from .tracing import traced
+
+DATETIME_FIELDS = ("created_at", "next_review", "last_reviewed")
+# Fields written by a review
+REVIEW_FIELDS = SCHEDULE_FIELDS + ("version",)
+
+
+class ConflictError(Exception):
+    """A card was stored by another session since the given copy was read"""
+
+
+class JournalCorruptError(Exception):
+    """A journal has an unreadable entry before its last line"""
+
+
+@contextmanager
+def file_lock(path: str):
+    """Hold an exclusive advisory lock on path (created if needed) across processes"""
+    with open(path, "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def card_to_dict(card: Card) -> dict:
+    """Convert a card to a JSON-serializable dict"""
+    card_dict = card.model_dump()
+    for field in DATETIME_FIELDS:
+        value = card_dict[field]
+        card_dict[field] = value.isoformat() if value else None
+    return card_dict
+
+
+def iter_json_array(f, chunk_size: int = 1 << 20) -> Iterator:
+    """Items of a JSON array in a binary file, decoded one at a time
+
+    Only the item being decoded and one chunk of the file are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer, pos = "", 0
+
+    def peek() -> str:
+        # The next character that is not whitespace ("" at the end of the file)
+        nonlocal buffer, pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            data = f.read(chunk_size)
+            if not data:
+                return ""
+            buffer, pos = text.decode(data), 0
+
+    if peek() != "[":
+        raise ValueError(f"{f.name}: not a JSON array")
+    pos += 1
+    while True:
+        char = peek()
+        if char == "]":
+            return
+        if char == ",":
+            pos += 1
+            continue
+        if not char:
+            raise ValueError(f"{f.name}: unterminated JSON array")
+        while True:
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError:
+                # The item continues in the next chunk
+                data = f.read(chunk_size)
+                if not data:
+                    raise
+                buffer, pos = buffer[pos:] + text.decode(data), 0
+        yield item
+
+
+def replay_stream(cards: Iterable[dict], events: Iterable[dict]) -> Iterator[dict]:
+    """Apply journal events to a stream of snapshot cards, like _replay_journal
+
+    Only the cards and reviews of the events are held in memory. A card the
+    journal adds (or deletes and adds again) comes after the snapshot's cards,
+    as it gets a new row when the journal is replayed into columns.
+    """
+    latest: Dict[str, Optional[dict]] = {}  # stored whole by the journal; None once deleted
+    reviews: Dict[str, dict] = {}  # schedule fields of the other cards the journal reviewed
+    appended: Dict[str, None] = {}  # cards that may get a new row, in row order
+    readded = set()
+    for event in events:
+        op = event["op"]
+        if op in ("add", "edit"):
+            card = event["card"]
+            card_id = card["id"]
+            if card_id in latest and latest[card_id] is None:
+                readded.add(card_id)
+                appended.pop(card_id, None)
+            if latest.get(card_id) is None and card_id not in reviews:
+                appended[card_id] = None
+            latest[card_id] = card
+            reviews.pop(card_id, None)
+        elif op == "review":
+            fields = {name: event.get(name) for name in REVIEW_FIELDS}
+            card_id = event["id"]
+            if latest.get(card_id) is not None:
+                latest[card_id] = {**latest[card_id], **fields}
+            elif card_id not in latest:
+                reviews.setdefault(card_id, {}).update(fields)
+        elif op == "delete":
+            latest[event["id"]] = None
+            reviews.pop(event["id"], None)
+
+    stored = set()
+    for card in cards:
+        card_id = card["id"]
+        if card_id in latest:
+            stored.add(card_id)
+            if latest[card_id] is not None and card_id not in readded:
+                yield latest[card_id]
+        elif card_id in reviews:
+            yield {**card, **reviews[card_id]}
+        else:
+            yield card
+    for card_id in appended:
+        if latest[card_id] is not None and (card_id not in stored or card_id in readded):
+            yield latest[card_id]
 
 
 class Storage:
-    """Handles persistence of vocabulary cards"""
+    """Handles persistence of vocabulary cards
+
+    Cards live in a JSON snapshot plus an append-only journal of the changes made
+    since the snapshot was written, so a write appends one line instead of
+    rewriting the deck. The journal is folded into the snapshot by compact().
+    Subclasses store the snapshot in other formats through _read_snapshot and
+    _write_snapshot (see create_storage).
+
+    The deck is cached in memory as CardColumns and reused until the backing files
+    change (detected through their signature) or a write goes through this
+    instance. Card objects are materialized on request, so changes to them are
+    only stored through update_card or record_review. Indexes over the cached
+    deck (such as due_index) are updated on every write.
+
+    Writes hold an advisory lock on a .lock file next to the data, so several
+    processes can share a deck: under the lock the cache is refreshed from
+    disk before it is changed. Every stored change increments the card's
+    version, and update_card/record_review raise ConflictError for a card
+    copy older than the stored one; modify_card retries such changes on the
+    latest version.
+
+    record_review(card, buffered=True) defers the write to the deck: the review
+    is applied to the cache and appended (with an fsync, unless sync=False) to
+    a .pending recovery journal that every reader replays. flush() writes the
+    pending reviews to the deck as one batch; it runs every flush_every
+    buffered reviews, flush_after seconds after the first one, and at
+    interpreter exit. The journal, .sched and .reviews files are named after
+    the deck's file without its extension (cards.journal); subclasses whose
+    deck can share that name with a JSON deck keep the extension instead.
+
+    Every write also updates a .sched file of fixed-width scheduling records
+    (see ScheduleFile), from which get_stats and count_due answer without
+    loading the deck while the cache is stale.
+
+    Reviews given a quality are also appended to review_log (see ReviewLog),
+    the history behind the review statistics.
+    """
+
+    # Backups kept by backup_now per period (None: backups.DEFAULT_RETENTION)
+    backup_retention: Optional[Dict[str, int]] = None
+
+    # Attempts of modify_card before giving up on a contended card
+    max_retries = 5
+
+    # Journal events that trigger a background compaction; never fewer than the
+    # number of cards, so rewriting the snapshot stays amortized O(1) per write
+    compact_every = 500
+
+    # Buffered reviews that trigger a flush, and the longest they stay buffered
+    flush_every = 20
+    flush_after = 5.0
 
     def __init__(self, file_path: str = "data/vocabulary_cards.json"):
         # Ensure data directory exists
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         self.file_path = file_path
-        self.backup_dir = "data/backups"
+        self.journal_path = self._sidecar_path(".journal")
+        self.pending_path = self._sidecar_path(".pending")
+        self.schedule = ScheduleFile(self._sidecar_path(".sched"))
+        self.review_log = ReviewLog(self._sidecar_path(".reviews"))
+        self._schedule_token: Optional[int] = None
+        # Next to the data, so every deck partition keeps its own backups
+        self.backup_dir = os.path.join(os.path.dirname(file_path), "backups")
         os.makedirs(self.backup_dir, exist_ok=True)
-        self._ensure_file_exists()
+        self._lock = threading.RLock()
+        self._columns: Optional[CardColumns] = None
+        # Incremented whenever the cached deck changes; usable as a cache key
+        self.generation = 0
+        self._cache_key = None
+        self._journal_events = 0
+        # (journal event, row) of the add/edit/delete events replayed on load
+        self._text_changes: List[Tuple[int, int]] = []
+        self._compacting = False
+        self._pending = 0
+        self._flush_timer: Optional[threading.Timer] = None
+        self._due_index = DueIndex()
+        self._stats = DeckStats()
+        self._search_index = SearchIndex(self._sidecar_path(".search"))
+        self._fronts = FrontIndex()
+        self._recency = {field: RecencyIndex(field) for field in ("created_at", "last_reviewed")}
+        self._indexes = [
+            self._due_index,
+            self._stats,
+            self._search_index,
+            self._fronts,
+            *self._recency.values(),
+        ]
+        self._lock_file = open(file_path + ".lock", "a")
+        self._lock_depth = 0
+        # Whether the held file lock is exclusive (the mode of the outermost _locked)
+        self._exclusive = False
+        with self._locked():
+            self._ensure_file_exists()
+        atexit.register(self.flush)
+
+    def _sidecar_path(self, suffix: str) -> str:
+        """Path of a file kept next to the deck, such as its journal"""
+        return os.path.splitext(self.file_path)[0] + suffix
+
+    @contextmanager
+    def _locked(self, shared: bool = False):
+        """Hold the instance lock and the file lock shared with other processes
+
+        Only the outermost call takes the file lock, so a nested call keeps the
+        mode of the enclosing one.
+        """
+        with self._lock:
+            if self._lock_depth == 0:
+                if fcntl:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                self._exclusive = not shared
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    self._exclusive = False
+                    if fcntl:
+                        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
 
     def _ensure_file_exists(self):
         """Create the storage file if it doesn't exist"""
@@ -28,78 +283,742 @@ class Storage:
             with open(self.file_path, "w") as f:
                 json.dump([], f)
 
+    @staticmethod
+    def _file_signature(path: str):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _signature(self):
+        """Identify the current on-disk version of the data"""
+        return (
+            self._file_signature(self.file_path),
+            self._file_signature(self.journal_path),
+            self._file_signature(self.pending_path),
+        )
+
+    @traced
+    def _read_columns(self) -> CardColumns:
+        """Read the snapshot and replay the journal on top of it"""
+        columns = self._read_snapshot()
+        self._replay_journal(columns)
+        self._replay_pending(columns)
+        return columns
+
+    def _read_snapshot(self) -> CardColumns:
+        """Decode the snapshot file"""
+        # Writes replace the snapshot atomically, so a decode error means real
+        # corruption and is raised rather than read as an empty deck
+        try:
+            with open(self.file_path, "rb") as f:
+                data = codec.loads(f.read())
+        except FileNotFoundError:
+            data = []
+        return CardColumns.from_dicts(data)
+
+    def _iter_snapshot(self, f) -> Iterator[dict]:
+        """Decode the cards of an open snapshot file one at a time"""
+        return iter_json_array(f)
+
+    def _write_snapshot(self, f, columns: CardColumns):
+        """Encode the deck into an open binary file"""
+        f.write(codec.dumps(columns.row_dicts(), indent=True))
+
+    @staticmethod
+    def _read_events(path: str) -> Iterator[dict]:
+        """Events of a journal file
+
+        A last line without its newline was torn by an interrupted append and
+        is skipped (the next append cuts it off). An unreadable line anywhere
+        else raises JournalCorruptError instead of dropping the events after it.
+        """
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return
+
+        with f:
+            for number, line in enumerate(f, 1):
+                if not line.endswith(b"\n"):
+                    return
+                try:
+                    event = codec.loads(line)
+                except json.JSONDecodeError:
+                    raise JournalCorruptError(f"{path}: unreadable entry on line {number}")
+                yield event
+
+    @staticmethod
+    def _append_lines(path: str, data: bytes, sync: bool = True):
+        """Append complete lines to a journal, cutting off a torn last line first
+
+        Callers hold the exclusive lock, so no reader sees the file while a
+        torn line is cut off.
+        """
+        with open(path, "a+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                f.seek(end - 1)
+                if f.read(1) != b"\n":
+                    # An interrupted append left a partial line; keep the
+                    # complete lines before it
+                    f.seek(0)
+                    f.truncate(f.read().rfind(b"\n") + 1)
+            f.write(data)
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+
+    def _replay_journal(self, columns: CardColumns):
+        """Apply journal events to the deck read from the snapshot"""
+        self._journal_events = 0
+        self._text_changes = []
+        for event in self._read_events(self.journal_path):
+            row = None
+            op = event["op"]
+            if op in ("add", "edit"):
+                row = columns.put_dict(event["card"])
+            elif op == "review":
+                columns.update_schedule(event["id"], event)
+            elif op == "delete":
+                row = columns.delete(event["id"])
+            if row is not None:
+                self._text_changes.append((self._journal_events, row))
+            self._journal_events += 1
+
+    def _pending_reviews(self) -> Dict[str, List[dict]]:
+        """Buffered review events by card"""
+        reviews: Dict[str, List[dict]] = {}
+        for event in self._read_events(self.pending_path):
+            reviews.setdefault(event["id"], []).append(event)
+        return reviews
+
+    @staticmethod
+    def _apply_pending(card: dict, reviews: Dict[str, List[dict]]) -> dict:
+        """A serialized card with its buffered reviews applied, like _replay_pending"""
+        for event in reviews.get(card["id"], ()):
+            if event["version"] > (card.get("version") or 0):
+                card = {**card, **{name: event.get(name) for name in REVIEW_FIELDS}}
+        return card
+
+    def _replay_pending(self, columns: CardColumns):
+        """Apply buffered reviews to the deck
+
+        A buffered review is skipped if the card was stored again since (it is
+        then already part of the newer version) or deleted.
+        """
+        self._pending = 0
+        for event in self._read_events(self.pending_path):
+            self._pending += 1
+            row = columns.row_of(event["id"])
+            if row is not None and event["version"] > columns.version[row]:
+                columns.update_schedule(event["id"], event)
+
+    @traced
+    def _append_journal(self, *events: dict):
+        """Durably append events to the journal with a single fsync"""
+        self._append_lines(
+            self.journal_path, b"".join(codec.dumps(event) + b"\n" for event in events)
+        )
+        self._journal_events += len(events)
+        threshold = max(self.compact_every, len(self._columns or ()))
+        if self._journal_events >= threshold and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    @traced
+    def _write_columns(self, columns: CardColumns):
+        """Atomically replace the snapshot and clear the journal"""
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            self._write_snapshot(f, columns)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.file_path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_events = 0
+
+    def _persist_add(self, card: Card):
+        """Persist a newly added card (the cached deck already contains it)"""
+        self._append_journal({"op": "add", "card": card_to_dict(card)})
+
+    def _persist_adds(self, cards: List[Card]):
+        """Persist a batch of newly added cards in one write"""
+        self._append_journal(*({"op": "add", "card": card_to_dict(card)} for card in cards))
+
+    def _persist_update(self, card: Card):
+        """Persist an edited card (the cached deck already contains it)"""
+        self._append_journal({"op": "edit", "card": card_to_dict(card)})
+
+    def _persist_review(self, card: Card):
+        """Persist the scheduling fields of a reviewed card"""
+        card_dict = card_to_dict(card)
+        self._append_journal(
+            {"op": "review", "id": card.id, **{k: card_dict[k] for k in REVIEW_FIELDS}}
+        )
+
+    def _persist_pending(self, events: List[dict]):
+        """Durably store buffered review events in one write"""
+        self._append_journal(*events)
+
+    def _persist_schedules(self, rows: np.ndarray):
+        """Persist scheduling changes to many rows (rewrites the snapshot once)"""
+        self._write_columns(self._columns)
+
+    def _persist_delete(self, card_id: str):
+        """Persist a card deletion (the cached deck no longer contains it)"""
+        self._append_journal({"op": "delete", "id": card_id})
+
+    def _cached_columns(self) -> CardColumns:
+        """Return the cached deck, reloading it if the data changed on disk"""
+        with self._lock:
+            key = self._signature()
+            if self._columns is None or key != self._cache_key:
+                with self._locked(shared=True):
+                    self._set_columns(self._read_columns())
+                    self._search_index.origin = self._search_origin()
+                    self._stored()
+                if self._schedule_token is None and self._lock_depth == 0:
+                    # The .sched file is stale, and is only rewritten under the
+                    # exclusive lock
+                    with self._locked():
+                        if self._current():
+                            self._stored()
+            return self._columns
+
+    def _search_origin(self):
+        """Where the rows of a fresh load come from, for reusing a stored search index
+
+        Rows number from the snapshot, with the journal replayed on top of it.
+        """
+        return self._file_signature(self.file_path), self._journal_events, self._text_changes
+
+    def _stored(self, rows: Optional[Iterable[int]] = None):
+        """Mark the cache as current after a load or write, and update the .sched file
+
+        rows are the rows a write changed (new rows are always included); None
+        means the whole deck was loaded or replaced. The .sched file is only
+        written under the exclusive lock; otherwise a stale one is left alone
+        (and _schedule_token is None).
+        """
+        self._cache_key = self._signature()
+        try:
+            if rows is None or not self.schedule.update(
+                self._columns, rows, self._cache_key, self._schedule_token
+            ):
+                self._schedule_token = self.schedule.sync(
+                    self._columns, self._cache_key, write=self._exclusive
+                )
+        except OSError:
+            # The file only speeds up reads; a stale one is ignored
+            self._schedule_token = None
+
+    def _current(self) -> bool:
+        """Whether the cached deck matches the files"""
+        return self._columns is not None and self._signature() == self._cache_key
+
+    @traced
+    def _set_columns(self, columns: CardColumns):
+        """Replace the cached deck and rebuild the indexes"""
+        self._columns = columns
+        self.generation += 1
+        for index in self._indexes:
+            index.rebuild(columns)
+
+    def _put(self, card: Card, columns: Optional[CardColumns] = None):
+        """Write a card into the cached deck, keeping the indexes in sync"""
+        if columns is None:
+            columns = self._cached_columns()
+        row = columns.row_of(card.id)
+        if row is not None:
+            card.version = int(columns.version[row]) + 1
+            for index in self._indexes:
+                index.remove(row)
+        row = columns.put(card)
+        self.generation += 1
+        for index in self._indexes:
+            index.add(row)
+
+    @property
+    def columns(self) -> CardColumns:
+        """The cached deck in columnar form (read-only for callers)"""
+        return self._cached_columns()
+
+    def copy_columns(self) -> CardColumns:
+        """A copy of the current deck, for reading on another thread while it changes"""
+        with self._lock:
+            return self._cached_columns().copy()
+
+    @traced
+    def read_columns(self) -> CardColumns:
+        """The deck for a one-pass read, such as counting the cards of an export
+
+        The cached deck if it is current; otherwise the deck is read from disk
+        without replacing the cache, rebuilding indexes or touching the .sched
+        file.
+        """
+        with self._lock:
+            if self._current():
+                return self._columns
+            with self._locked(shared=True):
+                return self._read_columns()
+
+    def iter_card_dicts(self) -> Iterator[dict]:
+        """Serialized cards in deck order, streamed from the files
+
+        Unlike read_columns this never holds the deck in memory: the snapshot is
+        decoded a card at a time, with the changes of the journal and of the
+        buffered reviews (both kept small by flushing and compaction) applied on
+        the way. The files are opened under the lock, so the cards are those of
+        one version of the deck even if it is written meanwhile.
+        """
+        with self._locked(shared=True):
+            try:
+                snapshot = open(self.file_path, "rb")
+            except FileNotFoundError:
+                snapshot = None
+            events = list(self._read_events(self.journal_path))
+            reviews = self._pending_reviews()
+        if snapshot is None:
+            cards = iter(())
+        else:
+            cards = self._iter_snapshot(snapshot)
+        try:
+            for card in replay_stream(cards, events):
+                yield self._apply_pending(card, reviews)
+        finally:
+            if snapshot is not None:
+                snapshot.close()
+
+    @property
+    def due_index(self) -> DueIndex:
+        """Cards ordered by next review time"""
+        with self._lock:
+            self._cached_columns()
+            return self._due_index
+
+    @traced
+    def get_due_cards(
+        self,
+        now: Optional[datetime] = None,
+        category: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Card]:
+        """Get the cards due for review (optionally of one category), most overdue first"""
+        with self._lock:
+            columns = self._cached_columns()
+            rows = self._due_index.due_rows(now)
+            if category is not None:
+                category_id = columns.strings.find(category)
+                rows = [row for row in rows if columns.category[row] == category_id]
+            return columns.cards(rows[:limit])
+
+    @traced
+    def recent(self, field: str, k: int) -> List[Card]:
+        """Get the k cards with the latest created_at or last_reviewed, newest first
+
+        Cards never reviewed are left out of last_reviewed.
+        """
+        if field not in self._recency:
+            raise ValueError(f"No recency index for {field}")
+        with self._lock:
+            columns = self._cached_columns()
+            return columns.cards(self._recency[field].latest(k))
+
+    def invalidate_cache(self):
+        """Force the next read to reload cards from disk"""
+        with self._lock:
+            self._columns = None
+            self._cache_key = None
+
+    @traced
+    def compact(self):
+        """Fold the journal into the snapshot"""
+        with self._locked():
+            try:
+                columns = self._cached_columns()
+                if self._journal_events:
+                    self._write_columns(columns)
+                    self._stored()
+            finally:
+                self._compacting = False
+
+    @traced
+    def get_stats(self, verify: bool = False) -> dict:
+        """Get learning statistics from the maintained counters
+
+        With verify=True the stats are recomputed from the columns, and the
+        counters are rebuilt if they have drifted.
+        """
+        with self._lock:
+            if not verify:
+                stats = self._from_schedule(self.schedule.stats)
+                if stats is not None:
+                    return stats
+            columns = self._cached_columns()
+            now = datetime.now()
+            stats = self._stats.as_dict(self._due_index.count_due_before(now))
+            if verify:
+                expected = columns.stats(now)
+                if expected != stats:
+                    self._stats.rebuild(columns)
+                    self._due_index.rebuild(columns)
+                    stats = expected
+            return stats
+
+    def count_due(self, now: Optional[datetime] = None) -> int:
+        """Number of cards due at now"""
+        with self._lock:
+            count = self._from_schedule(self.schedule.count_due, now)
+            if count is None:
+                self._cached_columns()
+                count = self._due_index.count_due_before(now)
+            return count
+
+    def _from_schedule(self, query: Callable, *args):
+        """Answer query from the .sched file if the cache is stale and the file is current"""
+        if self._current():
+            return None
+        try:
+            with self._locked(shared=True):
+                return query(self._signature(), *args)
+        except (OSError, ValueError):
+            return None
+
+    def category_counts(self) -> Dict[str, int]:
+        """Number of cards per category"""
+        with self._lock:
+            self._cached_columns()
+            return dict(self._stats.categories)
+
+    @traced
+    def search(
+        self, query: str, category: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[str]:
+        """IDs of the cards matching query (optionally in one category), best first"""
+        with self._lock:
+            columns = self._cached_columns()
+            rows = self._search_index.search(query, category, limit)
+            return [columns.id_of(row) for row in rows]
+
+    def has_front(self, front: str) -> bool:
+        """Whether a card with this front exists, ignoring case and spacing"""
+        with self._lock:
+            self._cached_columns()
+            return front in self._fronts
+
+    @traced
     def load_cards(self) -> List[Card]:
         """Load all cards from storage"""
-        try:
-            with open(self.file_path, "r") as f:
-                data = json.load(f)
-                cards = []
-                for item in data:
-                    # Parse datetime fields
-                    if "created_at" in item:
-                        item["created_at"] = datetime.fromisoformat(item["created_at"])
-                    if "next_review" in item:
-                        item["next_review"] = datetime.fromisoformat(item["next_review"])
-                    if "last_reviewed" in item and item["last_reviewed"]:
-                        item["last_reviewed"] = datetime.fromisoformat(item["last_reviewed"])
-                    cards.append(Card(**item))
-                return cards
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+        return self._cached_columns().cards()
 
+    @traced
     def save_cards(self, cards: List[Card]):
         """Save all cards to storage"""
-        with open(self.file_path, "w") as f:
-            # Convert cards to dicts with serialized datetimes
-            data = []
-            for card in cards:
-                card_dict = card.model_dump()
-                card_dict["created_at"] = card.created_at.isoformat()
-                card_dict["next_review"] = card.next_review.isoformat()
-                if card.last_reviewed:
-                    card_dict["last_reviewed"] = card.last_reviewed.isoformat()
-                else:
-                    card_dict["last_reviewed"] = None
-                data.append(card_dict)
-            json.dump(data, f, indent=2)
+        self._replace_columns(CardColumns.from_cards(cards))
 
+    def _replace_columns(self, columns: CardColumns):
+        """Replace the whole deck, on disk and in the cache"""
+        with self._locked():
+            self._write_columns(columns)
+            # Buffered reviews belong to the replaced deck
+            if os.path.exists(self.pending_path):
+                os.remove(self.pending_path)
+            self._pending = 0
+            self._set_columns(columns)
+            self._stored()
+
+    @traced
     def add_card(self, card: Card):
         """Add a new card"""
-        cards = self.load_cards()
-        cards.append(card)
-        self.save_cards(cards)
+        with self._locked():
+            self._put(card)
+            self._persist_add(card)
+            self._stored([self._columns.row_of(card.id)])
+
+    @traced
+    def add_cards(self, cards: Iterable[Card]) -> int:
+        """Add many cards with a single write; returns the number added"""
+        cards = list(cards)
+        if not cards:
+            return 0
+        with self._locked():
+            columns = self._cached_columns()
+            for card in cards:
+                self._put(card, columns)
+            self._persist_adds(cards)
+            self._stored([columns.row_of(card.id) for card in cards])
+        return len(cards)
+
+    def _check_version(self, card: Card) -> bool:
+        """Whether the card exists; raises ConflictError if card is an outdated copy"""
+        columns = self._cached_columns()
+        row = columns.row_of(card.id)
+        if row is None:
+            return False
+        if card.version != columns.version[row]:
+            raise ConflictError(f"Card {card.id} was changed by another session")
+        return True
 
+    @traced
     def update_card(self, updated_card: Card):
-        """Update an existing card"""
-        cards = self.load_cards()
-        for i, card in enumerate(cards):
-            if card.id == updated_card.id:
-                cards[i] = updated_card
-                break
-        self.save_cards(cards)
+        """Update an existing card (its version is incremented)"""
+        with self._locked():
+            if not self._check_version(updated_card):
+                return
+            self._put(updated_card)
+            self._persist_update(updated_card)
+            self._stored([self._columns.row_of(updated_card.id)])
+
+    @traced
+    def record_review(
+        self,
+        reviewed_card: Card,
+        buffered: bool = False,
+        quality: Optional[int] = None,
+        sync: bool = True,
+    ):
+        """Update a card after a review, persisting only its scheduling fields
+
+        With buffered=True the review goes to the recovery journal and is
+        stored by the next flush(). The journal line (and the review_log
+        record) is fsynced unless sync=False, for callers that call flush()
+        themselves before reporting the review as saved (the API does so once
+        per batch). With the quality the card was rated, the review is also
+        appended to review_log.
+        """
+        with self._locked():
+            if not self._check_version(reviewed_card):
+                return
+            columns = self._columns
+            row = columns.row_of(reviewed_card.id)
+            previous = (columns.ease_factor[row], columns.interval[row], columns.repetitions[row])
+            self._put(reviewed_card)
+            if buffered:
+                self._buffer_review(reviewed_card, sync)
+            else:
+                self._persist_review(reviewed_card)
+            if quality is not None:
+                self._log_review(reviewed_card, quality, *previous, sync=sync)
+            self._stored([row])
+        if buffered:
+            if self._pending >= self.flush_every:
+                self.flush()
+            else:
+                self._schedule_flush()
+
+    def _log_review(
+        self,
+        card: Card,
+        quality: int,
+        ease_factor: float,
+        interval: int,
+        repetitions: int,
+        sync: bool = True,
+    ):
+        """Append a review, and the schedule it replaced, to the review log"""
+        self.review_log.append(
+            review_records(
+                [card.id],
+                [card.category],
+                to_micros(card.last_reviewed),
+                quality,
+                ease_factor,
+                card.ease_factor,
+                interval,
+                card.interval,
+                repetitions,
+            ),
+            sync,
+        )
+
+    def _buffer_review(self, card: Card, sync: bool = True):
+        """Append a review to the recovery journal"""
+        card_dict = card_to_dict(card)
+        event = {"op": "review", "id": card.id, **{k: card_dict[k] for k in REVIEW_FIELDS}}
+        self._append_lines(self.pending_path, codec.dumps(event) + b"\n", sync)
+        self._pending += 1
+
+    def _schedule_flush(self):
+        """Flush flush_after seconds from now, unless a flush is already scheduled"""
+        with self._lock:
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_after, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    @traced
+    def flush(self):
+        """Durably store the buffered reviews (of every process) as one batch"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            # Ratings logged with sync=False
+            self.review_log.sync()
+        if not os.path.exists(self.pending_path):
+            return
+        with self._locked():
+            # Another flusher may have stored the batch while this one waited
+            if not os.path.exists(self.pending_path):
+                return
+            columns = self._cached_columns()
+            events = []
+            for event in self._read_events(self.pending_path):
+                row = columns.row_of(event["id"])
+                # Only the reviews still current in the refreshed deck
+                if row is not None and event["version"] == columns.version[row]:
+                    events.append(event)
+            if events:
+                self._persist_pending(events)
+            with suppress(FileNotFoundError):
+                os.remove(self.pending_path)
+            self._pending = 0
+            self._stored([])
+
+    @traced
+    def update_schedules(self, change: Callable[[CardColumns], tuple]) -> int:
+        """Overwrite scheduling columns of many cards at once
 
+        change is called with the current deck under the write lock, so the
+        rows it selects and the values it computes cannot be overtaken by other
+        writers. It returns (rows, values): values maps names from
+        SCHEDULE_FIELDS to arrays aligned with rows (or scalars), with
+        timestamps in epoch microseconds as stored in CardColumns, and may
+        hold "reviews", review_log records of the ratings behind the change.
+        The indexes are rebuilt and the change is persisted in a single write.
+        Returns the number of changed rows.
+        """
+        with self._locked():
+            columns = self._cached_columns()
+            rows, values = change(columns)
+            rows = np.asarray(rows, dtype=np.intp)
+            reviews = values.pop("reviews", None)
+            for name in values:
+                if name not in SCHEDULE_FIELDS:
+                    raise ValueError(f"Not a scheduling field: {name}")
+            if not len(rows):
+                return 0
+            for name, value in values.items():
+                getattr(columns, name)[rows] = value
+            columns.version[rows] += 1
+            self.generation += 1
+            for index in self._indexes:
+                index.rebuild(columns)
+            self._persist_schedules(rows)
+            if reviews is not None:
+                self.review_log.append(reviews)
+            self._stored(rows)
+            return len(rows)
+
+    @traced
     def delete_card(self, card_id: str):
         """Delete a card"""
-        cards = self.load_cards()
-        cards = [c for c in cards if c.id != card_id]
-        self.save_cards(cards)
+        with self._locked():
+            columns = self._cached_columns()
+            row = columns.row_of(card_id)
+            if row is None:
+                return
+            for index in self._indexes:
+                index.remove(row)
+            columns.delete(card_id)
+            self.generation += 1
+            self._persist_delete(card_id)
+            self._stored([row])
+
+    def modify_card(
+        self,
+        card_id: str,
+        change: Callable[[Card], object],
+        review: bool = False,
+        buffered: bool = False,
+        quality: Optional[int] = None,
+        sync: bool = True,
+    ) -> Optional[Card]:
+        """Apply change to the latest version of a card and store it
+
+        change edits the Card it is given in place. If the card is stored by
+        another session in between, the change is applied again to the newer
+        version. With review=True only the scheduling fields are persisted, as
+        with record_review (buffered, quality and sync are passed on to it). Returns
+        the stored card, or None if it does not exist.
+        """
+        for _ in range(self.max_retries):
+            card = self.get_card_by_id(card_id)
+            if card is None:
+                return None
+            change(card)
+            try:
+                if review:
+                    self.record_review(card, buffered, quality, sync)
+                else:
+                    self.update_card(card)
+                return card
+            except ConflictError:
+                continue
+        raise ConflictError(f"Card {card_id} kept changing; gave up after {self.max_retries} tries")
 
+    @traced
     def get_card_by_id(self, card_id: str) -> Optional[Card]:
         """Get a card by its ID"""
-        cards = self.load_cards()
-        for card in cards:
-            if card.id == card_id:
-                return card
-        return None
+        with self._lock:
+            columns = self._cached_columns()
+            row = columns.row_of(card_id)
+            return None if row is None else columns.card(row)
 
-    def backup_now(self) -> str:
-        """Create a backup of the current data file"""
-        if not os.path.exists(self.file_path):
+    def get_cards(self, card_ids: Iterable[str]) -> List[Card]:
+        """Get the cards with the given IDs, skipping unknown ones"""
+        columns = self._cached_columns()
+        rows = (columns.row_of(card_id) for card_id in card_ids)
+        return columns.cards(row for row in rows if row is not None)
+
+    @traced
+    def backup_now(self) -> Optional[str]:
+        """Compact the journal, back up the deck incrementally and prune old backups
+
+        Returns the path of the backup manifest, or None for an empty deck. This
+        blocks; the sidebar runs it in the background with backups.start_backup.
+        Only copying the columns holds the lock; cards are serialized after it.
+        """
+        from .backups import backup_store
+
+        with self._locked():
+            self.compact()
+            columns = self._cached_columns().copy()
+        cards = columns.row_dicts()
+        if not cards:
             return None
+        store = backup_store(self)
+        path = store.create(cards)
+        store.prune()
+        return path
+
+    def restore_backup(self, at: Optional[datetime] = None) -> dict:
+        """Replace the deck with the latest backup taken at or before at
+
+        Returns the manifest of the restored backup.
+        """
+        from .backups import backup_store
+
+        store = backup_store(self)
+        manifest = store.find(at)
+        if manifest is None:
+            raise ValueError("No backup to restore")
+        self._replace_columns(CardColumns.from_dicts(store.read(manifest)))
+        return manifest
+
+
+def create_storage(file_path: str = "data/vocabulary_cards.json") -> Storage:
+    """Create the storage backend matching the file extension"""
+    extension = os.path.splitext(file_path)[1]
+    if extension in (".db", ".sqlite", ".sqlite3"):
+        from .sqlite_storage import SQLiteStorage
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_filename = f"vocabulary_cards_backup_{timestamp}.json"
-        backup_path = os.path.join(self.backup_dir, backup_filename)
+        return SQLiteStorage(file_path)
+    if extension == ".npz":
+        from .binary_storage import BinaryStorage
 
-        shutil.copy2(self.file_path, backup_path)
-        return backup_path
+        return BinaryStorage(file_path)
+    return Storage(file_path)
@@ -0,0 +1,195 @@
+"""
+Lightweight timing spans for the hot paths
+
+Functions decorated with @traced and blocks wrapped in span() record their
+duration into the trace of the current thread, if one was started with
+start_trace(). Until tracing is enabled (FLIPZY_TRACE=1 or the debug panel),
+a decorated function costs one global flag check per call.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, List, Optional
+
+import numpy as np
+
+# Traces and per-span durations kept per session
+MAX_TRACES = 100
+MAX_SAMPLES = 1000
+
+_enabled = os.environ.get("FLIPZY_TRACE", "") == "1"
+
+
+class _Local(threading.local):
+    # The trace being recorded by the thread
+    trace: Optional["Trace"] = None
+
+
+_local = _Local()
+
+
+class Span:
+    """One timed call: offset from the start of its trace, duration and nesting depth"""
+
+    __slots__ = ("name", "start", "duration", "depth")
+
+    def __init__(self, name: str, start: float, duration: float, depth: int):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.depth = depth
+
+
+class Trace:
+    """Spans recorded during one app rerun (times in seconds)"""
+
+    def __init__(self, name: str = "rerun"):
+        self.name = name
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.spans: List[Span] = []
+        self._start = time.perf_counter()
+        self._depth = 0
+
+    def ordered(self) -> List[Span]:
+        """Spans in call order (they are recorded as they finish)"""
+        return sorted(self.spans, key=lambda span: (span.start, span.depth))
+
+
+def enable(enabled: bool = True):
+    """Turn span recording on or off for the whole process"""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def start_trace(name: str = "rerun") -> Trace:
+    """Start recording the spans of this thread"""
+    trace = _local.trace = Trace(name)
+    return trace
+
+
+def finish_trace() -> Optional[Trace]:
+    """Stop recording the spans of this thread and return them"""
+    trace = _local.trace
+    _local.trace = None
+    if trace is not None:
+        trace.duration = time.perf_counter() - trace._start
+    return trace
+
+
+def _record(trace: Trace, name: str, func: Callable, *args, **kwargs):
+    depth = trace._depth
+    trace._depth += 1
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        end = time.perf_counter()
+        trace._depth = depth
+        trace.spans.append(Span(name, start - trace._start, end - start, depth))
+
+
+def traced(func: Callable) -> Callable:
+    """Record a span named after the function for every call"""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        trace = _local.trace
+        if trace is None:
+            return func(*args, **kwargs)
+        return _record(trace, name, func, *args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def span(name: str):
+    """Record a span for a block of code"""
+    trace = _local.trace if _enabled else None
+    if trace is None:
+        yield
+        return
+    depth = trace._depth
+    trace._depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        trace._depth = depth
+        trace.spans.append(Span(name, start - trace._start, end - start, depth))
+
+
+class SpanStats:
+    """Recent traces of a session and the durations of each span name"""
+
+    def __init__(self):
+        self.traces: Deque[Trace] = deque(maxlen=MAX_TRACES)
+        self.samples: Dict[str, Deque[float]] = {}
+
+    def record(self, trace: Trace):
+        self.traces.append(trace)
+        self._sample(trace.name, trace.duration)
+        for s in trace.spans:
+            self._sample(s.name, s.duration)
+
+    def _sample(self, name: str, duration: float):
+        if name not in self.samples:
+            self.samples[name] = deque(maxlen=MAX_SAMPLES)
+        self.samples[name].append(duration)
+
+    def summary(self) -> List[dict]:
+        """count, p50 and p95 (ms) per span name, slowest p95 first"""
+        rows = []
+        for name, samples in self.samples.items():
+            p50, p95 = np.percentile(np.fromiter(samples, dtype=float), [50, 95]) * 1000
+            rows.append({"span": name, "count": len(samples), "p50_ms": p50, "p95_ms": p95})
+        return sorted(rows, key=lambda row: row["p95_ms"], reverse=True)
+
+    def to_prometheus(self) -> str:
+        """Span durations as a Prometheus summary, in the text exposition format"""
+        lines = [
+            "# HELP flipzy_span_duration_seconds Duration of instrumented calls",
+            "# TYPE flipzy_span_duration_seconds summary",
+        ]
+        for name, samples in sorted(self.samples.items()):
+            values = np.fromiter(samples, dtype=float)
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            for quantile in (0.5, 0.95):
+                lines.append(
+                    f'flipzy_span_duration_seconds{{span="{label}",quantile="{quantile}"}} '
+                    f"{np.quantile(values, quantile):.6f}"
+                )
+            lines.append(f'flipzy_span_duration_seconds_sum{{span="{label}"}} {values.sum():.6f}')
+            lines.append(f'flipzy_span_duration_seconds_count{{span="{label}"}} {len(values)}')
+        return "\n".join(lines) + "\n"
+
+    def to_jsonl(self) -> str:
+        """One JSON line per span of every kept trace"""
+        lines = []
+        for number, trace in enumerate(self.traces):
+            for s in [Span(trace.name, 0.0, trace.duration, -1)] + trace.ordered():
+                lines.append(
+                    json.dumps(
+                        {
+                            "trace": number,
+                            "name": s.name,
+                            "start": trace.started_at + s.start,
+                            "duration_ms": s.duration * 1000,
+                            "depth": s.depth + 1,
+                        }
+                    )
+                )
+        return "".join(line + "\n" for line in lines)
@@ -0,0 +1,34 @@
+"""
+Shared fixtures: decks on every storage backend
+"""
+
+import uuid
+from typing import List
+
+import pytest
+
+from src.spaced_repetition import Card
+from src.storage import create_storage
+
+# One deck file per backend: JSON snapshot + journal, SQLite, binary .npz
+BACKENDS = ["cards.json", "cards.db", "cards.npz"]
+
+
+def make_cards(count: int, category: str = "vocabulary") -> List[Card]:
+    return [
+        Card(id=str(uuid.uuid4()), front=f"word {i}", back=f"meaning {i}", category=category)
+        for i in range(count)
+    ]
+
+
+@pytest.fixture(params=BACKENDS)
+def deck_path(tmp_path, request) -> str:
+    return str(tmp_path / request.param)
+
+
+@pytest.fixture
+def storage(deck_path):
+    """A deck of 20 cards"""
+    storage = create_storage(deck_path)
+    storage.add_cards(make_cards(20))
+    return storage
@@ -0,0 +1,109 @@
+"""
+HTTP API: requests it rejects with 400, and the batch and import paths
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from src.api import InProcessClient, ReviewAPI
+from src.storage import create_storage
+from tests.conftest import make_cards
+
+
+@pytest.fixture
+def deck(tmp_path):
+    storage = create_storage(str(tmp_path / "cards.json"))
+    storage.add_cards(make_cards(5))
+    return storage
+
+
+def call(storage, method: str, target: str, payload=None, data: bytes = b""):
+    async def run():
+        async with InProcessClient(storage) as client:
+            if method == "GET":
+                return await client.get(target)
+            return await client.post(target, payload, data)
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "method, target, payload, data",
+    [
+        ("GET", "/due?limit=-1", None, b""),
+        ("GET", "/due?limit=two", None, b""),
+        ("GET", "/search?q=word&limit=-5", None, b""),
+        ("POST", "/reviews", None, b"{not json"),
+        ("POST", "/reviews", {"id": "x", "quality": True}, b""),
+        ("POST", "/reviews", {"id": "x", "quality": 6}, b""),
+        ("POST", "/reviews", {"id": "x", "quality": 2.5}, b""),
+        ("POST", "/reviews", {"quality": 3}, b""),
+        ("POST", "/reviews/batch", {"reviews": {"id": "x"}}, b""),
+        ("POST", "/reviews/batch", {"reviews": [{"id": "x", "quality": False}]}, b""),
+        ("POST", "/cards", ["front", "back"], b""),
+        ("POST", "/cards", {"front": 1, "back": "meaning"}, b""),
+        ("POST", "/cards", {"front": " ", "back": "meaning"}, b""),
+        ("POST", "/import?format=xlsx", None, b"a,b\n"),
+        ("POST", "/import?format=csv", None, b"\xff\xfe,b\n"),
+        ("POST", "/import?format=csv", None, b'"' + b"a" * 200_000 + b'",b\n'),
+    ],
+)
+def test_bad_requests(deck, method, target, payload, data):
+    status, body = call(deck, method, target, payload, data)
+    assert status == 400, body
+    assert body["error"]
+
+
+def test_due_limit(deck):
+    assert len(call(deck, "GET", "/due?limit=2")[1]["cards"]) == 2
+    assert call(deck, "GET", "/due?limit=0")[1]["cards"] == []
+
+
+def test_batch_reports_unknown_cards(deck):
+    card_id = deck.load_cards()[0].id
+    reviews = [{"id": card_id, "quality": 4}, {"id": "missing", "quality": 4}]
+
+    status, body = call(deck, "POST", "/reviews/batch", {"reviews": reviews})
+
+    assert status == 200
+    assert body["cards"][0]["id"] == card_id and body["cards"][1] is None
+    assert body["errors"] == [{"index": 1, "error": "not found"}]
+    assert create_storage(deck.file_path).get_card_by_id(card_id).repetitions == 1
+
+
+def test_import_row_errors_are_reported(deck):
+    lines = [{"front": "apple", "back": "a fruit"}, {"front": 1, "back": "x"}, [1]]
+    data = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+
+    status, body = call(deck, "POST", "/import?format=jsonl", data=data)
+
+    assert status == 200
+    assert body["added"] == 1
+    assert [line_no for line_no, _ in body["errors"]] == [2, 3]
+
+
+@pytest.mark.parametrize("length", ["-3", "ten"])
+def test_invalid_content_length_closes_the_connection(deck, length):
+    async def run():
+        api = ReviewAPI(deck)
+        await api.start()
+        server = await asyncio.start_server(api.handle_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"POST /reviews HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode())
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+        finally:
+            server.close()
+            await server.wait_closed()
+            await api.close()
+
+    head, _, body = asyncio.run(run()).partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 400")
+    assert b"Connection: close" in head
+    assert json.loads(body) == {"error": "Invalid Content-Length"}
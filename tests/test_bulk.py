@@ -0,0 +1,70 @@
+"""
+Bulk scheduling: the vectorized SM-2 matches rating cards one at a time
+"""
+
+import itertools
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from src.bulk import replay_history
+from src.spaced_repetition import Card, SpacedRepetition
+from src.storage import create_storage
+from tests.conftest import make_cards
+
+
+def test_batch_matches_calculate_next_review():
+    grid = list(
+        itertools.product([1.3, 1.7, 2.36, 2.5, 2.8], [1, 6, 15, 37], [0, 1, 2, 7], range(6))
+    )
+    ease, interval, repetitions = SpacedRepetition.calculate_next_review_batch(*zip(*grid))
+
+    for i, (ease_factor, ivl, reps, quality) in enumerate(grid):
+        card = Card(
+            id="x",
+            front="f",
+            back="b",
+            ease_factor=ease_factor,
+            interval=ivl,
+            repetitions=reps,
+        )
+        SpacedRepetition.calculate_next_review(card, quality)
+        assert (ease[i], interval[i], repetitions[i]) == (
+            card.ease_factor,
+            card.interval,
+            card.repetitions,
+        )
+
+
+def test_replay_history_matches_rating_each_card(deck_path):
+    storage = create_storage(deck_path)
+    storage.add_cards(make_cards(30))
+    cards = {card.id: card for card in storage.load_cards()}
+    rng = random.Random(7)
+    start = datetime(2026, 1, 1, 9)
+    events = [
+        (card_id, rng.randrange(6), start + timedelta(days=day, minutes=rng.randrange(600)))
+        for card_id in list(cards)[:25]
+        for day in sorted(rng.sample(range(120), rng.randrange(1, 12)))
+    ]
+    events.append(("unknown", 5, start))
+
+    assert replay_history(storage, rng.sample(events, len(events))) == len(events) - 1
+
+    expected = {card_id: card.model_copy() for card_id, card in cards.items()}
+    for card_id, quality, reviewed_at in sorted(events[:-1], key=lambda event: event[2]):
+        card = expected[card_id]
+        SpacedRepetition.calculate_next_review(card, quality)
+        card.last_reviewed = reviewed_at
+        card.next_review = reviewed_at + timedelta(days=card.interval)
+
+    fields = ("ease_factor", "interval", "repetitions", "next_review", "last_reviewed")
+    for card in create_storage(deck_path).load_cards():
+        assert [getattr(card, name) for name in fields] == [
+            getattr(expected[card.id], name) for name in fields
+        ]
+
+    records = storage.review_log.records()
+    assert len(records) == len(events) - 1
+    assert np.array_equal(np.sort(records["quality"]), np.sort([e[1] for e in events[:-1]]))
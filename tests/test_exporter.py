@@ -0,0 +1,80 @@
+"""
+Export: streamed from the storage files, without loading the deck
+"""
+
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.columnar import CardColumns
+from src.exporter import CHUNK_ROWS, count_cards, export_file, export_text
+from src.storage import create_storage
+from tests.conftest import make_cards
+from tests.test_storage import rate
+
+
+def changed_deck(deck_path):
+    """A deck with cards in the snapshot, the journal and the buffered reviews"""
+    storage = create_storage(deck_path)
+    storage.add_cards(make_cards(30))
+    storage.compact()
+    cards = storage.load_cards()
+    cards[0].front = "renamed"
+    storage.update_card(cards[0])
+    storage.delete_card(cards[1].id)
+    storage.delete_card(cards[2].id)
+    storage.add_card(cards[2])
+    storage.add_cards(make_cards(5, category="idiom"))
+    rate(storage, cards[3].id)
+    rate(storage, cards[4].id, quality=5, buffered=True)
+    return create_storage(deck_path)
+
+
+def test_cards_are_consumed_a_chunk_at_a_time():
+    pulled = 0
+
+    def cards():
+        nonlocal pulled
+        for card in make_cards(3 * CHUNK_ROWS):
+            pulled += 1
+            yield {"id": card.id, "front": card.front, "back": card.back}
+
+    pieces = export_text(cards(), "jsonl")
+    first = next(pieces)
+    assert first.count("\n") == CHUNK_ROWS
+    assert pulled <= CHUNK_ROWS + 1
+    assert sum(piece.count("\n") for piece in pieces) == 2 * CHUNK_ROWS
+
+
+def test_export_file_never_builds_columns(deck_path, tmp_path, monkeypatch):
+    storage = changed_deck(deck_path)
+    expected = [json.dumps(card) for card in storage.read_columns().row_dicts()]
+    storage = create_storage(deck_path)
+
+    def no_columns(*args, **kwargs):
+        raise AssertionError("the export loaded the deck")
+
+    monkeypatch.setattr(CardColumns, "__init__", no_columns)
+    path = str(tmp_path / "cards.jsonl.gz")
+    assert export_file(storage, path) == len(expected)
+    with gzip.open(path, "rt") as f:
+        assert f.read().splitlines() == expected
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {"category": "idiom"},
+        {"category": "missing"},
+        {"mastered": False},
+        {"due_before": datetime.now() + timedelta(days=3)},
+    ],
+)
+def test_filters_match_the_loaded_deck(deck_path, tmp_path, filters):
+    storage = changed_deck(deck_path)
+    path = str(tmp_path / "cards.csv")
+    assert export_file(storage, path, **filters) == count_cards(storage.columns, **filters)
+    with open(path) as f:
+        assert len(f.read().splitlines()) == 1 + count_cards(storage.columns, **filters)
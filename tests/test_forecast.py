@@ -0,0 +1,69 @@
+"""
+Workload forecast: simulation and the background cache
+"""
+
+from datetime import datetime, timedelta
+
+from src.forecast import DEFAULT_GRADE_PROBABILITIES, ForecastCache, simulate_workload
+from tests.conftest import make_cards
+from tests.test_storage import rate
+
+SETTINGS = (30, 20, DEFAULT_GRADE_PROBABILITIES)
+
+
+def finish(forecasts):
+    """Wait for the simulations started so far"""
+    for _, future, _ in list(forecasts._entries.values()):
+        future.result()
+
+
+def test_cards_due_after_the_horizon_are_not_counted(storage):
+    for card in storage.load_cards()[:5]:
+        card.next_review = datetime.now() + timedelta(days=40)
+        storage.update_card(card)
+
+    counts = simulate_workload(storage.columns, horizon=30, runs=10, seed=0)
+    assert counts.shape == (10, 30)
+    assert (counts[:, 0] == 15).all()
+
+    for card in storage.load_cards()[5:]:
+        card.next_review = datetime.now() + timedelta(days=40)
+        storage.update_card(card)
+    assert not simulate_workload(storage.columns, horizon=30, runs=10, seed=0).any()
+
+
+def test_forecast_is_simulated_once_and_survives_ratings(storage):
+    forecasts = ForecastCache()
+    copies = []
+
+    def columns():
+        copies.append(storage.copy_columns())
+        return copies[-1]
+
+    assert forecasts.get(storage.file_path, columns, *SETTINGS) == (None, False)
+    finish(forecasts)
+    forecast, current = forecasts.get(storage.file_path, columns, *SETTINGS)
+    assert current and forecast["mean"][0] == 20
+
+    rate(storage, storage.load_cards()[0].id)
+    storage.add_cards(make_cards(3))
+    assert forecasts.get(storage.file_path, columns, *SETTINGS) == (forecast, True)
+    assert len(copies) == 1
+
+
+def test_outdated_forecast_is_shown_while_it_is_simulated_again(storage):
+    forecasts = ForecastCache(max_age=timedelta(minutes=10))
+    start = datetime.now().replace(hour=9)
+    forecasts.get(storage.file_path, storage.copy_columns, *SETTINGS, now=start)
+    finish(forecasts)
+    first = forecasts.get(storage.file_path, storage.copy_columns, *SETTINGS, now=start)[0]
+
+    storage.add_cards(make_cards(10))
+    later = start + timedelta(minutes=11)
+    assert forecasts.get(storage.file_path, storage.copy_columns, *SETTINGS, now=later) == (
+        first,
+        False,
+    )
+    finish(forecasts)
+    forecast, current = forecasts.get(storage.file_path, storage.copy_columns, *SETTINGS, now=later)
+    assert current and forecast["mean"][0] == 30
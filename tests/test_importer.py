@@ -0,0 +1,35 @@
+"""
+Bulk import: per-row errors and duplicate detection
+"""
+
+import json
+
+from src.importer import import_cards
+
+
+def test_jsonl_with_mixed_value_types(storage):
+    rows = [
+        {"front": "apple", "back": "a fruit"},
+        {"front": 1, "back": "x"},
+        {"front": "pear", "back": "a fruit", "category": ["a"]},
+        {"front": "plum", "back": {"text": "a fruit"}},
+        {"front": "fig", "back": "a fruit", "example": 3.5},
+        {"front": "kiwi", "back": "a fruit", "category": "fruit", "example": None},
+    ]
+    lines = [json.dumps(row) + "\n" for row in rows] + ["[1, 2]\n", "{not json\n"]
+
+    result = import_cards(storage, lines, "jsonl")
+
+    assert result.added == 2
+    assert [line_no for line_no, _ in result.errors] == [2, 3, 4, 5, 7, 8]
+    assert result.errors[0][1] == "front must be text"
+    assert {"apple", "kiwi"} <= {card.front for card in storage.load_cards()}
+
+
+def test_duplicates_of_stored_and_earlier_rows(storage):
+    lines = ["\n", "Front,Back\n", "  WORD 1 ,again\n", "new,one\n", "New ,two\n"]
+
+    result = import_cards(storage, lines, "csv", batch_size=1)
+
+    assert (result.added, result.duplicates, result.errors) == (1, 2, [])
+    assert storage.has_front("NEW")
@@ -0,0 +1,74 @@
+"""
+Search index: ranking, filters and when it is built
+"""
+
+import os
+
+from src.storage import create_storage
+from tests.conftest import make_cards
+
+QUERIES = ["word 2", "renamed", "word 1", "fresh", "mean", "wo", "d 1"]
+
+
+def test_empty_query_lists_cards_without_building_the_index(storage):
+    card_ids = [card.id for card in storage.load_cards()]
+
+    assert storage.search("") == card_ids
+    assert storage.search("  ", limit=3) == card_ids[:3]
+    assert not storage._search_index._built
+
+
+def test_ranked_prefix_and_category_matches(storage):
+    storage.add_cards(make_cards(2, category="idiom"))
+    fronts = {card.id: card.front for card in storage.load_cards()}
+
+    ranked = [fronts[card_id] for card_id in storage.search("word 1")]
+    assert ranked[:2] == ["word 1", "word 1"]
+    assert ranked[2:] == [f"word {i}" for i in range(10, 20)]
+    assert [fronts[card_id] for card_id in storage.search("mean", "idiom")] == ["word 0", "word 1"]
+
+    card = storage.get_card_by_id(storage.search("word 19")[0])
+    card.front = "changed"
+    storage.update_card(card)
+    assert storage.search("word 19") == []
+    assert storage.search("chang") == [card.id]
+
+
+def test_stored_index_is_patched_with_later_journal_changes(deck_path):
+    writer = create_storage(deck_path)
+    writer.add_cards(make_cards(30))
+    # A fresh load builds the index and stores it next to the deck
+    assert create_storage(deck_path).search("word 2")
+    assert os.path.exists(writer._search_index.path)
+
+    cards = writer.load_cards()
+    cards[0].front = "renamed"
+    writer.update_card(cards[0])
+    writer.delete_card(cards[12].id)
+    writer.add_cards(make_cards(1, category="fresh"))
+
+    reader = create_storage(deck_path)
+    reused = {query: reader.search(query) for query in QUERIES}
+    if not deck_path.endswith(".db"):
+        # The stored postings cover the first 30 rows; only the changes were indexed again
+        assert len(reader._search_index._stale) == 30
+        assert reader._search_index._stale.sum() == 2
+
+    os.remove(reader._search_index.path)
+    rebuilt = create_storage(deck_path)
+    assert {query: rebuilt.search(query) for query in QUERIES} == reused
+    assert reused["renamed"] == [cards[0].id]
+    assert cards[12].id not in reused["word 1"]
+
+
+def test_writes_before_the_first_search(deck_path):
+    storage = create_storage(deck_path)
+    storage.add_cards(make_cards(10))
+    assert create_storage(deck_path).search("word")
+
+    storage = create_storage(deck_path)
+    card = storage.load_cards()[3]
+    card.back = "renamed"
+    storage.update_card(card)
+    assert storage.search("renamed") == [card.id]
+    assert card.id not in storage.search("meaning 3")
@@ -0,0 +1,283 @@
+"""
+Storage under concurrent writers and flushers, crash recovery and sidecar files
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.spaced_repetition import SpacedRepetition
+from src.storage import ConflictError, JournalCorruptError, create_storage, fcntl, file_lock
+from tests.conftest import make_cards
+
+sr = SpacedRepetition()
+
+
+def rate(storage, card_id, quality=4, **kwargs):
+    return storage.modify_card(
+        card_id,
+        lambda card: sr.calculate_next_review(card, quality),
+        review=True,
+        quality=quality,
+        **kwargs,
+    )
+
+
+def total_repetitions(path: str) -> int:
+    """Ratings of 4 stored in the deck, read by a fresh instance"""
+    return sum(card.repetitions for card in create_storage(path).load_cards())
+
+
+def test_concurrent_buffered_reviews_and_flushes(storage):
+    card_ids = [card.id for card in storage.load_cards()]
+    errors = []
+
+    def run(target):
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [
+        threading.Thread(
+            target=run, args=(lambda i=i: rate(storage, card_ids[i % 20], buffered=True),)
+        )
+        for i in range(50)
+    ] + [threading.Thread(target=run, args=(storage.flush,)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    storage.flush()
+
+    assert errors == []
+    assert total_repetitions(storage.file_path) == 50
+
+
+def test_flush_without_pending_reviews(storage):
+    storage.flush()
+    rate(storage, storage.load_cards()[0].id, buffered=True)
+    storage.flush()
+    storage.flush()
+    assert total_repetitions(storage.file_path) == 1
+
+
+def _rate_buffered(path: str, count: int):
+    storage = create_storage(path)
+    card_ids = [card.id for card in storage.load_cards()]
+    for i in range(count):
+        rate(storage, card_ids[i % len(card_ids)], buffered=True)
+        if i % 7 == 0:
+            storage.flush()
+    storage.flush()
+
+
+def test_processes_rating_and_flushing(storage):
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_rate_buffered, args=(storage.file_path, 15)) for _ in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=120)
+
+    assert [process.exitcode for process in processes] == [0] * 4
+    assert total_repetitions(storage.file_path) == 60
+    assert len(create_storage(storage.file_path).review_log) == 60
+
+
+def _write_and_compact(path: str, count: int):
+    storage = create_storage(path)
+    card_ids = [card.id for card in storage.load_cards()]
+    for i in range(count):
+        storage.add_cards(make_cards(1, category=f"process {os.getpid()}"))
+        rate(storage, card_ids[i % len(card_ids)])
+        if i % 5 == 4:
+            storage.compact()
+
+
+def test_processes_writing_and_compacting(storage):
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_write_and_compact, args=(storage.file_path, 12)) for _ in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=120)
+
+    assert [process.exitcode for process in processes] == [0] * 4
+    fresh = create_storage(storage.file_path)
+    assert len(fresh.load_cards()) == 20 + 48
+    assert total_repetitions(storage.file_path) == 48
+    assert sorted(fresh.category_counts().values()) == [12] * 4 + [20]
+
+
+@pytest.mark.skipif(fcntl is None, reason="no advisory locks on this platform")
+def test_writes_wait_for_the_file_lock(storage):
+    writer = create_storage(storage.file_path)
+    with file_lock(storage.file_path + ".lock"):
+        thread = threading.Thread(target=writer.add_cards, args=(make_cards(1),))
+        thread.start()
+        thread.join(timeout=0.3)
+        assert thread.is_alive()
+    thread.join(timeout=10)
+    assert len(create_storage(storage.file_path).load_cards()) == 21
+
+
+def test_outdated_copy_conflicts_and_modify_card_retries(storage):
+    other = create_storage(storage.file_path)
+    card_id = storage.load_cards()[0].id
+    mine, theirs = storage.get_card_by_id(card_id), other.get_card_by_id(card_id)
+
+    theirs.front = "theirs"
+    other.update_card(theirs)
+    mine.back = "mine"
+    with pytest.raises(ConflictError):
+        storage.update_card(mine)
+    with pytest.raises(ConflictError):
+        storage.record_review(mine)
+
+    card = storage.modify_card(card_id, lambda card: setattr(card, "back", "mine"))
+    stored = create_storage(storage.file_path).get_card_by_id(card_id)
+    assert (stored.front, stored.back, stored.version) == ("theirs", "mine", card.version)
+    assert stored.version == 2
+
+
+def test_modify_card_gives_up_on_a_card_that_keeps_changing(storage):
+    other = create_storage(storage.file_path)
+    card_id = storage.load_cards()[0].id
+    attempts = []
+
+    def change(card):
+        attempts.append(card.version)
+        # Another session stores the card before this change is written
+        other.modify_card(card_id, lambda card: setattr(card, "example", str(len(attempts))))
+
+    with pytest.raises(ConflictError):
+        storage.modify_card(card_id, change)
+    assert len(attempts) == storage.max_retries
+    assert create_storage(storage.file_path).get_card_by_id(card_id).example == "5"
+
+
+@pytest.fixture(params=["cards.json", "cards.npz"])
+def journal_deck(tmp_path, request):
+    """A deck of 20 cards in the snapshot and 3 events in the journal"""
+    storage = create_storage(str(tmp_path / request.param))
+    storage.add_cards(make_cards(20))
+    storage.compact()
+    cards = storage.load_cards()
+    storage.add_cards(make_cards(2, category="idiom"))
+    rate(storage, cards[0].id)
+    return storage
+
+
+def test_torn_journal_line_is_skipped_and_cut_off(journal_deck):
+    path = journal_deck.file_path
+    with open(journal_deck.journal_path, "ab") as f:
+        f.write(b'{"op": "add", "card": {"id": "torn')
+
+    fresh = create_storage(path)
+    assert len(fresh.load_cards()) == 22
+    fresh.add_cards(make_cards(1, category="phrase"))
+
+    assert create_storage(path).category_counts() == {"vocabulary": 20, "idiom": 2, "phrase": 1}
+    with open(journal_deck.journal_path, "rb") as f:
+        assert b"torn" not in f.read()
+
+
+def test_unreadable_journal_entry_is_not_skipped(journal_deck):
+    with open(journal_deck.journal_path, "rb") as f:
+        lines = f.readlines()
+    with open(journal_deck.journal_path, "wb") as f:
+        f.writelines([lines[0][:-10] + b"\n"] + lines[1:])
+
+    with pytest.raises(JournalCorruptError):
+        create_storage(journal_deck.file_path).load_cards()
+
+
+def test_compaction_folds_the_journal_into_the_snapshot(journal_deck):
+    expected = journal_deck.read_columns().row_dicts()
+    journal_deck.compact()
+
+    assert not os.path.exists(journal_deck.journal_path)
+    assert create_storage(journal_deck.file_path).read_columns().row_dicts() == expected
+
+
+def test_compaction_starts_when_the_journal_outgrows_the_deck(journal_deck):
+    journal_deck.compact_every = 1
+    card_ids = [card.id for card in journal_deck.load_cards()]
+    # 3 events so far; the deck has 22 cards
+    for card_id in card_ids[:19]:
+        rate(journal_deck, card_id)
+    deadline = time.monotonic() + 10
+    while os.path.exists(journal_deck.journal_path) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert not os.path.exists(journal_deck.journal_path)
+    assert total_repetitions(journal_deck.file_path) == 20
+
+
+def test_buffered_reviews_survive_a_crash_and_a_torn_pending_line(storage):
+    card_ids = [card.id for card in storage.load_cards()]
+    rate(storage, card_ids[0], buffered=True)
+    rate(storage, card_ids[1], quality=1, buffered=True)
+    with open(storage.pending_path, "ab") as f:
+        f.write(b'{"op": "review", "id": "')
+
+    # A process started after the crash sees the reviews before any flush
+    restarted = create_storage(storage.file_path)
+    assert restarted.get_card_by_id(card_ids[0]).repetitions == 1
+    assert restarted.get_card_by_id(card_ids[1]).last_reviewed is not None
+    rate(restarted, card_ids[2], buffered=True)
+    restarted.flush()
+
+    assert not os.path.exists(storage.pending_path)
+    assert total_repetitions(storage.file_path) == 2
+    assert create_storage(storage.file_path).get_card_by_id(card_ids[2]).repetitions == 1
+
+
+def test_schedule_file_answers_without_loading_the_deck(storage):
+    cards = storage.load_cards()
+    for card in cards[:5]:
+        card.next_review = datetime.now() + timedelta(days=3)
+        storage.update_card(card)
+    rate(storage, cards[5].id, buffered=True)
+    storage.delete_card(cards[6].id)
+
+    fresh = create_storage(storage.file_path)
+    stats, due = fresh.get_stats(), fresh.count_due()
+    assert fresh._columns is None
+    assert stats == create_storage(storage.file_path).get_stats(verify=True)
+    assert due == 13
+
+    # Rewritten when it no longer matches the deck
+    with open(fresh.schedule.path, "r+b") as f:
+        f.write(b"garbage")
+    assert create_storage(storage.file_path).get_stats() == stats
+    assert create_storage(storage.file_path).schedule.stats(fresh._signature()) == stats
+
+
+def test_review_log_counts_every_rating(storage):
+    card_ids = [card.id for card in storage.load_cards()]
+    storage.add_cards(make_cards(2, category="idiom"))
+    idioms = [card.id for card in storage.load_cards() if card.category == "idiom"]
+    qualities = [0, 3, 5, 5, 4, 1, 5]
+    for i, quality in enumerate(qualities):
+        rate(storage, card_ids[i], quality=quality, buffered=i % 2 == 0)
+    rate(storage, idioms[0], quality=2)
+    storage.flush()
+
+    fresh = create_storage(storage.file_path)
+    assert len(fresh.review_log) == 8
+    assert fresh.review_log.grade_counts().tolist() == [1, 1, 1, 1, 1, 3]
+    assert fresh.review_log.grade_counts("idiom").tolist() == [0, 0, 1, 0, 0, 0]
+    records = fresh.review_log.records()
+    assert records["card_id"][0].decode() == card_ids[0]
+    assert (records["previous_repetitions"] == 0).all()
+    assert records["interval"].tolist() == [1, 1, 1, 1, 1, 1, 1, 1]